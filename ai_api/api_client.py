@@ -1,13 +1,23 @@
+import asyncio
+import itertools
+import json
+import os
+import threading
 import time
 
-from openai import OpenAI
-
-from config.decorators import config_value, get_config_manager
+from ai_api import client_pool, event_loop
+from ai_api.context_window import ContextWindow, format_transcript
+from ai_api.prompt_cache import PromptCache
+from ai_api.request_policy import RequestPolicy
+from ai_api.response_cache import get_response_cache, make_cache_key
+from ai_api.telemetry import RequestTrace, Telemetry
+from config.decorators import config_value, get_config_manager, get_config_dir, use_config
 
 
 @config_value("api_key", ".....")
 def get_key(api_key):
-    print(f"API Key = {api_key}")
+    # 不输出完整密钥
+    print(f"API Key = {str(api_key)[:4]}****")
     return api_key
 
 @config_value("base_url", ".....")
@@ -25,23 +35,196 @@ def get_model(model):
     print(f"Model = {model}")
     return model
 
+@config_value("stream", True)
+def get_stream(stream):
+    print(f"stream = {stream}")
+    return stream
+
+@config_value("async_requests", True)
+def get_async_requests(async_requests):
+    return async_requests
+
+@config_value("context.max_tokens", 12000)
+def get_context_max_tokens(max_tokens):
+    return max_tokens
+
+@config_value("context.keep_turns", 6)
+def get_context_keep_turns(keep_turns):
+    return keep_turns
+
+@config_value("context.fold_turns", 2)
+def get_context_fold_turns(fold_turns):
+    return fold_turns
+
+@config_value("speculation.enabled", False)
+def get_speculation_enabled(enabled):
+    return enabled
+
+@config_value("speculation.max_concurrent", 2)
+def get_speculation_max_concurrent(max_concurrent):
+    return max_concurrent
+
+@config_value("cache.enabled", False)
+def get_cache_enabled(enabled):
+    return enabled
+
+@config_value("cache.path", "data/cache/responses.sqlite3")
+def get_cache_path(path):
+    return path
+
+@config_value("cache.max_bytes", 64 * 1024 * 1024)
+def get_cache_max_bytes(max_bytes):
+    return max_bytes
+
+@config_value("cache.bypass", False)
+def get_cache_bypass(bypass):
+    return bypass
+
+@config_value("request_policy.deadline", 180)
+def get_request_deadline(deadline):
+    return deadline
+
+@config_value("request_policy.max_retries", 3)
+def get_request_max_retries(max_retries):
+    return max_retries
+
+@config_value("request_policy.backoff_base", 1.0)
+def get_request_backoff_base(backoff_base):
+    return backoff_base
+
+@config_value("request_policy.backoff_max", 20.0)
+def get_request_backoff_max(backoff_max):
+    return backoff_max
+
+@config_value("request_policy.hedge", False)
+def get_request_hedge(hedge):
+    return hedge
+
+@config_value("request_policy.hedge_percentile", 95)
+def get_request_hedge_percentile(hedge_percentile):
+    return hedge_percentile
+
+@config_value("request_policy.hedge_min_samples", 5)
+def get_request_hedge_min_samples(hedge_min_samples):
+    return hedge_min_samples
+
+
+_request_policies = {}  # 策略设置 -> 请求策略
+_telemetries = {}       # 遥测设置 -> 请求遥测
+_shared_lock = threading.Lock()
+
+
+def get_request_policy():
+    """
+    获取当前配置对应的请求策略
+
+    按策略设置共享：设置相同的会话（包括不同的配置作用域）共用一个策略及其延迟统计，
+    作用域的设置不同或全局配置热重载后，按新的设置使用另一个策略
+    """
+    settings = (
+        get_timeout(),
+        get_request_deadline(),
+        get_request_max_retries(),
+        get_request_backoff_base(),
+        get_request_backoff_max(),
+        get_request_hedge(),
+        get_request_hedge_percentile(),
+        get_request_hedge_min_samples()
+    )
+    with _shared_lock:
+        policy = _request_policies.get(settings)
+        if policy is None:
+            policy = _request_policies[settings] = RequestPolicy(*settings)
+        return policy
+
+@config_value("telemetry.enabled", True)
+def get_telemetry_enabled(enabled):
+    return enabled
+
+@config_value("telemetry.path", "data/logs/requests.jsonl")
+def get_telemetry_path(path):
+    return path
+
+@config_value("telemetry.max_bytes", 5 * 1024 * 1024)
+def get_telemetry_max_bytes(max_bytes):
+    return max_bytes
 
-def sys_text():
-    cm = get_config_manager()
-    text = f"""现在你是一个ai文字游戏生成工具，通过生成文本内容帮助游戏进行下去。在模仿galgame的语言方式生成具有故事性的长篇文本（至少{cm.get_story_value("text_length.min")}字，即每次生成的故事文本在抛出选项前应该至少200字，可以根据故事节奏延长到至多{cm.get_story_value("text_length.max")}字）后，抛出具有截然不同结果的选项，注意，为了更像gal，需要对文本进行多段分割，长文本按照0~120字以语句连贯性为标准进行分割，分割字数不需要相似以实现更像gal的效果，分割的文本需要在最前端加上[text]以便客户端处理,每次生成文本都要遵守这个原则。
+@config_value("telemetry.backups", 3)
+def get_telemetry_backups(backups):
+    return backups
+
+@config_value("telemetry.window", 500)
+def get_telemetry_window(window):
+    return window
+
+@config_value("telemetry.stream_usage", False)
+def get_stream_usage(stream_usage):
+    return stream_usage
+
+
+def get_telemetry():
+    """获取当前配置对应的请求遥测（设置相同的会话共享），未启用时返回None"""
+    if not get_telemetry_enabled():
+        return None
+    path = os.path.join(get_config_dir() or os.getcwd(), get_telemetry_path())
+    settings = (path, get_telemetry_max_bytes(), get_telemetry_backups(), get_telemetry_window())
+    with _shared_lock:
+        telemetry = _telemetries.get(settings)
+        if telemetry is None:
+            telemetry = _telemetries[settings] = Telemetry(*settings)
+        return telemetry
+
+
+def get_shared_client():
+    """获取当前配置对应的共享客户端"""
+    return client_pool.get_client(get_key(), get_url(), get_timeout())
+
+
+def get_shared_async_client():
+    """获取当前配置对应的共享异步客户端"""
+    return client_pool.get_async_client(get_key(), get_url(), get_timeout())
+
+
+def prewarm_client():
+    """在后台预先建立到AI接口的连接"""
+    return client_pool.warm_up(get_key(), get_url(), get_timeout())
+
+
+def create_response_cache():
+    """按配置创建（或获取共享的）响应缓存，未启用时返回None"""
+    if not get_cache_enabled():
+        return None
+    path = os.path.join(get_config_dir() or os.getcwd(), get_cache_path())
+    cache = get_response_cache(path, get_cache_max_bytes())
+    cache.bypass = get_cache_bypass()
+    return cache
+
+
+def _render_value(value):
+    """将配置值渲染为稳定的文本：字典与列表按键排序输出，保证相同配置得到逐字节相同的提示"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return str(value)
+
+
+def render_sys_text(cm):
+    """根据配置渲染系统提示（从同一版本的快照中读取，重新加载时不会读到一半新一半旧的配置）"""
+    story = cm.story_config.snapshot()
+    global_config = cm.global_config.snapshot()
+    text = f"""现在你是一个ai文字游戏生成工具，通过生成文本内容帮助游戏进行下去。在模仿galgame的语言方式生成具有故事性的长篇文本（至少{story.get("text_length.min")}字，即每次生成的故事文本在抛出选项前应该至少200字，可以根据故事节奏延长到至多{story.get("text_length.max")}字）后，抛出具有截然不同结果的选项，注意，为了更像gal，需要对文本进行多段分割，长文本按照0~120字以语句连贯性为标准进行分割，分割字数不需要相似以实现更像gal的效果，分割的文本需要在最前端加上[text]以便客户端处理,每次生成文本都要遵守这个原则。
 
 这个故事提供了以下重要角色需要出现在故事中（角色特点要在故事中体现，不应直接在生成的文本中直接说出诸如性格特点等）：
-{cm.get_story_value("characters")}
+{_render_value(story.get("characters"))}
 
-这是一个以{cm.get_story_value("story_type")}为基调的故事，这个故事必须遵守以下原则：
-{cm.get_story_value("story_constraints")}
+这是一个以{story.get("story_type")}为基调的故事，这个故事必须遵守以下原则：
+{story.get("story_constraints")}
 
 客户端为这个故事提供了以下音效果（键名为音效名,duration为音效的时间长度，单位为秒）：
-{cm.get_global_value("sounds")}
+{_render_value(global_config.get("sounds"))}
 调用音效以类似文本分割的方式进行，但是是以"[sound]音效名"进行
 
 故事中固定以下几个属性以供故事的主角使用，用于判定事件进行的顺利与否以及成败和结局的好坏判定（键名为属性名）：
-{cm.get_story_value("attributes")}
+{_render_value(story.get("attributes"))}
 增降属性以类似文本分割的方式进行，但是是以"[attribute=属性名.数值]原因+属性变化情况"进行(使用例子"[attribute=SAN.5]SAN值增加了5"或"[attribute=SAN.-5]SAN值减少了5")
 
 当一段文本结束需要出现选项时，以"[choice]选项1|选项2|选项3"方式提供三个选项，出现选项时不应继续生成文本而应等待玩家抉择。
@@ -68,42 +251,400 @@ def sys_text():
 
 现在我要求以下面的故事背景为故事主题及舞台，开始这场游戏（每次生成的文本除[end]外，都应该以[choice]作为最后的内容）。
 故事背景：
-{cm.get_story_value("background")}
+{story.get("background")}
 
 现在开始这个故事吧。"""
     return text
 
 
+# 系统提示用到的配置键，其他键变化时不需要重新渲染
+PROMPT_STORY_KEYS = ("text_length", "characters", "story_type", "story_constraints", "attributes", "background")
+PROMPT_GLOBAL_KEYS = ("sounds",)
+
+_prompt_cache = PromptCache(render_sys_text, PROMPT_STORY_KEYS, PROMPT_GLOBAL_KEYS)
+
+
+def sys_text(config_manager=None):
+    """获取系统提示（按故事文件缓存），未指定配置作用域时使用当前上下文的作用域"""
+    return _prompt_cache.get(config_manager or get_config_manager())
+
+
+def get_prompt_status():
+    """获取系统提示缓存状态，包括提示的字数与估算token数"""
+    return _prompt_cache.get_status()
+
+
+# 剧情摘要请求的系统提示
+SUMMARY_PROMPT = "请将以下AVG游戏的剧情压缩为一段不超过600字的摘要，保留关键事件、角色关系、已埋下的伏笔、玩家的选择与属性变化，只输出摘要正文。"
+
+
 class ChatSession:
-    def __init__(self):
-        self.messages = []
-        self.client = OpenAI(
-            api_key= get_key(),
-            base_url= get_url(),
-            timeout= get_timeout(),  # 全局超时设置
-        )
-        self.model = get_model()
-        self.messages.append({"role": "system", "content": sys_text()})
+    is_async = False
+
+    def __init__(self, config_manager=None):
+        # 会话所属的配置作用域，系统提示等故事相关的配置都从这里读取
+        self.config = config_manager or get_config_manager()
+        with use_config(self.config):
+            self.messages = []
+            self.client = get_shared_client()  # 进程内共享，连接在会话之间复用
+            self.model = get_model()
+            self.messages.append({"role": "system", "content": sys_text(self.config)})
+            self.context = ContextWindow(
+                get_context_max_tokens(),
+                get_context_keep_turns(),
+                get_context_fold_turns(),
+                summarizer=self._summarize
+            )
+            self.cache = create_response_cache()
+            self.policy = get_request_policy()
+            self.telemetry = get_telemetry()
+        self.last_error = None  # 最近一次请求失败的原因
 
     def add_user_message(self, content):
         self.messages.append({"role": "user", "content": content})
 
-    def get_response(self):
-        print("正在请求AI接口，请耐心等待...")
-        start_time = time.time()
+    def fork(self):
+        """
+        分叉会话：共享客户端，复制对话历史与上下文窗口状态
+
+        分叉出的会话不会触发剧情摘要，摘要仍由原会话负责
+        """
+        clone = type(self).__new__(type(self))
+        clone.config = self.config
+        clone.client = self.client
+        clone.model = self.model
+        clone.messages = list(self.messages)
+        clone.context = self.context.fork()
+        clone.context.summarizer = None
+        clone.cache = self.cache
+        clone.policy = self.policy
+        clone.telemetry = self.telemetry
+        clone.last_error = None
+        return clone
+
+    def adopt(self, fork):
+        """采用分叉会话的对话历史（分叉必须基于当前历史）"""
+        self.messages = fork.messages
+
+    def export_state(self):
+        """导出紧凑的会话状态：剧情摘要与尚未折叠进摘要的消息（不含系统提示）"""
+        summary, folded = self.context.state()
+        return {
+            "summary": summary,
+            "messages": [dict(message) for message in self.messages[1 + folded:]]
+        }
+
+    def restore_state(self, summary, messages):
+        """从存档恢复会话状态，系统提示使用当前配置重新生成的版本"""
+        self.messages = [self.messages[0]] + [dict(message) for message in messages]
+        self.context.restore(summary)
+
+    def _request_messages(self):
+        """构建本次请求实际发送的消息（系统提示 + 摘要 + 最近回合）"""
+        request = self.context.build(self.messages)
+        size = self.context.last_request_size
+        print(f"请求上下文：{size['messages']}条消息，{size['chars']}字，约{size['tokens']} tokens")
+        return request
+
+    def _lookup_cache(self, request):
+        """查询响应缓存，返回(缓存键, 命中的内容)；未启用缓存时均为None"""
+        if self.cache is None:
+            return None, None
+        key = make_cache_key(self.model, request)
+        return key, self.cache.get(key)
+
+    def _summary_messages(self, summary, messages):
+        """构建剧情摘要请求的消息"""
+        content = f"之前的摘要：\n{summary}\n\n" if summary else ""
+        content += f"新增剧情：\n{format_transcript(messages)}"
+        return [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": content}
+        ]
+
+    def _summarize(self, summary, messages):
+        """将较早的回合折叠为剧情摘要（在后台线程中调用）"""
+        request = self._summary_messages(summary, messages)
+        response = self.policy.call(
+            lambda timeout: self.client.chat.completions.create(
+                model=self.model,
+                messages=request,
+                timeout=timeout
+            ),
+            kind="summary",
+            hedge=False
+        )
+        return response.choices[0].message.content
+
+    @staticmethod
+    def _stream_options():
+        """接口支持时，在流的最后一个分块中返回token用量"""
+        return {"stream_options": {"include_usage": True}} if get_stream_usage() else {}
+
+    def _open_stream(self, request, timeout):
+        """打开流并读到首个内容增量，返回(流, 剩余分块迭代器, 已读取的分块)"""
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=request,
+            stream=True,
+            timeout=timeout,
+            **self._stream_options()
+        )
+        chunks = iter(stream)
+        head = []
+        for chunk in chunks:
+            head.append(chunk)
+            if chunk.choices and chunk.choices[0].delta.content:
+                break
+        return stream, chunks, head
+
+    def _begin_request(self, kind, queued_at, streaming=False):
+        """
+        开始一次请求：构建请求消息并查询响应缓存（同步与异步会话共用）
+
+        Returns:
+            (请求追踪, 请求消息, 缓存键, 命中缓存的内容)；命中缓存时已记录指标
+        """
+        print("正在以流式请求AI接口..." if streaming else "正在请求AI接口，请耐心等待...")
+        trace = RequestTrace(kind, self.model, queued_at, streaming=streaming)
+        request = self._request_messages()
+        cache_key, cached = self._lookup_cache(request)
+        if cached is not None:
+            trace.chars = len(cached)
+            self._record(trace, "cache_hit")
+        else:
+            self.last_error = None
+            trace.mark_sent()
+        return trace, request, cache_key, cached
+
+    def _add_reply(self, content, cache_key):
+        """完整的回复写入对话历史与响应缓存"""
+        self.messages.append({"role": "assistant", "content": content})
+        if cache_key:
+            self.cache.put(cache_key, content)
+
+    def _finish_response(self, trace, cache_key, response):
+        """非流式请求成功：记录用量并写入回复，返回回复内容（非流式请求没有首字时间）"""
+        ai_content = response.choices[0].message.content
+        trace.chars = len(ai_content or "")
+        trace.set_usage(getattr(response, "usage", None))
+        self._add_reply(ai_content, cache_key)
+        self._record(trace, "ok")
+        return ai_content
+
+    def _finish_stream(self, trace, cache_key, parts):
+        """流正常结束：写入完整回复，没有任何内容时记为失败"""
+        if not parts:
+            self.last_error = ValueError("请求未返回任何内容")
+            print("请求未返回任何内容")
+            self._record(trace, "empty")
+            return
+        self._add_reply("".join(parts), cache_key)
+        self._record(trace, "ok")
+
+    def _request_failed(self, trace, error):
+        self.last_error = error
+        print(f"请求发生错误: {error}")
+        self._record(trace, f"error:{type(error).__name__}")
+
+    def _request_cancelled(self, trace):
+        print("请求已取消")
+        self._record(trace, "cancelled")
+
+    @staticmethod
+    def _take_delta(trace, chunk, parts):
+        """记录分块中的用量与增量文本，返回增量文本（没有时返回None）"""
+        trace.set_usage(getattr(chunk, "usage", None))
+        if not chunk.choices:
+            return None
+        delta = chunk.choices[0].delta.content
+        if delta:
+            parts.append(delta)
+            trace.chars += len(delta)
+        return delta
+
+    def get_response(self, queued_at=None):
+        trace, request, cache_key, cached = self._begin_request("response", queued_at)
+        if cached is not None:
+            self.messages.append({"role": "assistant", "content": cached})
+            return cached
         try:
-            response = self.client.chat.completions.create(
+            response = self.policy.call(
+                lambda timeout: self.client.chat.completions.create(
+                    model=self.model,
+                    messages=request,
+                    timeout=timeout
+                ),
+                kind="response",
+                trace=trace
+            )
+            return self._finish_response(trace, cache_key, response)
+        except Exception as e:
+            self._request_failed(trace, e)
+            return None
+
+    def stream_response(self, cancel_event=None, hedge=True, queued_at=None):
+        """
+        流式请求AI接口，按到达顺序逐个产出增量文本
+
+        首个增量到达之前的错误按请求策略重试（可对冲）；
+        完整回复在流正常结束后才写入对话历史；出错或cancel_event被设置时生成器提前结束，不写入历史
+        """
+        trace, request, cache_key, cached = self._begin_request("stream", queued_at, streaming=True)
+        if cached is not None:
+            yield cached
+            self.messages.append({"role": "assistant", "content": cached})
+            return
+
+        parts = []
+        try:
+            stream, chunks, head = self.policy.call(
+                lambda timeout: self._open_stream(request, timeout),
+                kind="first_token",
+                hedge=hedge,
+                discard=lambda opened: opened[0].close(),
+                trace=trace
+            )
+            trace.mark_first_token()
+            for chunk in itertools.chain(head, chunks):
+                if cancel_event is not None and cancel_event.is_set():
+                    stream.close()
+                    self._request_cancelled(trace)
+                    return
+                delta = self._take_delta(trace, chunk, parts)
+                if delta:
+                    yield delta
+        except Exception as e:
+            self._request_failed(trace, e)
+            return
+        except GeneratorExit:
+            # 消费方提前关闭了生成器
+            stream.close()
+            self._record(trace, "cancelled")
+            raise
+        self._finish_stream(trace, cache_key, parts)
+
+    def _record(self, trace, outcome):
+        """记录请求指标并输出简要耗时"""
+        metrics = trace.finish(outcome)
+        if self.telemetry:
+            self.telemetry.record(metrics)
+        ttft = f"，首字{metrics['ttft']:.2f}秒" if metrics["ttft"] is not None else ""
+        print(f"请求结束（{outcome}），耗时：{metrics['total']:.2f}秒{ttft}")
+
+
+class AsyncChatSession(ChatSession):
+    """
+    异步会话，接口与ChatSession相同，get_response 与 stream_response 为协程
+
+    所有请求都在共享事件循环（ai_api.event_loop）中执行，
+    推测、摘要、对冲等同时进行的请求在一个线程中多路复用，不再各占一个线程。
+    """
+
+    is_async = True
+
+    def __init__(self, config_manager=None):
+        super().__init__(config_manager)
+        with use_config(self.config):
+            self.async_client = get_shared_async_client()
+
+    def fork(self):
+        clone = super().fork()
+        clone.async_client = self.async_client
+        return clone
+
+    def _summarize(self, summary, messages):
+        """剧情摘要在上下文窗口的后台线程中调用，请求交给共享事件循环执行"""
+        return event_loop.run(self._summarize_async(summary, messages))
+
+    async def _summarize_async(self, summary, messages):
+        request = self._summary_messages(summary, messages)
+        response = await self.policy.call_async(
+            lambda timeout: self.async_client.chat.completions.create(
                 model=self.model,
-                messages=self.messages,
-                timeout=150.0  # 设置超时时间
+                messages=request,
+                timeout=timeout
+            ),
+            kind="summary",
+            hedge=False
+        )
+        return response.choices[0].message.content
+
+    async def _open_stream(self, request, timeout):
+        """打开流并读到首个内容增量，返回(流, 剩余分块迭代器, 已读取的分块)"""
+        stream = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=request,
+            stream=True,
+            timeout=timeout,
+            **self._stream_options()
+        )
+        chunks = stream.__aiter__()
+        head = []
+        async for chunk in chunks:
+            head.append(chunk)
+            if chunk.choices and chunk.choices[0].delta.content:
+                break
+        return stream, chunks, head
+
+    async def get_response(self, queued_at=None):
+        trace, request, cache_key, cached = self._begin_request("response", queued_at)
+        if cached is not None:
+            self.messages.append({"role": "assistant", "content": cached})
+            return cached
+        try:
+            response = await self.policy.call_async(
+                lambda timeout: self.async_client.chat.completions.create(
+                    model=self.model,
+                    messages=request,
+                    timeout=timeout
+                ),
+                kind="response",
+                trace=trace
             )
-            ai_content = response.choices[0].message.content
-            self.messages.append({"role": "assistant", "content": ai_content})
-            end_time = time.time()
-            print(f"请求完成，耗时：{end_time - start_time:.2f}秒")
-            return ai_content
+            return self._finish_response(trace, cache_key, response)
         except Exception as e:
-            print(f"请求发生错误: {e}")
+            self._request_failed(trace, e)
             return None
 
+    async def stream_response(self, cancel_event=None, hedge=True, queued_at=None):
+        """流式请求AI接口，按到达顺序逐个产出增量文本（行为同 ChatSession.stream_response）"""
+        trace, request, cache_key, cached = self._begin_request("stream", queued_at, streaming=True)
+        if cached is not None:
+            yield cached
+            self.messages.append({"role": "assistant", "content": cached})
+            return
 
+        parts = []
+        stream = None
+        try:
+            stream, chunks, head = await self.policy.call_async(
+                lambda timeout: self._open_stream(request, timeout),
+                kind="first_token",
+                hedge=hedge,
+                discard=lambda opened: opened[0].close(),
+                trace=trace
+            )
+            trace.mark_first_token()
+            for chunk in head:
+                delta = self._take_delta(trace, chunk, parts)
+                if delta:
+                    yield delta
+            async for chunk in chunks:
+                if cancel_event is not None and cancel_event.is_set():
+                    await stream.close()
+                    self._request_cancelled(trace)
+                    return
+                delta = self._take_delta(trace, chunk, parts)
+                if delta:
+                    yield delta
+        except Exception as e:
+            self._request_failed(trace, e)
+            return
+        except (GeneratorExit, asyncio.CancelledError):
+            # 消费方提前关闭了生成器或任务被取消
+            if stream is not None:
+                await stream.close()
+            self._record(trace, "cancelled")
+            raise
+        self._finish_stream(trace, cache_key, parts)
@@ -0,0 +1,154 @@
+"""
+进程内共享的AI客户端池
+"""
+
+import hashlib
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Tuple
+
+from ai_api import event_loop
+
+if TYPE_CHECKING:
+    # openai 与 httpx 导入较慢，在第一次创建客户端时才导入（通常在预热线程中）
+    import httpx
+    from openai import AsyncOpenAI, OpenAI
+
+# 空闲连接保持时间（秒），需覆盖玩家阅读一个回合的时间
+KEEPALIVE_EXPIRY = 120.0
+MAX_CONNECTIONS = 16
+# 距上次预热不足该时间时跳过重复预热
+WARM_UP_INTERVAL = 60.0
+
+_clients: Dict[Tuple[str, str, float], 'OpenAI'] = {}
+_http_clients: Dict[Tuple[str, str, float], 'httpx.Client'] = {}
+_async_clients: Dict[Tuple[str, str, float], 'AsyncOpenAI'] = {}
+_last_warm_up: Dict[Tuple[str, str, float], float] = {}
+_lock = threading.Lock()
+
+
+def _http_client(factory):
+    """
+    按连接池设置创建 openai 使用的HTTP客户端
+
+    httpx 未安装（新版 openai 基于 httpx2）或与 openai 不兼容时返回None，
+    此时使用 openai 默认的HTTP客户端与连接设置
+    """
+    try:
+        import httpx
+        return factory(limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        ))
+    except (ImportError, TypeError) as e:
+        print(f"使用 openai 默认的连接设置: {e}")
+        return None
+
+
+def _pool_key(api_key: str, base_url: str, timeout: float) -> Tuple[str, str, float]:
+    # 不在池中保存明文密钥
+    key_digest = hashlib.sha256(str(api_key).encode('utf-8')).hexdigest()
+    return str(base_url), key_digest, float(timeout)
+
+
+def get_client(api_key: str, base_url: str, timeout: float) -> 'OpenAI':
+    """获取（必要时创建）与 base_url 和密钥对应的共享客户端，连接在会话之间复用"""
+    key = _pool_key(api_key, base_url, timeout)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            from openai import DefaultHttpxClient, OpenAI
+            http_client = _http_client(DefaultHttpxClient)
+            client = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=timeout,
+                max_retries=0,  # 重试由请求策略统一处理
+                **({"http_client": http_client} if http_client is not None else {})
+            )
+            _clients[key] = client
+            if http_client is not None:
+                _http_clients[key] = http_client
+        return client
+
+
+def get_async_client(api_key: str, base_url: str, timeout: float) -> 'AsyncOpenAI':
+    """获取（必要时创建）共享的异步客户端，只能在共享事件循环中使用"""
+    key = _pool_key(api_key, base_url, timeout)
+    with _lock:
+        client = _async_clients.get(key)
+        if client is None:
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+            http_client = _http_client(DefaultAsyncHttpxClient)
+            client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=timeout,
+                max_retries=0,  # 重试由请求策略统一处理
+                **({"http_client": http_client} if http_client is not None else {})
+            )
+            _async_clients[key] = client
+        return client
+
+
+def warm_up(api_key: str, base_url: str, timeout: float) -> threading.Thread:
+    """在后台线程中建立到 base_url 的连接（DNS、TCP、TLS握手），供首个请求复用"""
+    thread = threading.Thread(
+        target=_warm_up_worker,
+        args=(api_key, base_url, timeout),
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def _warm_up_worker(api_key: str, base_url: str, timeout: float):
+    key = _pool_key(api_key, base_url, timeout)
+    with _lock:
+        now = time.time()
+        if now - _last_warm_up.get(key, 0.0) < WARM_UP_INTERVAL:
+            return
+        _last_warm_up[key] = now
+
+    start_time = time.time()
+    try:
+        client = get_client(api_key, base_url, timeout)
+        # 轻量请求，只为打开连接，响应状态无关紧要
+        http_client = _http_clients.get(key)
+        if http_client is not None:
+            http_client.get(
+                f"{str(client.base_url).rstrip('/')}/models",
+                headers={"Authorization": f"Bearer {api_key}"},
+                timeout=timeout
+            )
+        else:
+            from openai import APIStatusError
+            try:
+                client.get("/models", cast_to=object, options={"timeout": timeout})
+            except APIStatusError:
+                pass
+        print(f"AI接口连接预热完成，耗时：{time.time() - start_time:.2f}秒")
+    except Exception as e:
+        print(f"AI接口连接预热失败: {e}")
+
+
+def close_all():
+    """关闭所有共享客户端及其连接"""
+    with _lock:
+        http_clients = list(_http_clients.values())
+        async_clients = list(_async_clients.values())
+        _clients.clear()
+        _http_clients.clear()
+        _async_clients.clear()
+        _last_warm_up.clear()
+    for http_client in http_clients:
+        try:
+            http_client.close()
+        except Exception as e:
+            print(f"关闭HTTP连接失败: {e}")
+    for async_client in async_clients:
+        try:
+            event_loop.run(async_client.close(), timeout=2.0)
+        except Exception as e:
+            print(f"关闭HTTP连接失败: {e}")
@@ -0,0 +1,175 @@
+"""
+对话上下文窗口：限制每次请求的上下文大小，并将较早的回合折叠为滚动摘要
+"""
+
+import contextvars
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 摘要函数: (之前的摘要, 需要折叠的消息) -> 新摘要，失败时返回None
+Summarizer = Callable[[Optional[str], List[Dict[str, str]]], Optional[str]]
+
+SUMMARY_PREFIX = "此前剧情摘要（较早的回合已折叠，请保持与摘要一致）：\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数：中日韩字符按1个token计，其余字符按4个字符1个token计"""
+    wide = 0
+    for ch in text:
+        if ch >= '⺀':
+            wide += 1
+    return wide + (len(text) - wide + 3) // 4
+
+
+class ContextWindow:
+    """
+    上下文窗口
+
+    请求内容始终由 系统提示 + 滚动摘要（如果有）+ 最近的若干回合 组成。
+    超出 keep_turns 的较早回合会在后台线程中交给 summarizer 折叠进摘要，
+    不阻塞当前请求；摘要尚未完成时若超出 max_tokens，则临时丢弃最早的回合。
+    """
+
+    def __init__(self, max_tokens: int, keep_turns: int, fold_turns: int = 2,
+                 summarizer: Optional[Summarizer] = None):
+        self.max_tokens = max_tokens
+        self.keep_turns = max(keep_turns, 1)
+        self.fold_turns = max(fold_turns, 1)
+        self.summarizer = summarizer
+
+        self._lock = threading.Lock()
+        self._summary: Optional[str] = None
+        self._folded = 0             # 已折叠进摘要的消息数（不含系统提示）
+        self._summarizing = False
+        self._token_counts: List[int] = []  # 与消息列表一一对应的token估算缓存
+
+        self.last_request_size: Dict[str, int] = {}
+        self.request_sizes: List[Dict[str, int]] = []
+
+    def build(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """根据完整的对话历史构建本次请求的消息列表"""
+        with self._lock:
+            summary, folded = self._summary, self._folded
+
+        system, body = messages[0], messages[1:]
+        recent = body[folded:]
+        turn_starts = self._turn_starts(recent)
+
+        # 较早的回合足够多时，在后台折叠进摘要
+        if len(turn_starts) - self.keep_turns >= self.fold_turns:
+            cut = turn_starts[-self.keep_turns]
+            self._schedule_fold(summary, folded, recent[:cut])
+
+        request = [system]
+        if summary:
+            request.append({"role": "system", "content": SUMMARY_PREFIX + summary})
+
+        # 摘要尚未跟上时，丢弃最早的回合直到不超过预算（最近的keep_turns个回合始终保留）
+        tokens = self._count(messages, 0) + (estimate_tokens(request[-1]["content"]) if summary else 0)
+        recent_tokens = [self._count(messages, 1 + folded + i) for i in range(len(recent))]
+        total = tokens + sum(recent_tokens)
+        drop = 0
+        for turn_end in turn_starts[1:len(turn_starts) - self.keep_turns + 1]:
+            if total <= self.max_tokens:
+                break
+            total -= sum(recent_tokens[drop:turn_end])
+            drop = turn_end
+        if drop:
+            print(f"上下文超出预算，临时丢弃{drop}条较早的消息")
+
+        request.extend(recent[drop:])
+        self._record_size(request, total)
+        return request
+
+    def fork(self) -> 'ContextWindow':
+        """复制当前窗口状态（摘要与折叠位置），用于分叉会话"""
+        clone = ContextWindow(self.max_tokens, self.keep_turns, self.fold_turns, self.summarizer)
+        with self._lock:
+            clone._summary = self._summary
+            clone._folded = self._folded
+            clone._token_counts = list(self._token_counts)
+        return clone
+
+    def state(self) -> Tuple[Optional[str], int]:
+        """当前的(摘要, 已折叠的消息数)"""
+        with self._lock:
+            return self._summary, self._folded
+
+    def restore(self, summary: Optional[str]):
+        """读档时恢复摘要；此时对话历史只包含未折叠的消息"""
+        with self._lock:
+            self._summary = summary
+            self._folded = 0
+            self._token_counts = []
+
+    @property
+    def summary(self) -> Optional[str]:
+        """当前的滚动摘要"""
+        return self._summary
+
+    def _count(self, messages: List[Dict[str, str]], index: int) -> int:
+        """获取第index条消息的token估算值（带缓存）"""
+        counts = self._token_counts
+        while len(counts) <= index:
+            counts.append(estimate_tokens(messages[len(counts)]["content"]))
+        return counts[index]
+
+    @staticmethod
+    def _turn_starts(body: List[Dict[str, str]]) -> List[int]:
+        """返回每个回合的起始位置：回合以玩家消息开始，开场的AI回复自成一个回合"""
+        starts = []
+        for i, message in enumerate(body):
+            if message["role"] == "user" or (i == 0 and message["role"] == "assistant"):
+                starts.append(i)
+        return starts
+
+    def _schedule_fold(self, summary: Optional[str], folded: int, to_fold: List[Dict[str, str]]):
+        """在后台线程中把to_fold折叠进摘要"""
+        if not self.summarizer or not to_fold:
+            return
+        with self._lock:
+            if self._summarizing:
+                return
+            self._summarizing = True
+
+        # 摘要线程沿用当前上下文（会话的配置作用域）
+        threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._fold_worker, summary, folded, to_fold),
+            daemon=True
+        ).start()
+
+    def _fold_worker(self, summary: Optional[str], folded: int, to_fold: List[Dict[str, str]]):
+        try:
+            new_summary = self.summarizer(summary, to_fold)
+        except Exception as e:
+            print(f"生成剧情摘要失败: {e}")
+            new_summary = None
+
+        with self._lock:
+            self._summarizing = False
+            # 期间如果窗口状态已变化（例如被分叉覆盖），丢弃本次结果
+            if new_summary and self._folded == folded:
+                self._summary = new_summary
+                self._folded = folded + len(to_fold)
+                print(f"已折叠{len(to_fold)}条消息进剧情摘要（摘要{len(new_summary)}字）")
+
+    def _record_size(self, request: List[Dict[str, str]], tokens: int):
+        size = {
+            "messages": len(request),
+            "chars": sum(len(message["content"]) for message in request),
+            "tokens": tokens
+        }
+        self.last_request_size = size
+        self.request_sizes.append(size)
+
+
+def format_transcript(messages: List[Dict[str, str]]) -> str:
+    """将消息列表整理为供摘要使用的剧情文本"""
+    lines = []
+    for message in messages:
+        if message["role"] == "user":
+            lines.append(f"玩家选择：{message['content']}")
+        elif message["role"] == "assistant":
+            lines.append(f"剧情：\n{message['content']}")
+    return "\n".join(lines)
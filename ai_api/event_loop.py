@@ -0,0 +1,85 @@
+"""
+进程内共享的异步事件循环（运行在一个专用的后台线程中）
+"""
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """获取（必要时启动）共享事件循环，所有异步请求都在这个循环中多路复用"""
+    global _loop, _thread
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            _thread = threading.Thread(target=_run_loop, args=(_loop, ready), name="ai-event-loop", daemon=True)
+            _thread.start()
+            ready.wait()
+        return _loop
+
+
+def _run_loop(loop: asyncio.AbstractEventLoop, ready: threading.Event):
+    asyncio.set_event_loop(loop)
+    loop.call_soon(ready.set)
+    loop.run_forever()
+
+
+def in_event_loop() -> bool:
+    """当前是否运行在共享事件循环的线程中"""
+    return _thread is not None and threading.current_thread() is _thread
+
+
+def submit(coro: Coroutine) -> Future:
+    """
+    从任意线程向共享事件循环提交协程，返回线程安全的Future
+
+    提交方的上下文变量（例如会话的配置作用域）随协程一起带入事件循环
+    """
+    return asyncio.run_coroutine_threadsafe(_with_context(coro, contextvars.copy_context()), get_event_loop())
+
+
+async def _with_context(coro: Coroutine, context: contextvars.Context) -> Any:
+    # 每个任务有自己的上下文副本，这里设置的值不会影响其他任务
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+def run(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    """在共享事件循环中执行协程并阻塞等待结果（不能在事件循环线程中调用）"""
+    if in_event_loop():
+        raise RuntimeError("不能在事件循环线程中阻塞等待协程")
+    return submit(coro).result(timeout)
+
+
+def shutdown(timeout: float = 2.0):
+    """取消所有未完成的任务并停止共享事件循环"""
+    global _loop, _thread
+    with _lock:
+        loop, thread = _loop, _thread
+        _loop, _thread = None, None
+    if loop is None or loop.is_closed():
+        return
+
+    async def _cancel_tasks():
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    try:
+        asyncio.run_coroutine_threadsafe(_cancel_tasks(), loop).result(timeout)
+    except Exception as e:
+        print(f"取消异步任务失败: {e}")
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout)
+    if not loop.is_running():
+        loop.close()
@@ -0,0 +1,299 @@
+"""
+本地OpenAI兼容的模拟AI接口，用于离线压测与回归测试
+
+用法:
+    python -m ai_api.mock_server --port 8765 --ttft 0.8 --rate 30
+然后把 config.json 的 base_url 设置为 http://127.0.0.1:8765/v1
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from ai_api.context_window import estimate_tokens
+
+DEFAULT_SOUNDS = ["bushes", "crow", "door"]
+DEFAULT_ATTRIBUTES = ["力量", "生命", "SAN"]
+
+_SYNTHETIC_LINES = [
+    "风从破旧的窗缝里钻进来，带着潮湿的泥土味。",
+    "我屏住呼吸，听见走廊尽头传来轻微的脚步声。",
+    "烛光摇晃了一下，墙上的影子像是活过来了一样。",
+    "她没有回头，只是用很轻的声音说了一句“跟上”。",
+    "远处的钟声敲了十二下，每一下都像敲在心口上。",
+    "桌上的信封已经泛黄，封口处的蜡印却完好无损。",
+]
+_SYNTHETIC_CHOICES = ["推门进去", "悄悄离开", "大声呼喊", "躲进阴影", "捡起信封", "跟着脚步声"]
+
+# 记住最近生成过的回复对应第几轮，上限防止长时间压测时无限增长
+MAX_TRACKED_REPLIES = 4096
+
+
+class MockSettings:
+    """模拟接口的行为设置"""
+
+    def __init__(self, ttft: float = 0.5, rate: float = 40.0, chars_per_token: int = 2,
+                 error_rate: float = 0.0, error_status: int = 500, end_after: int = 0,
+                 transcripts: Optional[List[Dict[str, Any]]] = None,
+                 sounds: Optional[List[str]] = None, attributes: Optional[List[str]] = None,
+                 seed: Optional[int] = None):
+        self.ttft = ttft                      # 首个token的延迟（秒）
+        self.rate = rate                      # 每秒输出的token数，<=0表示不限速
+        self.chars_per_token = chars_per_token
+        self.error_rate = error_rate          # 返回错误的概率
+        self.error_status = error_status
+        self.end_after = end_after            # 第几轮之后输出[end]，0表示不结束
+        self.transcripts = transcripts or []  # 录制的回合 {"content": ..., "choice": 可选}
+        self.sounds = sounds or DEFAULT_SOUNDS
+        self.attributes = attributes or DEFAULT_ATTRIBUTES
+        self.random = random.Random(seed)
+        self._cycle = itertools.cycle(self.transcripts) if self.transcripts else None
+        self._lock = threading.Lock()
+        self._reply_turns: 'OrderedDict[str, int]' = OrderedDict()  # 生成过的回复 -> 第几轮
+        self.stats = {"requests": 0, "errors": 0, "streams": 0}
+
+    def next_turn(self, messages: List[Dict[str, str]]) -> str:
+        """根据请求的对话历史选择要返回的回合文本"""
+        last_user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), None)
+        last_reply = next((m["content"] for m in reversed(messages) if m["role"] == "assistant"), None)
+
+        with self._lock:
+            if self.transcripts:
+                for transcript in self.transcripts:
+                    if last_user is not None and transcript.get("choice") == last_user:
+                        return transcript["content"]
+                return next(self._cycle)["content"]
+
+            # 客户端折叠上下文后较早的玩家消息不再发送，不能靠数消息得到轮数；
+            # 改为按对话中最后一条AI回复（由本服务生成）查出它是第几轮
+            previous = self._reply_turns.get(last_reply) if last_reply is not None else None
+            if previous is None:
+                # 不是本服务生成的回复（例如服务重启后读档），退回按玩家消息计数
+                turn = sum(1 for m in messages if m["role"] == "user")
+            else:
+                turn = previous + 1
+            content = self._synthetic_turn(turn)
+            self._reply_turns[content] = turn
+            self._reply_turns.move_to_end(content)
+            if len(self._reply_turns) > MAX_TRACKED_REPLIES:
+                self._reply_turns.popitem(last=False)
+            return content
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self.random.random() < self.error_rate
+
+    def _synthetic_turn(self, turn: int) -> str:
+        rand = self.random
+        lines = []
+        if rand.random() < 0.5:
+            lines.append(f"[sound]{rand.choice(self.sounds)}")
+        for _ in range(rand.randint(3, 6)):
+            lines.append(f"[text]{rand.choice(_SYNTHETIC_LINES)}")
+        if rand.random() < 0.6:
+            value = rand.choice([-10, -5, 5, 10])
+            name = rand.choice(self.attributes)
+            lines.append(f"[attribute={name}.{value}]{name}{'增加' if value > 0 else '减少'}了{abs(value)}")
+        if self.end_after and turn >= self.end_after:
+            lines.append("[end]故事在这里画上了句号。" + "".join(rand.sample(_SYNTHETIC_LINES, 3)))
+        else:
+            lines.append("[choice]" + "|".join(rand.sample(_SYNTHETIC_CHOICES, 3)))
+        return "\n".join(lines)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """处理OpenAI兼容的 /v1/chat/completions 与 /v1/models 请求"""
+
+    protocol_version = "HTTP/1.1"
+    settings: MockSettings = None
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock-model", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        settings = self.settings
+        settings.stats["requests"] += 1
+
+        if settings.should_fail():
+            settings.stats["errors"] += 1
+            time.sleep(settings.ttft)
+            self._send_json(settings.error_status, {"error": {"message": "injected error", "type": "server_error"}})
+            return
+
+        messages = body.get("messages", [])
+        model = body.get("model", "mock-model")
+        content = settings.next_turn(messages)
+        prompt_tokens = sum(estimate_tokens(m.get("content", "")) for m in messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": estimate_tokens(content),
+            "total_tokens": prompt_tokens + estimate_tokens(content)
+        }
+
+        if body.get("stream"):
+            settings.stats["streams"] += 1
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            self._stream(model, content, usage if include_usage else None)
+        else:
+            time.sleep(settings.ttft + self._generation_time(content))
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            })
+
+    def _stream(self, model: str, content: str, usage: Optional[Dict[str, int]]):
+        settings = self.settings
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        # 分块传输，流结束时发送终止块，连接可以继续复用
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        step = max(settings.chars_per_token, 1)
+        interval = 1.0 / settings.rate if settings.rate > 0 else 0.0
+        try:
+            time.sleep(settings.ttft)
+            for i in range(0, len(content), step):
+                self._send_event(self._chunk(completion_id, model, {"content": content[i:i + step]}))
+                if interval:
+                    time.sleep(interval)
+            self._send_event(self._chunk(completion_id, model, {}, finish_reason="stop"))
+            if usage is not None:
+                final = self._chunk(completion_id, model, {})
+                final["choices"] = []
+                final["usage"] = usage
+                self._send_event(final)
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端取消了请求
+            self.close_connection = True
+
+    def _generation_time(self, content: str) -> float:
+        rate = self.settings.rate
+        if rate <= 0:
+            return 0.0
+        return len(content) / max(self.settings.chars_per_token, 1) / rate
+
+    @staticmethod
+    def _chunk(completion_id: str, model: str, delta: Dict[str, str], finish_reason: Optional[str] = None):
+        return {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+
+    def _send_event(self, payload: Dict[str, Any]):
+        self._write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+    def _write_chunk(self, data: bytes):
+        """写出一个分块（空数据即终止块）"""
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def load_transcripts(path: str) -> List[Dict[str, Any]]:
+    """加载录制的回合（JSONL，每行包含 content，可选 choice 表示该回合对应的玩家选择）"""
+    transcripts = []
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                record["content"] = record.get("content") or record.get("response", "")
+                transcripts.append(record)
+    return transcripts
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0,
+                      settings: Optional[MockSettings] = None) -> ThreadingHTTPServer:
+    """在后台线程中启动模拟接口，返回服务器对象（server.server_port 为实际端口）"""
+    handler = type("BoundMockHandler", (MockHandler,), {"settings": settings or MockSettings()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地OpenAI兼容的模拟AI接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.5, help="首个token的延迟（秒）")
+    parser.add_argument("--rate", type=float, default=40.0, help="每秒输出的token数，<=0表示不限速")
+    parser.add_argument("--chars-per-token", type=int, default=2)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回错误的概率")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--end-after", type=int, default=0, help="第几轮之后输出[end]，0表示不结束")
+    parser.add_argument("--transcripts", help="录制回合的JSONL文件")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    sounds = None
+    config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.json")
+    if os.path.exists(config_path):
+        with open(config_path, 'r', encoding='utf-8') as file:
+            sounds = list(json.load(file).get("sounds", {})) or None
+
+    settings = MockSettings(
+        ttft=args.ttft,
+        rate=args.rate,
+        chars_per_token=args.chars_per_token,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        end_after=args.end_after,
+        transcripts=load_transcripts(args.transcripts) if args.transcripts else None,
+        sounds=sounds,
+        seed=args.seed
+    )
+    server = start_mock_server(args.host, args.port, settings)
+    print(f"模拟AI接口已启动: http://{args.host}:{server.server_port}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
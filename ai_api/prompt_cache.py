@@ -0,0 +1,105 @@
+"""
+系统提示渲染缓存
+"""
+
+import threading
+import weakref
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from ai_api.context_window import estimate_tokens
+from config.base import BaseConfig
+from config.config_manager import ConfigManager
+
+
+class PromptCache:
+    """
+    系统提示缓存
+
+    渲染结果按故事文件分别缓存，同一进程中不同作用域使用不同故事时互不影响。
+    每个结果记录渲染时故事快照的来源标识（文件路径、修改时间与大小），
+    新作用域加载了修改后的文件时来源不同，不会取到旧的结果；同一版本的文件在各作用域间共享结果。
+    缓存订阅全局/故事配置的变化：渲染用不到的键（story_keys、global_keys 以外，为空表示全部）
+    变化时把结果转记到新的来源标识上，不重新渲染；全局配置中相关的键变化时所有结果失效。
+    """
+
+    def __init__(self, render: Callable[[ConfigManager], str],
+                 story_keys: Iterable[str] = (), global_keys: Iterable[str] = ()):
+        self._render = render
+        self._story_keys = frozenset(story_keys)
+        self._global_keys = frozenset(global_keys)
+        self._lock = threading.Lock()
+        # 故事文件 -> ((全局代数, 故事快照来源), 渲染结果)
+        self._texts: Dict[Optional[str], Tuple[Tuple[int, tuple], str]] = {}
+        self._global_generation = 0                   # 相关的全局配置每变化一次加一
+        self._attached: 'weakref.WeakSet[BaseConfig]' = weakref.WeakSet()
+        self.stats = {"hits": 0, "renders": 0, "invalidations": 0}
+
+    def get(self, config_manager: ConfigManager) -> str:
+        """获取配置管理器（作用域）当前的故事对应的系统提示"""
+        self._attach(config_manager)
+        snapshot = config_manager.story_config.snapshot()
+        story_file = snapshot.file
+        with self._lock:
+            generation = (self._global_generation, snapshot.source)
+            cached = self._texts.get(story_file)
+            if cached is not None and cached[0] == generation:
+                self.stats["hits"] += 1
+                return cached[1]
+
+        text = self._render(config_manager)
+        with self._lock:
+            self._texts[story_file] = (generation, text)
+            self.stats["renders"] += 1
+        print(f"系统提示已重新渲染：{len(text)}字，约{estimate_tokens(text)} tokens")
+        return text
+
+    def invalidate(self, story_file: Optional[str] = None):
+        """清除缓存的渲染结果（指定故事文件时只清除该故事的结果）"""
+        with self._lock:
+            if story_file is None:
+                self._global_generation += 1
+                self._texts.clear()
+            else:
+                self._texts.pop(story_file, None)
+            self.stats["invalidations"] += 1
+
+    def get_status(self) -> dict:
+        """获取缓存状态（包括渲染结果的大小）"""
+        with self._lock:
+            texts = [text for _, text in self._texts.values()]
+        return {
+            "cached": len(texts),
+            "chars": sum(len(text) for text in texts),
+            "bytes": sum(len(text.encode('utf-8')) for text in texts),
+            "tokens": sum(estimate_tokens(text) for text in texts),
+            **self.stats
+        }
+
+    def _attach(self, config_manager: ConfigManager):
+        """首次使用某个配置对象时订阅其变化"""
+        for config, handler in ((config_manager.story_config, self._on_story_change),
+                                (config_manager.global_config, self._on_global_change)):
+            if config in self._attached:
+                continue
+            with self._lock:
+                if config in self._attached:
+                    continue
+                self._attached.add(config)
+            config.subscribe(handler)
+
+    def _on_story_change(self, previous, snapshot, changed):
+        # 切换故事文件不需要处理，新文件的结果单独缓存
+        if snapshot.file is None or snapshot.file != previous.file:
+            return
+        if not self._story_keys or changed & self._story_keys:
+            self.invalidate(snapshot.file)
+            return
+        # 渲染用到的键没有变化：旧版本的结果同样适用于新版本
+        with self._lock:
+            cached = self._texts.get(snapshot.file)
+            if cached is not None and cached[0][1] == previous.source:
+                self._texts[snapshot.file] = ((cached[0][0], snapshot.source), cached[1])
+
+    def _on_global_change(self, previous, snapshot, changed):
+        if not self._global_keys or changed & self._global_keys:
+            self.invalidate()
@@ -0,0 +1,255 @@
+"""
+AI接口请求策略：截止时间、指数退避重试与对冲请求
+"""
+
+import asyncio
+import inspect
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+T = TypeVar('T')
+
+# 可重试的HTTP状态码
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# 对冲请求共用的线程池
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ai-request")
+
+
+class DeadlineExceeded(Exception):
+    """本回合的请求时间预算已耗尽"""
+
+
+def is_retryable(error: Exception) -> bool:
+    """判断错误是否值得重试"""
+    # 出错时客户端早已创建，openai 已经导入，这里不会产生额外的导入开销
+    import openai
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS
+    return False
+
+
+class RequestPolicy:
+    """
+    请求策略
+
+    每次调用有一个总的截止时间（deadline）；可重试的错误按带抖动的指数退避重试，
+    单次尝试的超时不超过剩余预算。启用对冲时，如果首个尝试在历史延迟的
+    hedge_percentile 分位时间内还没有完成，就再发出一个相同的请求，先完成者胜出。
+    """
+
+    def __init__(self, timeout: float, deadline: float, max_retries: int = 3,
+                 backoff_base: float = 1.0, backoff_max: float = 20.0,
+                 hedge: bool = False, hedge_percentile: float = 95, hedge_min_samples: int = 5):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self.stats = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0}
+
+    def call(self, fn: Callable[[float], T], kind: str = "default", hedge: bool = True,
+             discard: Optional[Callable[[T], None]] = None, trace=None) -> T:
+        """
+        按策略执行请求
+
+        Args:
+            fn: 执行一次尝试的函数，参数为本次尝试的超时时间（秒）
+            kind: 延迟统计的类别（不同类别的请求分别计算对冲阈值）
+            hedge: 本次调用是否允许对冲
+            discard: 对冲中落败的结果的清理函数（例如关闭多余的流）
+            trace: 可选的请求指标记录（RequestTrace），会记录重试次数与是否对冲
+        """
+        self.stats["calls"] += 1
+        deadline_at = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                self.stats["failures"] += 1
+                raise DeadlineExceeded(f"请求超过截止时间（{self.deadline}秒）")
+
+            timeout = min(self.timeout, remaining)
+            start_time = time.monotonic()
+            try:
+                if hedge and self.hedge:
+                    result = self._hedged_call(fn, timeout, kind, discard, trace)
+                else:
+                    result = fn(timeout)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline_at, trace)
+                attempt += 1
+                time.sleep(delay)
+                continue
+
+            self.record_latency(kind, time.monotonic() - start_time)
+            return result
+
+    async def call_async(self, fn: Callable[[float], Awaitable[T]], kind: str = "default", hedge: bool = True,
+                         discard: Optional[Callable[[T], Any]] = None, trace=None) -> T:
+        """
+        按策略执行异步请求（参数同 call，fn 与 discard 可以返回协程）
+
+        等待退避与对冲时不占用线程；对冲中落败的请求直接被取消
+        """
+        self.stats["calls"] += 1
+        deadline_at = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                self.stats["failures"] += 1
+                raise DeadlineExceeded(f"请求超过截止时间（{self.deadline}秒）")
+
+            timeout = min(self.timeout, remaining)
+            start_time = time.monotonic()
+            try:
+                if hedge and self.hedge:
+                    result = await self._hedged_call_async(fn, timeout, kind, discard, trace)
+                else:
+                    result = await fn(timeout)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline_at, trace)
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+
+            self.record_latency(kind, time.monotonic() - start_time)
+            return result
+
+    def _retry_delay(self, error: Exception, attempt: int, deadline_at: float, trace) -> float:
+        """判断失败的尝试能否重试，返回退避时间；不能重试时抛出异常"""
+        if not is_retryable(error) or attempt >= self.max_retries:
+            self.stats["failures"] += 1
+            raise error
+        delay = self._backoff(attempt)
+        if time.monotonic() + delay >= deadline_at:
+            self.stats["failures"] += 1
+            raise DeadlineExceeded(f"请求超过截止时间（{self.deadline}秒），最后一次错误: {error}") from error
+        self.stats["retries"] += 1
+        if trace is not None:
+            trace.retries += 1
+        print(f"请求失败（{error}），{delay:.1f}秒后进行第{attempt + 1}次重试")
+        return delay
+
+    def record_latency(self, kind: str, latency: float):
+        """记录一次成功请求的延迟"""
+        with self._lock:
+            samples = self._latencies.setdefault(kind, deque(maxlen=200))
+            samples.append(latency)
+
+    def hedge_delay(self, kind: str) -> Optional[float]:
+        """对冲阈值：历史延迟的分位数；样本不足时返回None（不对冲）"""
+        with self._lock:
+            samples = sorted(self._latencies.get(kind, ()))
+        if len(samples) < self.hedge_min_samples:
+            return None
+        index = min(int(len(samples) * self.hedge_percentile / 100), len(samples) - 1)
+        return samples[index]
+
+    def _backoff(self, attempt: int) -> float:
+        """带完全抖动的指数退避"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _hedged_call(self, fn: Callable[[float], T], timeout: float, kind: str,
+                     discard: Optional[Callable[[T], None]], trace) -> T:
+        delay = self.hedge_delay(kind)
+        if delay is None or delay >= timeout:
+            return fn(timeout)
+
+        primary = _executor.submit(fn, timeout)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        print(f"请求超过{delay:.2f}秒未完成，发出对冲请求")
+        self.stats["hedges"] += 1
+        if trace is not None:
+            trace.hedged = True
+        backup = _executor.submit(fn, timeout)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                if future is backup:
+                    self.stats["hedge_wins"] += 1
+                # 另一个请求完成后丢弃其结果
+                other = primary if future is backup else backup
+                other.add_done_callback(lambda f: _discard_result(f, discard))
+                return future.result()
+        raise error
+
+
+    async def _hedged_call_async(self, fn: Callable[[float], Awaitable[T]], timeout: float, kind: str,
+                                 discard: Optional[Callable[[T], Any]], trace) -> T:
+        delay = self.hedge_delay(kind)
+        if delay is None or delay >= timeout:
+            return await fn(timeout)
+
+        primary = asyncio.ensure_future(fn(timeout))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        print(f"请求超过{delay:.2f}秒未完成，发出对冲请求")
+        self.stats["hedges"] += 1
+        if trace is not None:
+            trace.hedged = True
+        backup = asyncio.ensure_future(fn(timeout))
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is None:
+                    error = next(iter(done)).exception()
+                    continue
+                if winner is backup:
+                    self.stats["hedge_wins"] += 1
+                # 同时完成的另一个请求丢弃其结果
+                for task in done:
+                    if task is not winner and task.exception() is None:
+                        await _discard_result_async(task.result(), discard)
+                return winner.result()
+            raise error
+        finally:
+            # 落败或被取消时，取消仍在进行的请求
+            for task in pending:
+                task.cancel()
+
+
+def _discard_result(future, discard):
+    if discard is None or future.cancelled() or future.exception() is not None:
+        return
+    try:
+        discard(future.result())
+    except Exception as e:
+        print(f"清理对冲请求结果失败: {e}")
+
+
+async def _discard_result_async(result, discard):
+    if discard is None:
+        return
+    try:
+        cleanup = discard(result)
+        if inspect.isawaitable(cleanup):
+            await cleanup
+    except Exception as e:
+        print(f"清理对冲请求结果失败: {e}")
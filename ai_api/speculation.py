@@ -0,0 +1,242 @@
+"""
+选项分支的推测式预生成
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from typing import Dict, List, Optional
+
+from ai_api import event_loop
+
+
+class SpeculativeBranch:
+    """
+    一个选项分支的后台请求
+
+    分支持有一个分叉出来的会话（历史中已追加玩家选择），
+    增量文本在到达时累积，可以在请求完成前被消费方接管。
+    同步会话用 run/iter_deltas，异步会话用 run_async/aiter_deltas（在共享事件循环中）。
+    """
+
+    def __init__(self, session, choice_text: str):
+        self.session = session
+        self.choice_text = choice_text
+        self.cancel_event = threading.Event()
+        self.created_at = time.monotonic()
+        self.parts: List[str] = []
+        self.started = False
+        self.done = False
+        self.succeeded = False
+        self._cond = threading.Condition()
+        self._changed = asyncio.Event()  # 异步消费方的唤醒信号
+
+    def _begin(self) -> bool:
+        """请求开始前调用，标记为已开始；分支已被取消时返回False"""
+        with self._cond:
+            if self.cancel_event.is_set():
+                return False
+            self.started = True
+            return True
+
+    def run(self):
+        """执行分支请求（在后台线程中调用）"""
+        if not self._begin():
+            return
+        try:
+            for delta in self.session.stream_response(
+                    cancel_event=self.cancel_event, hedge=False, queued_at=self.created_at):
+                self._append(delta)
+        finally:
+            self._complete()
+
+    async def run_async(self):
+        """执行分支请求（异步会话，在共享事件循环中调用）"""
+        if not self._begin():
+            return
+        try:
+            async for delta in self.session.stream_response(
+                    cancel_event=self.cancel_event, hedge=False, queued_at=self.created_at):
+                self._append(delta)
+        finally:
+            self._complete()
+
+    def _append(self, delta: str):
+        with self._cond:
+            self.parts.append(delta)
+            self._cond.notify_all()
+        self._wake()
+
+    def _complete(self):
+        with self._cond:
+            last = self.session.messages[-1]
+            self.succeeded = not self.cancel_event.is_set() and last["role"] == "assistant"
+            self.done = True
+            self._cond.notify_all()
+        self._wake()
+
+    def _wake(self):
+        if getattr(self.session, "is_async", False):
+            event_loop.get_event_loop().call_soon_threadsafe(self._changed.set)
+
+    def cancel(self):
+        """取消分支请求"""
+        self.cancel_event.set()
+        with self._cond:
+            if not self.started:
+                self.done = True
+            self._cond.notify_all()
+        self._wake()
+
+    def cancel_unstarted(self) -> bool:
+        """分支尚未开始请求时将其取消并返回True；已开始时不做任何事，返回False"""
+        with self._cond:
+            if self.started:
+                return False
+            self.cancel_event.set()
+            self.done = True
+            self._cond.notify_all()
+        self._wake()
+        return True
+
+    def iter_deltas(self):
+        """依次产出已到达和后续到达的增量文本，直到分支结束"""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.parts) and not self.done:
+                    self._cond.wait()
+                new_parts = self.parts[index:]
+                done = self.done
+            for part in new_parts:
+                yield part
+            index += len(new_parts)
+            if done and index >= len(self.parts):
+                return
+
+    async def aiter_deltas(self):
+        """iter_deltas 的异步版本，等待时不阻塞事件循环"""
+        index = 0
+        while True:
+            self._changed.clear()
+            with self._cond:
+                new_parts = self.parts[index:]
+                done = self.done
+            for part in new_parts:
+                yield part
+            index += len(new_parts)
+            if done and index >= len(self.parts):
+                return
+            if not new_parts:
+                await self._changed.wait()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+
+class Speculator:
+    """
+    推测执行器
+
+    在玩家阅读当前回合时，为每个选项分叉会话并在后台请求后续内容；
+    玩家选择后直接接管对应分支，其余分支被取消。
+    同一会话同时进行的推测请求数受 max_concurrent 限制。
+    """
+
+    def __init__(self, session, max_concurrent: int = 2):
+        self.session = session
+        self.max_concurrent = max(max_concurrent, 1)
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._async_slots: Optional[asyncio.Semaphore] = None
+        self._branches: Dict[str, SpeculativeBranch] = {}
+        self._lock = threading.Lock()  # 保护 _branches 与 stats（在多个线程中修改）
+        self.stats = {
+            "launched": 0,  # 创建的分支数
+            "hits": 0,      # 玩家选择命中且分支可用
+            "misses": 0,    # 玩家选择未能使用推测结果
+            "wasted": 0,    # 已发出请求但最终未被使用的分支数
+            "wasted_chars": 0  # 未被使用的分支已生成的字数
+        }
+
+    def start(self, choices: List[str]):
+        """为当前回合的所有选项启动推测请求"""
+        self.cancel_all()
+        with self._lock:
+            for choice_text in choices:
+                fork = self.session.fork()
+                fork.add_user_message(choice_text)
+                branch = SpeculativeBranch(fork, choice_text)
+                self._branches[choice_text] = branch
+                self.stats["launched"] += 1
+                if getattr(self.session, "is_async", False):
+                    event_loop.submit(self._run_branch_async(branch))
+                else:
+                    threading.Thread(
+                        target=contextvars.copy_context().run,
+                        args=(self._run_branch, branch),
+                        daemon=True
+                    ).start()
+
+    def take(self, choice_text: str) -> Optional[SpeculativeBranch]:
+        """取出玩家所选选项的分支，并取消其余分支；没有可用分支时返回None"""
+        with self._lock:
+            branch = self._branches.pop(choice_text, None)
+            others = list(self._branches.values())
+            self._branches.clear()
+
+        for other in others:
+            self._discard(other)
+
+        # 还在等待并发名额的分支不算命中：接管后要等被取消的分支让出名额（它们在分块之间才检查取消），
+        # 比直接请求更慢
+        if (branch is None or branch.cancelled or branch.cancel_unstarted()
+                or (branch.done and not branch.succeeded)):
+            with self._lock:
+                self.stats["misses"] += 1
+            if branch is not None:
+                self._discard(branch)
+            print(f"推测未命中: {choice_text}")
+            return None
+
+        with self._lock:
+            self.stats["hits"] += 1
+            stats = dict(self.stats)
+        print(f"推测命中: {choice_text}（推测统计: {stats}）")
+        return branch
+
+    def cancel_all(self):
+        """取消所有未被使用的分支"""
+        with self._lock:
+            branches = list(self._branches.values())
+            self._branches.clear()
+        for branch in branches:
+            self._discard(branch)
+
+    def _discard(self, branch: SpeculativeBranch):
+        branch.cancel()
+        if branch.started:
+            with branch._cond:
+                wasted_chars = sum(len(part) for part in branch.parts)
+            with self._lock:
+                self.stats["wasted"] += 1
+                self.stats["wasted_chars"] += wasted_chars
+
+    def _run_branch(self, branch: SpeculativeBranch):
+        # 等待空闲的并发名额，期间被取消则直接放弃
+        while not self._slots.acquire(timeout=0.1):
+            if branch.cancelled:
+                return
+        try:
+            if not branch.cancelled:
+                branch.run()
+        finally:
+            self._slots.release()
+
+    async def _run_branch_async(self, branch: SpeculativeBranch):
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrent)
+        async with self._async_slots:
+            if not branch.cancelled:
+                await branch.run_async()
@@ -0,0 +1,170 @@
+"""
+AI请求遥测：逐请求的延迟与吞吐指标
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from typing import Any, Deque, Dict, List, Optional
+
+# 滚动直方图统计的指标
+HISTOGRAM_METRICS = ("queue_wait", "ttft", "total", "chars_per_second")
+
+
+class RequestTrace:
+    """
+    单次请求的指标记录
+
+    时间均以秒为单位：queue_wait 为从发起调用到真正发出请求的等待，
+    ttft 为发出请求到首个增量到达（仅流式请求，非流式为 None），total 为发起调用到请求结束。
+    """
+
+    def __init__(self, kind: str, model: str, queued_at: Optional[float] = None, streaming: bool = False):
+        self.kind = kind
+        self.model = model
+        self.streaming = streaming
+        self.created_at = time.time()
+        self._queued = time.monotonic() if queued_at is None else queued_at
+        self._sent: Optional[float] = None
+        self._first: Optional[float] = None
+        self.retries = 0
+        self.hedged = False
+        self.chars = 0
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+
+    def mark_sent(self):
+        """请求即将发出"""
+        self._sent = time.monotonic()
+
+    def mark_first_token(self):
+        """首个字节或增量到达"""
+        if self._first is None:
+            self._first = time.monotonic()
+
+    def set_usage(self, usage):
+        """记录接口返回的token用量（response.usage）"""
+        if usage is None:
+            return
+        self.prompt_tokens = getattr(usage, "prompt_tokens", None)
+        self.completion_tokens = getattr(usage, "completion_tokens", None)
+
+    def finish(self, outcome: str) -> Dict[str, Any]:
+        """结束记录，返回指标字典"""
+        now = time.monotonic()
+        sent = self._sent if self._sent is not None else now
+        first = self._first
+        total = now - self._queued
+        # 流式请求的生成速度从首个增量开始计算，非流式请求从发出请求开始计算
+        generation = now - first if self.streaming and first is not None else now - sent
+        return {
+            "time": self.created_at,
+            "kind": self.kind,
+            "model": self.model,
+            "outcome": outcome,
+            "queue_wait": round(sent - self._queued, 4),
+            "ttft": round(first - sent, 4) if first is not None else None,
+            "total": round(total, 4),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "chars": self.chars,
+            "chars_per_second": round(self.chars / generation, 2) if self.chars and generation > 0 else None,
+            "retries": self.retries,
+            "hedged": self.hedged
+        }
+
+
+class LatencyHistogram:
+    """滚动窗口直方图：保留最近 window 个样本，按需计算分位数"""
+
+    def __init__(self, window: int = 500):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, value: float):
+        with self._lock:
+            self._samples.append(value)
+
+    def percentiles(self, points=(50, 95, 99)) -> Dict[str, Optional[float]]:
+        """计算分位数，返回 {"count", "p50", "p95", "p99"}"""
+        with self._lock:
+            samples = sorted(self._samples)
+        result: Dict[str, Optional[float]] = {"count": len(samples)}
+        for point in points:
+            if samples:
+                index = min(int(len(samples) * point / 100), len(samples) - 1)
+                result[f"p{point}"] = samples[index]
+            else:
+                result[f"p{point}"] = None
+        return result
+
+
+class Telemetry:
+    """
+    请求遥测
+
+    每条请求指标写入按大小轮转的JSONL文件，并计入进程内的滚动直方图
+    （按 kind 分类，可查询 p50/p95/p99）。
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = 5 * 1024 * 1024,
+                 backups: int = 3, window: int = 500):
+        self.window = window
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+        self._logger: Optional[logging.Logger] = None
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self._logger = logging.getLogger(f"ai_api.telemetry.{path}")
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            # 同一文件的遥测按新的设置重新创建时，关闭之前的文件
+            for previous in self._logger.handlers:
+                previous.close()
+            self._logger.handlers = [handler]
+
+    def record(self, metrics: Dict[str, Any]):
+        """记录一条请求指标"""
+        kind = metrics["kind"]
+        count_key = f"{kind}:{metrics['outcome']}"
+        with self._lock:
+            self._counts[count_key] = self._counts.get(count_key, 0) + 1
+        for name in HISTOGRAM_METRICS:
+            value = metrics.get(name)
+            if value is not None:
+                self._histogram(f"{kind}.{name}").add(value)
+
+        if self._logger:
+            self._logger.info(json.dumps(metrics, ensure_ascii=False))
+
+    def percentiles(self, kind: str, metric: str = "total") -> Dict[str, Optional[float]]:
+        """查询某类请求某项指标的 p50/p95/p99"""
+        return self._histogram(f"{kind}.{metric}").percentiles()
+
+    def get_summary(self) -> Dict[str, Any]:
+        """获取所有指标的分位数与各结果的计数"""
+        with self._lock:
+            names: List[str] = list(self._histograms)
+            counts = dict(self._counts)
+        return {
+            "counts": counts,
+            "percentiles": {name: self._histograms[name].percentiles() for name in names}
+        }
+
+    def _histogram(self, name: str) -> LatencyHistogram:
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = LatencyHistogram(self.window)
+                self._histograms[name] = histogram
+            return histogram
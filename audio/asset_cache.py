@@ -0,0 +1,182 @@
+"""
+音效的解码缓存：每个音效只解码一次，以原始PCM文件保存，播放时内存映射
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from typing import Callable, Dict, Optional, Tuple
+
+# 缓存文件头: 标识, 源文件修改时间, 源文件大小, 采样率, 声道数
+HEADER = struct.Struct('<8sqqII')
+MAGIC = b'AVGPCM01'
+
+# 解码函数: 源文件路径 -> (16位有符号样本, 采样率, 声道数)
+Decoder = Callable[[str], Tuple[array, int, int]]
+
+
+def miniaudio_decoder(sample_rate: int, channels: int) -> Decoder:
+    """使用 miniaudio 解码为指定采样率与声道数的16位PCM"""
+    import miniaudio
+
+    def decode(path: str) -> Tuple[array, int, int]:
+        decoded = miniaudio.decode_file(
+            path,
+            output_format=miniaudio.SampleFormat.SIGNED16,
+            nchannels=channels,
+            sample_rate=sample_rate
+        )
+        return decoded.samples, sample_rate, channels
+    return decode
+
+
+class PcmCache:
+    """
+    解码后的PCM缓存
+
+    缓存文件以源文件的修改时间与大小校验，源文件变化后重新解码；
+    播放时对缓存文件做内存映射，样本由操作系统按需换入，常驻内存不随音效库的大小增长。
+    stats 中记录命中、解码次数与解码耗时，size() 统计缓存占用的磁盘空间。
+    """
+
+    def __init__(self, cache_dir: str, decode: Decoder):
+        self.cache_dir = cache_dir
+        self.decode = decode
+        self._lock = threading.Lock()  # 保护 _mapped、_path_locks 与 stats，不在持有时解码
+        self._path_locks: Dict[str, threading.Lock] = {}
+        # 源文件路径 -> (缓存文件头, 内存映射, 映射的整体视图, 样本视图)
+        self._mapped: Dict[str, Tuple[tuple, Optional[mmap.mmap], Optional[memoryview], memoryview]] = {}
+        self.stats = {"hits": 0, "decodes": 0, "decode_time": 0.0}
+
+    def cache_path(self, source_path: str) -> str:
+        digest = hashlib.sha1(os.path.abspath(source_path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.pcm")
+
+    def samples(self, source_path: str) -> memoryview:
+        """获取源文件解码后的样本（内存映射的16位样本视图），必要时先解码"""
+        stat = os.stat(source_path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        view = self._lookup(source_path, version)
+        if view is not None:
+            return view
+
+        # 解码与映射不持有整体的锁，预热一个音效时不影响其他音效开始播放；
+        # 同一文件由按路径的锁保证只解码一次
+        with self._lock:
+            path_lock = self._path_locks.setdefault(source_path, threading.Lock())
+        with path_lock:
+            view = self._lookup(source_path, version)
+            if view is not None:
+                return view
+            cache_path = self.cache_path(source_path)
+            header = self._read_header(cache_path)
+            if header is None or header[1:3] != version:
+                self._decode(source_path, cache_path, stat)
+            else:
+                with self._lock:
+                    self.stats["hits"] += 1
+            entry = self._map(cache_path)
+            with self._lock:
+                # 源文件变化前的旧映射可能仍在混音中使用，不主动关闭，交给垃圾回收释放
+                self._mapped[source_path] = entry
+        return entry[3]
+
+    def _lookup(self, source_path: str, version: Tuple[int, int]) -> Optional[memoryview]:
+        """已映射且与源文件版本一致时返回样本视图"""
+        with self._lock:
+            mapped = self._mapped.get(source_path)
+            if mapped is not None and mapped[0][1:3] == version:
+                self.stats["hits"] += 1
+                return mapped[3]
+        return None
+
+    def warm(self, source_path: str) -> bool:
+        """预先解码并映射（在后台线程中调用），成功时返回True"""
+        try:
+            self.samples(source_path)
+            return True
+        except Exception as e:
+            print(f"预热音效失败: {source_path} ({e})")
+            return False
+
+    def size(self) -> Tuple[int, int]:
+        """缓存目录中的 (文件数, 总字节数)"""
+        files = total = 0
+        try:
+            with os.scandir(self.cache_dir) as scanner:
+                for entry in scanner:
+                    if entry.name.endswith('.pcm'):
+                        files += 1
+                        total += entry.stat().st_size
+        except OSError:
+            pass
+        return files, total
+
+    def report(self) -> str:
+        files, total = self.size()
+        return (f"音效缓存：{files}个文件，{total / 1024 / 1024:.1f}MB，"
+                f"命中{self.stats['hits']}次，解码{self.stats['decodes']}次"
+                f"（共{self.stats['decode_time'] * 1000:.0f}毫秒）")
+
+    def close(self):
+        """解除所有内存映射"""
+        with self._lock:
+            mapped = list(self._mapped.values())
+            self._mapped.clear()
+        busy = 0
+        for _, mapping, whole, view in mapped:
+            try:
+                # 样本视图与其来源的整体视图都释放后，映射才能关闭
+                view.release()
+                if whole is not None:
+                    whole.release()
+                if mapping is not None:
+                    mapping.close()
+            except BufferError:
+                # 仍有正在播放的片段引用映射，交给垃圾回收释放
+                busy += 1
+        if busy:
+            print(f"音效缓存：{busy}个映射仍在使用，稍后由垃圾回收释放")
+
+    def _decode(self, source_path: str, cache_path: str, stat: os.stat_result):
+        start_time = time.perf_counter()
+        samples, sample_rate, channels = self.decode(source_path)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # 先写临时文件再替换，其他进程不会读到写入到一半的缓存
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, stat.st_mtime_ns, stat.st_size, sample_rate, channels))
+            file.write(memoryview(samples).cast('B'))
+        os.replace(temp_path, cache_path)
+        elapsed = time.perf_counter() - start_time
+        with self._lock:
+            self.stats["decodes"] += 1
+            self.stats["decode_time"] += elapsed
+        print(f"音效已解码并缓存：{os.path.basename(source_path)}，耗时{elapsed * 1000:.1f}毫秒")
+
+    def _map(self, cache_path: str) -> tuple:
+        """映射缓存文件，返回 (缓存文件头, 内存映射, 映射的整体视图, 样本视图)"""
+        with open(cache_path, 'rb') as file:
+            header = HEADER.unpack(file.read(HEADER.size))
+            if os.fstat(file.fileno()).st_size == HEADER.size:
+                return header, None, None, memoryview(b'').cast('h')
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        # 切片与转换得到的视图都引用整体视图，保留它以便关闭时先释放
+        whole = memoryview(mapping)
+        return header, mapping, whole, whole[HEADER.size:].cast('h')
+
+    @staticmethod
+    def _read_header(cache_path: str) -> Optional[tuple]:
+        try:
+            with open(cache_path, 'rb') as file:
+                data = file.read(HEADER.size)
+        except OSError:
+            return None
+        if len(data) != HEADER.size:
+            return None
+        header = HEADER.unpack(data)
+        return header if header[0] == MAGIC else None
@@ -1,4 +1,541 @@
-# 预留：音频播放控制
+"""
+音频引擎：音效表、同时发声数限制与单线程播放控制
+"""
+
+import itertools
+import os
+import queue
+import threading
+import time
+import warnings
+from array import array
+from typing import Any, Callable, Dict, List, Optional
+
+from audio.asset_cache import PcmCache, miniaudio_decoder
+from config.decorators import config_value, get_config_dir, get_config_manager
+
+# 混音输出格式（miniaudio 后端）
+SAMPLE_RATE = 44100
+CHANNELS = 2
+SAMPLE_WIDTH = 2  # 16位样本
+
+# 有正在播放的声音时，工作线程检查声音是否结束的间隔（秒）
+POLL_INTERVAL = 0.05
+
+
+@config_value("audio.max_voices", 4)
+def get_max_voices(max_voices):
+    return max_voices
+
+@config_value("audio.backend", "auto")
+def get_backend(backend):
+    return backend
+
+@config_value("audio.sounds_path", "data/sounds")
+def get_sounds_path(sounds_path):
+    return sounds_path
+
+@config_value("audio.cache_enabled", True)
+def get_cache_enabled(cache_enabled):
+    return cache_enabled
+
+@config_value("audio.cache_path", "data/cache/audio")
+def get_cache_path(cache_path):
+    return cache_path
+
+
+class SoundAsset:
+    """音效表中的一个音效"""
+
+    __slots__ = ("name", "path", "duration", "description")
+
+    def __init__(self, name: str, path: str, duration: Optional[float] = None, description: str = ""):
+        self.name = name
+        self.path = path
+        self.duration = duration
+        self.description = description
+
+
+class SoundRegistry:
+    """
+    音效表
+
+    根据全局配置的 sounds 一次性建立 音效名 -> 文件路径 的映射，
+    订阅全局配置后，只有 sounds 变化时才重新建立。
+    """
+
+    def __init__(self, sounds_dir: str, sounds: Optional[Dict[str, Any]] = None, extension: str = ".mp3"):
+        self.sounds_dir = sounds_dir
+        self.extension = extension
+        self._assets: Dict[str, SoundAsset] = {}
+        self.load(sounds or {})
+
+    def load(self, sounds: Dict[str, Any]):
+        """按配置的 sounds 重新建立音效表（整体替换，播放线程读取不需要加锁）"""
+        assets = {}
+        for name, data in sounds.items():
+            data = data if isinstance(data, dict) else {}
+            assets[name] = SoundAsset(
+                name,
+                os.path.join(self.sounds_dir, f"{name}{self.extension}"),
+                data.get("duration"),
+                data.get("description", "")
+            )
+        self._assets = assets
+
+    def attach(self, global_config):
+        """订阅全局配置，sounds 变化时重新建立音效表"""
+        def on_change(previous, snapshot, changed):
+            if "sounds" in changed:
+                self.load(snapshot.get("sounds") or {})
+                print(f"音效表已更新：{len(self._assets)}个音效")
+        global_config.subscribe(on_change)
+
+    def get(self, name: str) -> Optional[SoundAsset]:
+        return self._assets.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._assets
+
+    def names(self) -> List[str]:
+        return list(self._assets)
+
+
+class Voice:
+    """一个正在播放的声音"""
+
+    __slots__ = ("voice_id", "asset", "started", "handle", "on_finished")
+
+    def __init__(self, voice_id: int, asset: SoundAsset, on_finished: Optional[Callable[[int], None]]):
+        self.voice_id = voice_id
+        self.asset = asset
+        self.started = time.monotonic()
+        self.handle = None
+        self.on_finished = on_finished
+
+
+class MiniaudioBackend:
+    """
+    miniaudio 后端：一个输出设备，所有声音在设备的回调中混音
+
+    设置了解码缓存时，样本来自内存映射的PCM缓存文件；否则首次播放时解码并保留在内存中
+    """
+
+    name = "miniaudio"
+
+    def __init__(self, cache: Optional[PcmCache] = None):
+        import miniaudio
+        with warnings.catch_warnings():
+            # audioop 在 Python 3.13 中移除，之后的版本由 audioop-lts 提供同名模块
+            warnings.simplefilter("ignore", DeprecationWarning)
+            import audioop
+        self._miniaudio = miniaudio
+        self._audioop = audioop
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._playing: Dict[int, List] = {}  # 声音编号 -> [PCM样本, 播放位置]
+        self._decoded: Dict[str, array] = {}
+        self._device = miniaudio.PlaybackDevice(
+            output_format=miniaudio.SampleFormat.SIGNED16,
+            nchannels=CHANNELS,
+            sample_rate=SAMPLE_RATE
+        )
+        mixer = self._mix()
+        next(mixer)
+        self._device.start(mixer)
+
+    def load(self, asset: SoundAsset):
+        if self.cache is not None:
+            return self.cache.samples(asset.path)
+        samples = self._decoded.get(asset.path)
+        if samples is None:
+            samples, _, _ = miniaudio_decoder(SAMPLE_RATE, CHANNELS)(asset.path)
+            self._decoded[asset.path] = samples
+        return samples
+
+    def start(self, voice: Voice):
+        samples = self.load(voice.asset)
+        with self._lock:
+            self._playing[voice.voice_id] = [samples, 0]
+        voice.handle = voice.voice_id
+
+    def stop(self, voice: Voice):
+        with self._lock:
+            self._playing.pop(voice.voice_id, None)
+
+    def is_playing(self, voice: Voice) -> bool:
+        return voice.voice_id in self._playing
+
+    def close(self):
+        self._device.close()
+        with self._lock:
+            self._playing.clear()
+
+    def _mix(self):
+        """设备回调：每次取出 required_frames 帧，把所有正在播放的声音相加"""
+        required_frames = yield b""
+        while True:
+            count = required_frames * CHANNELS
+            with self._lock:
+                parts = []
+                for voice_id, state in list(self._playing.items()):
+                    samples, position = state
+                    parts.append(samples[position:position + count])
+                    state[1] = position + count
+                    if state[1] >= len(samples):
+                        del self._playing[voice_id]
+
+            # 混音在C中整块完成（audioop.add 逐样本相加并限制在16位范围内），
+            # 设备回调中不做逐样本的Python循环
+            size = count * SAMPLE_WIDTH
+            if not parts:
+                data = bytes(size)
+            else:
+                data = self._padded(parts[0], size)
+                for part in parts[1:]:
+                    data = self._audioop.add(data, self._padded(part, size), SAMPLE_WIDTH)
+            mixed = array('h')
+            mixed.frombytes(data)
+            required_frames = yield mixed
+
+    @staticmethod
+    def _padded(part, size: int):
+        """样本片段的字节视图，最后一段不足 size 字节时补静音"""
+        data = memoryview(part).cast('B')
+        if len(data) < size:
+            return bytes(data) + bytes(size - len(data))
+        return data
+
+
+class PlaysoundBackend:
+    """
+    playsound 后端（未安装 miniaudio 时使用）
+
+    playsound 只能阻塞播放且不能中途停止，由固定数量（同时发声数）的常驻线程播放；
+    被抢占或停止的声音如果还没开始播放则直接丢弃。
+    """
+
+    name = "playsound"
+
+    def __init__(self, max_voices: int):
+        from playsound import playsound
+        self._playsound = playsound
+        self._pending: "queue.SimpleQueue[Optional[Voice]]" = queue.SimpleQueue()
+        self._queued: set = set()     # 等待播放线程的声音
+        self._playing: set = set()    # 正在播放的声音
+        self._cancelled: set = set()  # 开始播放前被停止的声音
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._player, name=f"audio-player-{i}", daemon=True)
+            for i in range(max_voices)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def start(self, voice: Voice):
+        with self._lock:
+            self._queued.add(voice.voice_id)
+        voice.handle = voice.voice_id
+        self._pending.put(voice)
+
+    def stop(self, voice: Voice):
+        with self._lock:
+            if voice.voice_id in self._queued:
+                self._cancelled.add(voice.voice_id)
+
+    def is_playing(self, voice: Voice) -> bool:
+        with self._lock:
+            return voice.voice_id in self._queued or voice.voice_id in self._playing
+
+    def close(self):
+        for _ in self._threads:
+            self._pending.put(None)
+
+    def _player(self):
+        while True:
+            voice = self._pending.get()
+            if voice is None:
+                return
+            with self._lock:
+                self._queued.discard(voice.voice_id)
+                if voice.voice_id in self._cancelled:
+                    self._cancelled.discard(voice.voice_id)
+                    continue
+                self._playing.add(voice.voice_id)
+            try:
+                self._playsound(voice.asset.path)
+            except Exception as e:
+                print(f"播放声音失败: {e}")
+            finally:
+                with self._lock:
+                    self._playing.discard(voice.voice_id)
+
+
+def create_backend(backend: str, max_voices: int, cache: Optional[PcmCache] = None):
+    """按配置创建播放后端：auto 时优先 miniaudio，不可用时退回 playsound（playsound 直接播放源文件，不使用解码缓存）"""
+    names = ["miniaudio", "playsound"] if backend == "auto" else [backend]
+    for name in names:
+        try:
+            if name == "miniaudio":
+                return MiniaudioBackend(cache)
+            if name == "playsound":
+                return PlaysoundBackend(max_voices)
+        except Exception as e:
+            print(f"音频后端 {name} 不可用: {e}")
+    return None
+
+
+class AudioEngine:
+    """
+    音频引擎
+
+    界面只调用 play()/stop() 把命令放入队列，立即返回；所有播放控制在一个常驻的工作线程中执行。
+    同时发声数超过 max_voices 时，停止最早开始的声音（抢占）。
+    声音结束（或被停止、抢占）后在工作线程中调用 on_finished(声音编号)。
+    """
+
+    def __init__(self, registry: SoundRegistry, max_voices: int = 4, backend: str = "auto",
+                 cache: Optional[PcmCache] = None):
+        self.registry = registry
+        self.max_voices = max(max_voices, 1)
+        self.backend_name = backend
+        self.cache = cache
+        self.backend = None
+        self._backend_ready = threading.Event()  # 工作线程创建（或未能创建）后端后设置
+        self._voices: Dict[int, Voice] = {}  # 只在工作线程中访问，按开始顺序排列
+        self._commands: "queue.SimpleQueue[tuple]" = queue.SimpleQueue()
+        self._ids = itertools.count(1)
+        self.stats = {"played": 0, "stolen": 0, "stopped": 0, "missing": 0, "warmed": 0}
+        self._reported: set = set()  # 已经提示过的未知音效名与缺失的文件
+        self._warm_queue: "queue.SimpleQueue[SoundAsset]" = queue.SimpleQueue()
+        self._warm_pending: set = set()
+        self._warm_lock = threading.Lock()
+        self._warm_thread: Optional[threading.Thread] = None
+        self._thread = threading.Thread(target=self._run, name="audio-engine", daemon=True)
+        self._thread.start()
+
+    def play(self, name: str, on_finished: Optional[Callable[[int], None]] = None) -> Optional[int]:
+        """播放音效表中的音效（不阻塞），返回声音编号；音效不存在时返回None"""
+        asset = self.registry.get(name)
+        if asset is None:
+            self.stats["missing"] += 1
+            self._report(name, f"未知的音效: {name}")
+            return None
+        return self.play_asset(asset, on_finished)
+
+    def preload(self, names: List[str]) -> List[str]:
+        """
+        校验即将播放的音效，并在后台线程中预热（解码缓存或读入系统缓存），不阻塞
+
+        Returns:
+            音效表中不存在的音效名（每个名字只提示一次）
+        """
+        unknown = []
+        for name in names:
+            asset = self.registry.get(name)
+            if asset is None:
+                unknown.append(name)
+                self._report(name, f"未知的音效: {name}（音效表中没有该音效，将不会播放）")
+                continue
+            with self._warm_lock:
+                if asset.path in self._warm_pending:
+                    continue
+                self._warm_pending.add(asset.path)
+                if self._warm_thread is None:
+                    self._warm_thread = threading.Thread(target=self._warmer, name="audio-warmer", daemon=True)
+                    self._warm_thread.start()
+            self._warm_queue.put(asset)
+        return unknown
+
+    def _warmer(self):
+        """预热线程：依次加载排队的音效，不占用播放控制线程"""
+        # 按实际创建的后端决定预热方式（auto 可能退回 playsound）
+        self._backend_ready.wait()
+        backend = self.backend
+        uses_cache = self.cache is not None and backend is not None and backend.name == "miniaudio"
+        while True:
+            asset = self._warm_queue.get()
+            try:
+                if not os.path.exists(asset.path):
+                    self._report(asset.path, f"音效文件不存在: {asset.path}")
+                elif backend is None:
+                    # 没有可用的后端，不会播放
+                    pass
+                elif uses_cache:
+                    if self.cache.warm(asset.path):
+                        self.stats["warmed"] += 1
+                else:
+                    # 直接播放源文件的后端：把文件读入系统缓存
+                    with open(asset.path, 'rb') as file:
+                        while file.read(1 << 16):
+                            pass
+                    self.stats["warmed"] += 1
+            except OSError as e:
+                print(f"预热音效失败: {asset.name} ({e})")
+            finally:
+                with self._warm_lock:
+                    self._warm_pending.discard(asset.path)
+
+    def _report(self, key: str, message: str):
+        # 同一个问题只提示一次
+        if key not in self._reported:
+            self._reported.add(key)
+            print(message)
+
+    def play_asset(self, asset: SoundAsset, on_finished: Optional[Callable[[int], None]] = None) -> int:
+        voice_id = next(self._ids)
+        self._commands.put(("play", voice_id, asset, on_finished))
+        return voice_id
+
+    def stop(self, voice_id: Optional[int] = None):
+        """停止一个声音（不指定时停止全部），不阻塞"""
+        self._commands.put(("stop", voice_id))
+
+    def shutdown(self, timeout: float = 2.0):
+        """停止所有声音并结束工作线程"""
+        self._commands.put(("shutdown",))
+        self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            self.backend = create_backend(self.backend_name, self.max_voices, self.cache)
+        finally:
+            self._backend_ready.set()
+        while True:
+            try:
+                command = self._commands.get(timeout=POLL_INTERVAL if self._voices else None)
+            except queue.Empty:
+                command = None
+
+            if command is not None:
+                kind = command[0]
+                if kind == "play":
+                    self._start(*command[1:])
+                elif kind == "stop":
+                    self._stop(command[1])
+                elif kind == "shutdown":
+                    self._stop(None)
+                    if self.backend is not None:
+                        self.backend.close()
+                    if self.cache is not None:
+                        print(self.cache.report())
+                        self.cache.close()
+                    return
+            self._reap()
+
+    def _start(self, voice_id: int, asset: SoundAsset, on_finished):
+        voice = Voice(voice_id, asset, on_finished)
+        if self.backend is None:
+            self._finish(voice)
+            return
+        # 超出同时发声数时抢占最早开始的声音
+        while len(self._voices) >= self.max_voices:
+            oldest = next(iter(self._voices.values()))
+            self._remove(oldest)
+            self.stats["stolen"] += 1
+        try:
+            self.backend.start(voice)
+        except Exception as e:
+            print(f"播放声音失败: {asset.name} ({e})")
+            self._finish(voice)
+            return
+        self._voices[voice_id] = voice
+        self.stats["played"] += 1
+
+    def _stop(self, voice_id: Optional[int]):
+        voices = list(self._voices.values()) if voice_id is None else [self._voices.get(voice_id)]
+        for voice in voices:
+            if voice is not None:
+                self._remove(voice)
+                self.stats["stopped"] += 1
+
+    def _remove(self, voice: Voice):
+        self._voices.pop(voice.voice_id, None)
+        try:
+            self.backend.stop(voice)
+        except Exception as e:
+            print(f"停止声音失败: {e}")
+        self._finish(voice)
+
+    def _reap(self):
+        """移除已经播放完的声音"""
+        for voice in list(self._voices.values()):
+            if not self.backend.is_playing(voice):
+                self._voices.pop(voice.voice_id, None)
+                self._finish(voice)
+
+    @staticmethod
+    def _finish(voice: Voice):
+        if voice.on_finished is not None:
+            try:
+                voice.on_finished(voice.voice_id)
+            except Exception as e:
+                print(f"声音结束回调失败: {e}")
+
+
+def create_pcm_cache() -> Optional[PcmCache]:
+    """按配置创建音效的解码缓存，未启用或没有可用的解码器时返回None"""
+    if not get_cache_enabled():
+        return None
+    try:
+        decode = miniaudio_decoder(SAMPLE_RATE, CHANNELS)
+    except ImportError:
+        return None
+    return PcmCache(os.path.join(get_config_dir() or os.getcwd(), get_cache_path()), decode)
+
+
+_engine: Optional[AudioEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_audio_engine() -> AudioEngine:
+    """获取进程内共享的音频引擎（第一次使用时按全局配置创建）"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            global_config = get_config_manager().global_config
+            sounds_dir = os.path.join(get_config_dir() or os.getcwd(), get_sounds_path())
+            registry = SoundRegistry(sounds_dir, global_config.get_value("sounds") or {})
+            registry.attach(global_config)
+            _engine = AudioEngine(registry, get_max_voices(), get_backend(), create_pcm_cache())
+        return _engine
+
+
+def play_sound(name: str, on_finished: Optional[Callable[[int], None]] = None) -> Optional[int]:
+    """按音效名播放（不阻塞），返回声音编号"""
+    return get_audio_engine().play(name, on_finished)
+
+
+def preload_sounds(names: List[str]) -> List[str]:
+    """校验并在后台预热即将播放的音效，返回未知的音效名"""
+    return get_audio_engine().preload(names)
+
+
+def stop_sound(voice_id: Optional[int] = None):
+    """停止一个声音（不指定时停止全部）"""
+    get_audio_engine().stop(voice_id)
+
+
 def play_audio(file_path):
-    # TODO: 实现音频播放
-    pass
\ No newline at end of file
+    """播放任意音频文件（不阻塞），返回声音编号"""
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    return get_audio_engine().play_asset(SoundAsset(name, file_path))
+
+
+def get_audio_status() -> Dict[str, Any]:
+    """音频引擎与解码缓存的统计"""
+    engine = get_audio_engine()
+    status = {"backend": getattr(engine.backend, "name", None), **engine.stats}
+    if engine.cache is not None:
+        files, total = engine.cache.size()
+        status["cache"] = dict(engine.cache.stats, files=files, bytes=total)
+    return status
+
+
+def shutdown_audio():
+    """停止所有声音并关闭音频引擎"""
+    global _engine
+    with _engine_lock:
+        engine, _engine = _engine, None
+    if engine is not None:
+        engine.shutdown()
@@ -1,15 +1,116 @@
-from typing import Any, Dict, Optional
+import itertools
+import os
+import threading
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set, Tuple
 
 from config.loaders import ConfigLoader
 
 
+def flatten_keys(data: Any, prefix: str = "", index: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    将嵌套的配置展开为 {点分隔的键路径: 值}，中间层的字典也保留在索引中
+
+    只展开不含 "." 的字符串键，与逐层查找时能访问到的键保持一致
+    """
+    if index is None:
+        index = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if not isinstance(key, str) or '.' in key:
+                continue
+            path = prefix + key
+            index[path] = value
+            flatten_keys(value, path + '.', index)
+    return index
+
+
+# 快照版本号在整个进程内递增，不同配置对象（包括各个作用域的故事配置）的版本号不会重复
+_snapshot_versions = itertools.count(1)
+
+
+def file_source(file_path: str) -> Optional[Tuple[str, int, int]]:
+    """配置文件的来源标识 (绝对路径, 修改时间, 大小)，文件不存在时返回None"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size
+
+
+class ConfigSnapshot:
+    """
+    某一版本的配置数据（不可变）
+
+    每次加载生成一个新快照并整体替换，读取方拿到的快照在之后的重新加载中不会被修改，
+    需要同时读取多个键时应先取得快照，避免前后读到不同版本。
+
+    source 标识快照数据的来源：从文件加载时为加载前文件的 (绝对路径, 修改时间, 大小)，
+    不同作用域加载同一版本的文件时相同，可以作为跨作用域共享的缓存键；
+    不是从文件加载的数据为 (文件, 版本号)，版本号在进程内唯一。
+    """
+
+    __slots__ = ("version", "file", "data", "index", "source")
+
+    def __init__(self, version: int, file: Optional[str], data: Dict[str, Any],
+                 source: Optional[Tuple] = None):
+        self.version = version
+        self.file = file
+        self.data = data
+        self.index: Mapping[str, Any] = MappingProxyType(flatten_keys(data))
+        self.source = source or (file, version)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """获取配置值（支持点分隔的嵌套键）"""
+        return self.index.get(key, default)
+
+    def changed_keys(self, other: 'ConfigSnapshot') -> Set[str]:
+        """与另一个快照相比发生变化的顶层键"""
+        keys = set(self.data) | set(other.data)
+        return {key for key in keys if self.data.get(key) != other.data.get(key)}
+
+
+# 订阅者: (旧快照, 新快照, 变化的顶层键) -> None
+ConfigListener = Callable[[ConfigSnapshot, ConfigSnapshot, Set[str]], None]
+
+
+class ConfigKey:
+    """
+    预编译的配置键句柄
+
+    记住上次读取时的配置快照与取到的值，配置版本不变时直接返回缓存的值；
+    快照是一次性替换的不可变对象，工作线程中读取不需要加锁。
+    """
+
+    __slots__ = ("config", "key", "default", "_cached")
+
+    def __init__(self, config: 'BaseConfig', key: str, default: Any = None):
+        self.config = config
+        self.key = key
+        self.default = default
+        self._cached: Tuple[Optional[ConfigSnapshot], Any] = (None, default)
+
+    def get(self) -> Any:
+        snapshot = self.config._snapshot
+        cached_snapshot, value = self._cached
+        if cached_snapshot is not snapshot:
+            value = snapshot.index.get(self.key, self.default)
+            self._cached = (snapshot, value)
+        return value
+
+    __call__ = get
+
+
 class BaseConfig:
     """基础配置类 - 封装通用功能"""
 
     def __init__(self, loader: ConfigLoader):
         self._loader = loader
-        self._data: Dict[str, Any] = {}
         self._current_file: Optional[str] = None
+        self._snapshot = ConfigSnapshot(0, None, {})
+        self._load_lock = threading.Lock()  # 串行化加载，读取不加锁
+        self._listeners: List[ConfigListener] = []
+        self._owned_keys: Dict[Any, ConfigKey] = {}
 
     def load(self, file_path: str) -> bool:
         """加载配置文件"""
@@ -21,25 +122,74 @@ class BaseConfig:
         if not self._current_file or not self._loader:
             return False
 
-        try:
-            self._data = self._loader.load(self._current_file)
-            print(f"配置加载成功: {self._current_file}")
-            return True
-        except Exception as e:
-            print(f"配置加载失败: {e}")
-            return False
+        with self._load_lock:
+            # 在读取之前记录文件状态，读取期间文件被修改时下次加载的来源标识会不同
+            source = file_source(self._current_file)
+            try:
+                data = self._loader.load(self._current_file)
+            except Exception as e:
+                print(f"配置加载失败: {e}")
+                return False
+            previous = self._snapshot
+            # 加载器在文件损坏或写入到一半时返回空数据，热重载时保留当前版本
+            if not data and previous.data and previous.file == self._current_file:
+                print(f"配置文件为空或解析失败，保留当前版本: {self._current_file}")
+                return False
+            snapshot = self._publish(data, source)
+        print(f"配置加载成功: {self._current_file}")
+        self._notify(previous, snapshot)
+        return True
+
+    def _publish(self, data: Dict[str, Any], source: Optional[Tuple] = None) -> ConfigSnapshot:
+        """生成新版本的快照并整体替换"""
+        snapshot = ConfigSnapshot(next(_snapshot_versions), self._current_file, data, source)
+        self._snapshot = snapshot
+        return snapshot
+
+    def _set_data(self, data: Dict[str, Any]):
+        """替换配置数据（生成新快照并通知订阅者）"""
+        with self._load_lock:
+            previous = self._snapshot
+            snapshot = self._publish(data)
+        self._notify(previous, snapshot)
+
+    def subscribe(self, listener: ConfigListener):
+        """订阅配置变化，每次发布新快照后以 (旧快照, 新快照, 变化的顶层键) 调用"""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: ConfigListener):
+        """取消订阅"""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, previous: ConfigSnapshot, snapshot: ConfigSnapshot):
+        changed = snapshot.changed_keys(previous)
+        if not changed and previous.file == snapshot.file:
+            return
+        for listener in list(self._listeners):
+            try:
+                listener(previous, snapshot, changed)
+            except Exception as e:
+                print(f"配置变化通知失败: {e}")
+
+    def snapshot(self) -> ConfigSnapshot:
+        """获取当前版本的配置快照"""
+        return self._snapshot
 
     def get_value(self, key: str, default: Any = None) -> Any:
         """获取配置值（支持点分隔的嵌套键）"""
-        keys = key.split('.')
-        value = self._data
-
-        for k in keys:
-            if isinstance(value, dict) and k in value:
-                value = value[k]
-            else:
-                return default
-        return value
+        return self._snapshot.index.get(key, default)
+
+    def key(self, key: str, default: Any = None) -> ConfigKey:
+        """获取预编译的配置键句柄，用于频繁读取同一个键"""
+        return ConfigKey(self, key, default)
+
+    def key_for(self, owner: Any, key: str, default: Any = None) -> ConfigKey:
+        """获取owner专用的键句柄，同一配置对象对每个owner只创建一次（供装饰器等长期使用）"""
+        handle = self._owned_keys.get(owner)
+        if handle is None:
+            handle = self._owned_keys[owner] = ConfigKey(self, key, default)
+        return handle
 
     def set_loader(self, loader: ConfigLoader):
         """动态设置加载器"""
@@ -49,13 +199,17 @@ class BaseConfig:
         """获取当前配置文件路径"""
         return self._current_file
 
+    def version(self) -> int:
+        """获取配置版本号"""
+        return self._snapshot.version
+
     def get_all_data(self) -> Dict[str, Any]:
         """获取所有配置数据"""
-        return self._data.copy()
+        return self._snapshot.data.copy()
 
     def has_key(self, key: str) -> bool:
         """检查配置键是否存在"""
-        return self.get_value(key) is not None
+        return self._snapshot.index.get(key) is not None
 
     def get_int(self, key: str, default: int = 0) -> int:
         """获取整型配置值"""
@@ -1,7 +1,12 @@
-from typing import Any, Optional
+import os
+import threading
+import weakref
+from typing import Any, List, Optional
 
+from config.base import ConfigKey
 from config.configs import StoryConfig, GlobalConfig
 from config.loaders import ConfigLoader, JsonConfigLoader, YamlConfigLoader
+from config.watcher import ConfigWatcher
 
 
 class ConfigManager:
@@ -9,15 +14,38 @@ class ConfigManager:
     配置管理器
     """
 
-    def __init__(self):
-        # 创建加载器实例
-        self.json_loader = JsonConfigLoader()
-        self.yaml_loader = YamlConfigLoader()
-
-        # 创建配置实例
-        self.global_config = GlobalConfig(self.json_loader)
+    def __init__(self, parent: Optional['ConfigManager'] = None):
+        if parent is None:
+            # 创建加载器实例
+            self.json_loader = JsonConfigLoader()
+            self.yaml_loader = YamlConfigLoader()
+            self.global_config = GlobalConfig(self.json_loader)
+        else:
+            # 作用域共享父管理器的加载器与全局配置，只有故事配置是独立的
+            self.json_loader = parent.json_loader
+            self.yaml_loader = parent.yaml_loader
+            self.global_config = parent.global_config
         self.story_config = StoryConfig(self.yaml_loader)
 
+        self._root = parent._root if parent is not None else self
+        self._scopes: 'weakref.WeakSet[ConfigManager]' = weakref.WeakSet()
+        self._scopes_lock = threading.Lock()  # 作用域可能在任意线程中创建，监视线程遍历时需加锁
+        self.watcher: Optional[ConfigWatcher] = None
+
+    def scoped(self, story_file: Optional[str] = None) -> 'ConfigManager':
+        """
+        创建一个配置作用域：共享全局配置，拥有独立的故事配置
+
+        每个会话使用自己的作用域，一个进程中可以同时运行不同的故事；
+        作用域中的故事文件变化时同样会被监视器重新加载
+        """
+        scope = ConfigManager(self)
+        with self._root._scopes_lock:
+            self._root._scopes.add(scope)
+        if story_file:
+            scope.setup_story_config(story_file)
+        return scope
+
     def setup_global_config(self, file_path: str, loader: Optional[ConfigLoader] = None) -> bool:
         """设置全局配置"""
         if loader:
@@ -30,6 +58,43 @@ class ConfigManager:
             self.story_config.set_loader(loader)
         return self.story_config.load(file_path)
 
+    def enable_story_cache(self, cache_dir: str):
+        """为故事配置启用编译缓存（切换为带缓存目录的YAML加载器）"""
+        self.yaml_loader = YamlConfigLoader(cache_dir)
+        self.story_config.set_loader(self.yaml_loader)
+
+    def start_watching(self, stories_dir: Optional[str] = None, interval: float = 1.0):
+        """
+        开始监视全局配置文件与故事目录，文件变化后自动重新加载对应的配置
+
+        新版本以快照整体替换，正在使用旧版本的线程不受影响；订阅者会收到变化的键
+        """
+        if self.watcher is not None:
+            return
+        self.watcher = ConfigWatcher(interval)
+        global_file = self.global_config.current_file()
+        if global_file:
+            self.watcher.watch_file(global_file, lambda path: self.global_config.reload())
+        if stories_dir:
+            self.watcher.watch_dir(stories_dir, self._on_stories_changed)
+        self.watcher.start()
+
+    def stop_watching(self):
+        """停止监视配置文件"""
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    def _on_stories_changed(self, paths: List[str]):
+        # 只重新加载正在使用的故事（包括各个作用域中的故事）
+        changed = {os.path.abspath(path) for path in paths}
+        with self._scopes_lock:
+            scopes = list(self._scopes)
+        for manager in [self, *scopes]:
+            story_file = manager.story_config.current_file()
+            if story_file and os.path.abspath(story_file) in changed:
+                manager.story_config.reload()
+
     def reload_story_config(self) -> bool:
         """重新加载故事配置"""
         return self.story_config.reload()
@@ -42,6 +107,14 @@ class ConfigManager:
         """获取故事配置值"""
         return self.story_config.get_value(key, default)
 
+    def global_key(self, key: str, default: Any = None) -> ConfigKey:
+        """获取全局配置的预编译键句柄"""
+        return self.global_config.key(key, default)
+
+    def story_key(self, key: str, default: Any = None) -> ConfigKey:
+        """获取故事配置的预编译键句柄"""
+        return self.story_config.key(key, default)
+
     def switch_global_loader(self, loader: ConfigLoader):
         """切换全局配置加载器"""
         self.global_config.set_loader(loader)
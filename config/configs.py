@@ -6,20 +6,12 @@ from config.loaders import ConfigLoader, JsonConfigLoader, YamlConfigLoader
 
 class GlobalConfig(BaseConfig):
     """
-    全局配置
+    全局配置（同一进程中的所有会话共享一个实例）
     """
 
-    _instance = None
-    _initialized = False
-
-    def __new__(cls, loader: ConfigLoader = None):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            BaseConfig.__init__(cls._instance, loader or JsonConfigLoader())
-        return cls._instance
-
     def __init__(self, loader: ConfigLoader = None):
-        pass
+        super().__init__(loader or JsonConfigLoader())
+        self._initialized = False
 
     def load(self, file_path: str) -> bool:
         """加载全局配置（只能加载一次）"""
@@ -33,13 +25,10 @@ class GlobalConfig(BaseConfig):
         return success
 
     def reload(self) -> bool:
-        """全局配置不支持重新加载"""
+        """重新加载全局配置（生成新快照，正在读取旧快照的线程不受影响）"""
         if self._initialized:
-            print("全局配置不支持重新加载")
-            return False
-        else:
-            # 首次加载时调用父类的reload方法
-            return super().reload()
+            print("重新加载全局配置...")
+        return super().reload()
 
     def is_initialized(self) -> bool:
         """检查是否已初始化"""
@@ -47,26 +36,18 @@ class GlobalConfig(BaseConfig):
 
     def reset(self):
         """重置全局配置（主要用于测试）"""
-        self._data = {}
         self._current_file = None
+        self._set_data({})
         self._initialized = False
 
 
 class StoryConfig(BaseConfig):
     """
-    故事配置
+    故事配置（每个配置作用域一个实例，不同会话可以使用不同的故事）
     """
 
-    _instance = None
-
-    def __new__(cls, loader: ConfigLoader = None):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            BaseConfig.__init__(cls._instance, loader or YamlConfigLoader())
-        return cls._instance
-
     def __init__(self, loader: ConfigLoader = None):
-        pass
+        super().__init__(loader or YamlConfigLoader())
 
     def reload(self) -> bool:
         """重新加载故事配置"""
@@ -79,5 +60,5 @@ class StoryConfig(BaseConfig):
 
     def reset(self):
         """重置故事配置（主要用于测试）"""
-        self._data = {}
-        self._current_file = None
\ No newline at end of file
+        self._current_file = None
+        self._set_data({})
\ No newline at end of file
@@ -3,13 +3,18 @@
 """
 
 import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
 from typing import Any, Callable, Optional, LiteralString
 
+from config.base import ConfigKey
 from config.config_manager import ConfigManager
 
-# 全局配置管理器实例
+# 进程默认的配置管理器实例
 _config_manager: Optional['ConfigManager'] = None
 _config_dir : LiteralString = None
+# 当前上下文（线程、协程）使用的配置作用域，未设置时使用进程默认的配置管理器
+_current_config: ContextVar[Optional['ConfigManager']] = ContextVar("config_manager", default=None)
 
 def set_config_dir(path: LiteralString):
     global _config_dir
@@ -19,20 +24,37 @@ def get_config_dir():
     return _config_dir
 
 def get_config_manager() -> 'ConfigManager':
-    """获取配置管理器实例"""
+    """获取当前上下文的配置管理器实例（未设置作用域时为进程默认实例）"""
     global _config_manager
+    manager = _current_config.get()
+    if manager is not None:
+        return manager
     if _config_manager is None:
-        from config_manager import ConfigManager
         _config_manager = ConfigManager()
     return _config_manager
 
 
 def set_config_manager(manager: 'ConfigManager'):
-    """设置配置管理器实例"""
+    """设置进程默认的配置管理器实例"""
     global _config_manager
     _config_manager = manager
 
 
+@contextmanager
+def use_config(manager: Optional['ConfigManager']):
+    """
+    在当前上下文中使用指定的配置作用域
+
+    范围内的 sys_text()、属性初始化与 config_value 装饰的函数都读取该作用域的配置；
+    新线程不会继承上下文变量，需要用 contextvars.copy_context().run 启动
+    """
+    token = _current_config.set(manager)
+    try:
+        yield manager
+    finally:
+        _current_config.reset(token)
+
+
 def config_value(config_key: str, default: Any = None, use_story: bool = False):
     """
     配置值注入装饰器
@@ -44,24 +66,29 @@ def config_value(config_key: str, default: Any = None, use_story: bool = False):
         use_story: 是否使用故事配置
     """
 
+    # 确定参数名（使用配置键的最后一部分）
+    param_name = config_key.split('.')[-1]
+
     def decorator(func: Callable) -> Callable:
+        # 为当前使用的配置对象预编译的键句柄，配置版本不变时不再重新查找
+        handle: Optional[ConfigKey] = None
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
+            nonlocal handle
+            # 如果参数名已在kwargs中，不需要读取配置
+            if param_name in kwargs:
+                return func(*args, **kwargs)
+
             # 获取配置管理器实例
             config_manager = get_config_manager()
+            config = config_manager.story_config if use_story else config_manager.global_config
 
-            # 获取配置值
-            if use_story:
-                value = config_manager.get_story_value(config_key, default)
-            else:
-                value = config_manager.get_global_value(config_key, default)
-
-            # 确定参数名（使用配置键的最后一部分）
-            param_name = config_key.split('.')[-1]
-
-            # 如果参数名不在kwargs中，则注入
-            if param_name not in kwargs:
-                kwargs[param_name] = value
+            current = handle
+            if current is None or current.config is not config:
+                # 各个作用域的配置对象各自保存这个装饰器的键句柄
+                current = handle = config.key_for(decorator, config_key, default)
+            kwargs[param_name] = current.get()
 
             return func(*args, **kwargs)
 
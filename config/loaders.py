@@ -1,6 +1,9 @@
+import hashlib
 import json
-import yaml
-from typing import Any, Dict, Protocol
+import os
+import pickle
+import time
+from typing import Any, Dict, Optional, Protocol
 
 
 class ConfigLoader(Protocol):
@@ -24,17 +27,132 @@ class JsonConfigLoader:
             return {}
 
 
+_yaml = None
+
+
+def _import_yaml():
+    """第一次需要解析YAML时才导入PyYAML（读取编译缓存时不需要）"""
+    global _yaml
+    if _yaml is None:
+        import yaml
+        _yaml = yaml
+    return _yaml
+
+
+def _yaml_safe_loader():
+    # 优先使用C实现的YAML解析器
+    yaml = _import_yaml()
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# 编译缓存的格式版本，格式变化时旧缓存整体失效
+CACHE_VERSION = 1
+
+
 class YamlConfigLoader:
+    """
+    YAML配置加载器
+
+    设置了 cache_dir 时，解析结果以pickle格式缓存（缓存目录应只由本程序写入）。
+    缓存以 路径、修改时间、大小 校验；修改时间或大小变化但内容哈希不变时仍使用缓存。
+    stats 中记录解析与读取缓存的次数与耗时。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self.stats = {"parses": 0, "parse_time": 0.0, "cache_hits": 0, "cache_load_time": 0.0}
+
     def load(self, file_path: str) -> Dict[str, Any]:
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return yaml.safe_load(file) or {}
+            if self.cache_dir:
+                return self._load_cached(file_path)
+            return self._parse(file_path)
         except FileNotFoundError:
             print(f"YAML配置文件不存在: {file_path}")
             return {}
-        except yaml.YAMLError as e:
-            print(f"YAML配置文件格式错误: {e}")
-            return {}
         except Exception as e:
-            print(f"YAML配置加载失败: {e}")
+            if _yaml is not None and isinstance(e, _yaml.YAMLError):
+                print(f"YAML配置文件格式错误: {e}")
+            else:
+                print(f"YAML配置加载失败: {e}")
             return {}
+
+    def _parse(self, file_path: str, content: Optional[bytes] = None) -> Dict[str, Any]:
+        """解析YAML文件，返回配置数据"""
+        start_time = time.perf_counter()
+        if content is None:
+            with open(file_path, 'rb') as file:
+                content = file.read()
+        data = _import_yaml().load(content.decode('utf-8'), Loader=_yaml_safe_loader()) or {}
+        elapsed = time.perf_counter() - start_time
+        self.stats["parses"] += 1
+        self.stats["parse_time"] += elapsed
+        print(f"YAML解析耗时：{elapsed * 1000:.1f}毫秒（{file_path}）")
+        return data
+
+    def _load_cached(self, file_path: str) -> Dict[str, Any]:
+        start_time = time.perf_counter()
+        stat = os.stat(file_path)
+        cache_path = os.path.join(
+            self.cache_dir,
+            hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest() + '.pickle'
+        )
+        entry = self._read_cache(cache_path)
+
+        content = None
+        if entry is not None:
+            if entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                return self._cache_hit(entry, start_time, file_path)
+            # 文件被改动过（或只是被touch），内容不变时继续使用缓存
+            with open(file_path, 'rb') as file:
+                content = file.read()
+            if hashlib.sha256(content).hexdigest() == entry["sha256"]:
+                entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+                self._write_cache(cache_path, entry)
+                return self._cache_hit(entry, start_time, file_path)
+
+        if content is None:
+            with open(file_path, 'rb') as file:
+                content = file.read()
+        parse_start = time.perf_counter()
+        data = self._parse(file_path, content)
+        self._write_cache(cache_path, {
+            "version": CACHE_VERSION,
+            "path": os.path.abspath(file_path),
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": hashlib.sha256(content).hexdigest(),
+            "parse_time": time.perf_counter() - parse_start,
+            "data": data
+        })
+        return data
+
+    def _cache_hit(self, entry: Dict[str, Any], start_time: float, file_path: str) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - start_time
+        self.stats["cache_hits"] += 1
+        self.stats["cache_load_time"] += elapsed
+        print(f"读取配置编译缓存耗时：{elapsed * 1000:.1f}毫秒，解析耗时：{entry['parse_time'] * 1000:.1f}毫秒（{file_path}）")
+        return entry["data"]
+
+    @staticmethod
+    def _read_cache(cache_path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(cache_path, 'rb') as file:
+                entry = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"配置编译缓存已损坏，重新解析: {e}")
+            return None
+        if not isinstance(entry, dict) or entry.get("version") != CACHE_VERSION:
+            return None
+        return entry
+
+    def _write_cache(self, cache_path: str, entry: Dict[str, Any]):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as file:
+                pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"写入配置编译缓存失败: {e}")
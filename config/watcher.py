@@ -0,0 +1,118 @@
+"""
+配置文件监视：轮询文件的修改时间与大小，变化时触发回调
+"""
+
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 文件状态: (修改时间, 大小)，文件不存在时为None
+FileState = Optional[Tuple[int, int]]
+
+
+def _file_state(path: str) -> FileState:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _dir_state(path: str, extensions: Tuple[str, ...]) -> Dict[str, Tuple[int, int]]:
+    states = {}
+    try:
+        with os.scandir(path) as scanner:
+            for entry in scanner:
+                if entry.name.endswith(extensions) and entry.is_file():
+                    stat = entry.stat()
+                    states[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        pass
+    return states
+
+
+class ConfigWatcher:
+    """
+    轮询式配置监视器
+
+    在一个后台线程中每隔 interval 秒检查一次被监视的文件与目录，
+    文件的修改时间或大小变化后，等到连续两次检查结果一致（写入完成）再触发回调，
+    避免读到写入到一半的文件。
+    """
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self._files: List[Dict] = []
+        self._dirs: List[Dict] = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch_file(self, path: str, callback: Callable[[str], None]):
+        """监视单个文件，变化时以文件路径调用callback"""
+        with self._lock:
+            self._files.append({"path": path, "callback": callback,
+                                "state": _file_state(path), "pending": None})
+
+    def watch_dir(self, path: str, callback: Callable[[List[str]], None],
+                  extensions: Tuple[str, ...] = ('.yaml', '.yml')):
+        """监视目录中指定扩展名的文件，有文件新增、修改或删除时以变化的文件路径列表调用callback"""
+        with self._lock:
+            self._dirs.append({"path": path, "callback": callback, "extensions": extensions,
+                               "state": _dir_state(path, extensions), "pending": None})
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def poll(self):
+        """检查一次所有被监视的文件与目录"""
+        with self._lock:
+            files = list(self._files)
+            dirs = list(self._dirs)
+
+        for watch in files:
+            state = _file_state(watch["path"])
+            if self._settled(watch, state):
+                self._call(watch["callback"], watch["path"])
+
+        for watch in dirs:
+            state = _dir_state(watch["path"], watch["extensions"])
+            previous = watch["state"]
+            if self._settled(watch, state):
+                changed = [path for path in set(previous) | set(state) if previous.get(path) != state.get(path)]
+                self._call(watch["callback"], sorted(changed))
+
+    @staticmethod
+    def _settled(watch: Dict, state) -> bool:
+        """状态变化并且与上一次检查的结果一致时返回True"""
+        if state == watch["state"]:
+            watch["pending"] = None
+            return False
+        if state != watch["pending"]:
+            # 第一次看到这个状态，等下一次检查确认写入已完成
+            watch["pending"] = state
+            return False
+        watch["state"] = state
+        watch["pending"] = None
+        return True
+
+    @staticmethod
+    def _call(callback, arg):
+        try:
+            callback(arg)
+        except Exception as e:
+            print(f"处理配置文件变化失败: {e}")
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.poll()
@@ -1,8 +1,16 @@
+import queue
 import tkinter as tk
 from tkinter import ttk
 import threading
 import time
 
+# 打字机效果的刷新间隔（毫秒），约60帧每秒
+TYPEWRITER_FRAME_INTERVAL = 16
+# 拖动窗口时两次重新布局的最小间隔（毫秒）
+RESIZE_INTERVAL = 100
+# 缩放比例的量化步长，窗口大小的变化不足一档时不重新布局
+RESIZE_SCALE_STEP = 0.05
+
 class BaseUI(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -26,9 +34,47 @@ class BaseUI(tk.Tk):
         self.base_width = 1280
         self.base_height = 720
         
-        # 绑定窗口大小变化事件
-        self.bind("<Configure>", self.on_window_resize)
-        self.resize_after_id = None
+        # 窗口大小变化由缩放管理统一处理
+        self._applied_styles = {}
+        self.resize_manager = ResizeManager(self, self.base_width, self.base_height)
+        self.resize_manager.subscribe(self.update_styles)
+
+        # 后台线程（包括共享事件循环）投递到主线程的回调；
+        # 队列由空变为非空时才安排一次处理，没有投递时主线程不需要定时轮询
+        self._posted = queue.SimpleQueue()
+        self._post_lock = threading.Lock()
+        # 进入主循环之前的投递由这里安排的首次处理执行（主循环开始前不能从其他线程调用Tk）
+        self._drain_scheduled = True
+        self.after_idle(self._drain_posted)
+        
+    def post(self, callback, *args):
+        """从任意线程投递回调，在Tk主线程中执行（线程安全）"""
+        self._posted.put((callback, args))
+        with self._post_lock:
+            if self._drain_scheduled:
+                return
+            self._drain_scheduled = True
+        try:
+            self.after_idle(self._drain_posted)
+        except (RuntimeError, tk.TclError):
+            # 窗口已经销毁
+            with self._post_lock:
+                self._drain_scheduled = False
+
+    def _drain_posted(self):
+        """在主线程中执行所有已投递的回调"""
+        # 先清除标记再取队列：之后的投递会重新安排处理，不会被遗漏
+        with self._post_lock:
+            self._drain_scheduled = False
+        while True:
+            try:
+                callback, args = self._posted.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"执行回调失败: {e}")
         
     def configure_styles(self):
         # 配置按钮样式
@@ -74,59 +120,116 @@ class BaseUI(tk.Tk):
             background=[('active', 'white')]
         )
         
-    def on_window_resize(self, event):
-        """处理窗口大小变化事件"""
-        # 只处理主窗口的大小变化
-        if event.widget == self:
-            if self.resize_after_id:
-                self.after_cancel(self.resize_after_id)
-            self.resize_after_id = self.after(100, self.apply_resize, event.width, event.height)
-            
-    def apply_resize(self, width, height):
-        """应用窗口大小变化"""
-        # 计算缩放比例
-        width_ratio = width / self.base_width
-        height_ratio = height / self.base_height
-        scale = min(width_ratio, height_ratio)  # 使用较小的缩放比例保持宽高比
-        
-        # 更新样式
-        self.update_styles(scale)
-        
+    def compute_styles(self, scale):
+        """计算缩放比例对应的样式选项（按缩放档位缓存）"""
+        return {
+            'Title.TLabel': {'font': ('微软雅黑', max(int(24 * scale), 12), 'bold')},
+            'Dialog.TLabel': {
+                'font': ('微软雅黑', max(int(12 * scale), 8)),
+                'wraplength': max(int(600 * scale), 300)
+            },
+            'Game.TButton': {'font': ('微软雅黑', max(int(12 * scale), 8))},
+            'Choice.TButton': {'font': ('微软雅黑', max(int(11 * scale), 7))}
+        }
+
     def update_styles(self, scale):
-        """根据缩放比例更新样式"""
-        # 更新标题标签样式
-        title_font_size = max(int(24 * scale), 12)
-        self.style.configure(
-            'Title.TLabel',
-            font=('微软雅黑', title_font_size, 'bold')
-        )
-        
-        # 更新对话框标签样式
-        dialog_font_size = max(int(12 * scale), 8)
-        dialog_wrap_length = max(int(600 * scale), 300)
-        self.style.configure(
-            'Dialog.TLabel',
-            font=('微软雅黑', dialog_font_size),
-            wraplength=dialog_wrap_length
-        )
-        
-        # 更新按钮样式
-        button_font_size = max(int(12 * scale), 8)
-        self.style.configure(
-            'Game.TButton',
-            font=('微软雅黑', button_font_size)
-        )
-        
-        choice_font_size = max(int(11 * scale), 7)
-        self.style.configure(
-            'Choice.TButton',
-            font=('微软雅黑', choice_font_size)
-        )
+        """根据缩放比例更新样式，只修改与当前不同的选项"""
+        styles = self.resize_manager.layout(BaseUI, self.compute_styles)
+        for style_name, options in styles.items():
+            applied = self._applied_styles.setdefault(style_name, {})
+            changed = {name: value for name, value in options.items() if applied.get(name) != value}
+            if changed:
+                # 修改ttk样式会让所有使用该样式的控件重新计算尺寸
+                self.style.configure(style_name, **changed)
+                applied.update(changed)
         
     def on_closing(self):
         """处理窗口关闭事件"""
         self.destroy()
 
+class ResizeManager:
+    """
+    窗口缩放管理
+
+    只处理主窗口自身的尺寸变化，子控件的<Configure>事件与尺寸未变的事件直接忽略；
+    拖动窗口时每 RESIZE_INTERVAL 毫秒最多处理一次。缩放比例按 RESIZE_SCALE_STEP 量化为档位，
+    档位不变时不通知任何界面。各界面按档位计算的布局参数缓存在 layout() 中，
+    来回拖动到同一档位时不再重新计算。
+    """
+
+    def __init__(self, root, base_width, base_height):
+        self.root = root
+        self.base_width = base_width
+        self.base_height = base_height
+        self.scale = self.quantize(base_width, base_height)
+        self.size = None
+        self.after_id = None
+        self._listeners = []
+        self._layouts = {}  # (布局所属的类, 缩放档位) -> 布局参数
+        self.stats = {"events": 0, "relayouts": 0, "skipped": 0}
+        root.bind("<Configure>", self._on_configure, add="+")
+
+    def quantize(self, width, height):
+        """窗口尺寸对应的缩放档位（保持宽高比，取较小的缩放比例）"""
+        scale = min(width / self.base_width, height / self.base_height)
+        return round(round(scale / RESIZE_SCALE_STEP) * RESIZE_SCALE_STEP, 2)
+
+    def subscribe(self, listener):
+        """注册缩放档位变化的回调 listener(scale)"""
+        self._listeners.append(listener)
+
+    def layout(self, owner, compute):
+        """获取 owner 在当前档位下的布局参数，第一次使用该档位时调用 compute(scale) 计算"""
+        key = (owner, self.scale)
+        layout = self._layouts.get(key)
+        if layout is None:
+            layout = self._layouts[key] = compute(self.scale)
+        return layout
+
+    def _on_configure(self, event):
+        if event.widget is not self.root:
+            return
+        size = (event.width, event.height)
+        if size == self.size:
+            return
+        self.size = size
+        self.stats["events"] += 1
+        # 已有待处理的重新布局时只记录最新尺寸，不反复取消和重新安排
+        if self.after_id is None:
+            self.after_id = self.root.after(RESIZE_INTERVAL, self._apply)
+
+    def _apply(self):
+        self.after_id = None
+        scale = self.quantize(*self.size)
+        if scale == self.scale:
+            self.stats["skipped"] += 1
+            return
+        self.scale = scale
+        self.stats["relayouts"] += 1
+        for listener in list(self._listeners):
+            listener(scale)
+
+
+def configure_changed(widget, method="config", **options):
+    """
+    只把与上次应用值不同的选项传给 widget 的 method（config、pack_configure等）
+
+    上次应用的值记录在控件上；控件被 pack_forget 等方式重置后，需调用 forget_applied 清除记录。
+    返回实际修改的选项。
+    """
+    applied = widget.__dict__.setdefault("_applied_options", {}).setdefault(method, {})
+    changed = {name: value for name, value in options.items() if applied.get(name) != value}
+    if changed:
+        getattr(widget, method)(**changed)
+        applied.update(changed)
+    return changed
+
+
+def forget_applied(widget, method="pack_configure"):
+    """清除控件上记录的已应用选项，下次 configure_changed 时全部重新应用"""
+    widget.__dict__.get("_applied_options", {}).pop(method, None)
+
+
 class BaseFrame(tk.Frame):
     def __init__(self, parent, controller):
         tk.Frame.__init__(self, parent, bg='black')
@@ -135,20 +238,21 @@ class BaseFrame(tk.Frame):
         self.base_width = 1280
         self.base_height = 720
         
-        # 绑定配置变化事件
-        self.bind("<Configure>", self.on_frame_configure)
-        self.resize_after_id = None
+        # 缩放档位变化时重新布局；子类在初始化完成后才有控件，首次布局放到空闲时
+        self.resize_manager = controller.resize_manager
+        self.resize_manager.subscribe(self.relayout)
+        self.after_idle(self.relayout)
         
-    def on_frame_configure(self, event):
-        """处理帧配置变化"""
-        if event.widget == self:
-            # 使用防抖技术
-            if self.resize_after_id:
-                self.after_cancel(self.resize_after_id)
-            self.resize_after_id = self.after(100, self.apply_frame_resize, event.width, event.height)
-            
-    def apply_frame_resize(self, width, height):
-        pass  # 子类可以重写此方法
+    def relayout(self, scale=None):
+        """按当前缩放档位应用布局，布局参数按档位缓存"""
+        self.apply_layout(self.resize_manager.layout(type(self), self.compute_layout))
+        
+    def compute_layout(self, scale):
+        """计算缩放比例对应的布局参数，子类可以重写此方法"""
+        return {}
+        
+    def apply_layout(self, layout):
+        pass  # 子类可以重写此方法，使用 configure_changed 只修改变化的选项
 
 class RoundedBorderFrame(tk.Frame):
     """
@@ -229,16 +333,64 @@ class RoundedBorderFrame(tk.Frame):
         ]
         return canvas.create_polygon(points, smooth=True, tags="border", **kwargs)
 
+class TypewriterTicker:
+    """
+    打字机效果的共享计时器
+
+    一个窗口中所有正在打字的 TypewriterLabel 由同一个 after 循环推进，每帧按经过的时间
+    一次显示应显示的全部字符（不按字符排定计时器，负载高时也不会越打越慢）；
+    没有正在打字的标签时停止计时。
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.active = set()
+        self.after_id = None
+
+    @classmethod
+    def for_widget(cls, widget) -> 'TypewriterTicker':
+        """获取控件所在窗口的共享计时器"""
+        root = widget.nametowidget('.')
+        ticker = getattr(root, '_typewriter_ticker', None)
+        if ticker is None:
+            ticker = root._typewriter_ticker = cls(root)
+        return ticker
+
+    def add(self, label: 'TypewriterLabel'):
+        self.active.add(label)
+        if self.after_id is None:
+            self.after_id = self.root.after(TYPEWRITER_FRAME_INTERVAL, self._tick)
+
+    def remove(self, label: 'TypewriterLabel'):
+        self.active.discard(label)
+
+    def _tick(self):
+        self.after_id = None
+        now = time.monotonic()
+        for label in list(self.active):
+            try:
+                finished = label.advance(now)
+            except tk.TclError:
+                # 标签已被销毁
+                finished = True
+            if finished:
+                self.active.discard(label)
+                label.finish()
+        # 回调中可能已经开始了新的打字效果并排定了下一帧
+        if self.active and self.after_id is None:
+            self.after_id = self.root.after(TYPEWRITER_FRAME_INTERVAL, self._tick)
+
+
 class TypewriterLabel(ttk.Label):
     """
-    实打字机效果标签
+    实打字机效果标签（由窗口共享的 TypewriterTicker 推进）
     """
     def __init__(self, parent, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
         self.text = ""
-        self.displayed_text = ""
-        self.index = 0
-        self.after_id = None
+        self.index = 0              # 已显示的字符数
+        self.delay = 0.05           # 每个字符的间隔（秒）
+        self.start_time = 0.0
         self.base_font = None
         self.base_font_size = 12
         self.callback = None
@@ -256,6 +408,11 @@ class TypewriterLabel(ttk.Label):
         except:
             self.base_font = "微软雅黑"
             self.base_font_size = 12
+
+    @property
+    def displayed_text(self):
+        """当前已显示的文本"""
+        return self.text[:self.index]
         
     def typewriter_effect(self, text, delay=50, callback=None):
         """
@@ -266,37 +423,59 @@ class TypewriterLabel(ttk.Label):
             delay: 字符之间的延迟（毫秒）
             callback: 完成后调用的回调函数
         """
+        ticker = TypewriterTicker.for_widget(self)
+        ticker.remove(self)
         self.text = text
-        self.displayed_text = ""
-        self.index = 0
+        self.index = -1
+        self.delay = max(delay, 1) / 1000
         self.callback = callback
-        self._update_text(delay)
-        
-    def _update_text(self, delay):
-        if self.index < len(self.text):
-            self.displayed_text += self.text[self.index]
-            self.config(text=self.displayed_text)
-            self.index += 1
-            self.after_id = self.after(delay, self._update_text, delay)
+        # 第一个字符立即显示，之后的字符按开始时间计算，不会累积误差
+        self.start_time = time.monotonic()
+        if self.advance(self.start_time):
+            self.finish()
         else:
-            if self.callback:
-                self.callback()
+            ticker.add(self)
+
+    def advance(self, now):
+        """显示到当前时间应显示的位置，只有显示内容变化时才更新控件；全部显示后返回True"""
+        target = min(int((now - self.start_time) / self.delay) + 1, len(self.text))
+        if target != self.index:
+            self.index = target
+            self.config(text=self.text[:target])
+        return target >= len(self.text)
+
+    def finish(self):
+        """全部显示后调用回调（只调用一次）"""
+        callback, self.callback = self.callback, None
+        if callback:
+            callback()
                 
     def skip_typewriter(self):
         """
         立即显示完整文本
         """
-        if self.after_id:
-            self.after_cancel(self.after_id)
-        self.displayed_text = self.text
-        self.config(text=self.text)
-        if self.callback:
-            # 保存回调引用并在调用后清空，防止重复调用
-            callback = self.callback
-            self.callback = None
-            callback()
+        TypewriterTicker.for_widget(self).remove(self)
+        if self.index != len(self.text):
+            self.index = len(self.text)
+            self.config(text=self.text)
+        self.finish()
+            
+    def show_text(self, text):
+        """
+        停止正在进行的打字机效果（不调用完成回调）并立即显示文本
+        
+        用于提示信息等需要替换当前内容的场合，避免共享计时器继续写入之前的文本
+        """
+        TypewriterTicker.for_widget(self).remove(self)
+        self.callback = None
+        self.text = text
+        self.index = len(text)
+        self.config(text=text)
             
     def update_font_size(self, scale):
         """根据缩放比例更新字体大小"""
-        new_font_size = max(int(self.base_font_size * scale), 8)
-        self.config(font=(self.base_font, new_font_size))
+        configure_changed(self, font=(self.base_font, self.font_size(scale)))
+
+    def font_size(self, scale):
+        """缩放比例对应的字体大小"""
+        return max(int(self.base_font_size * scale), 8)
@@ -1,6 +1,6 @@
 import tkinter as tk
 from tkinter import ttk
-from .base_ui import BaseFrame, TypewriterLabel, RoundedBorderFrame
+from .base_ui import BaseFrame, TypewriterLabel, RoundedBorderFrame, configure_changed
 
 class EndScreenFrame(BaseFrame):
     def __init__(self, parent, controller):
@@ -85,56 +85,54 @@ class EndScreenFrame(BaseFrame):
         self.base_button_ipadx = 10
         self.base_button_ipady = 5
         
-    def apply_frame_resize(self, width, height):
-        width_ratio = width / self.base_width
-        height_ratio = height / self.base_height
-        scale = min(width_ratio, height_ratio)
-        
+    def compute_layout(self, scale):
+        return {
+            "font_size": self.end_label.font_size(scale),
+            "top_spacer_height": max(int(self.base_top_spacer_height * scale), 20),
+            "text_frame_padx": max(int(self.base_text_frame_padx * scale), 20),
+            "button_frame_pady": max(int(self.base_button_frame_pady * scale), 15),
+            "content_pad": max(int(15 * scale), 5),
+            "restart_padx": (max(int(self.base_restart_button_padx[0] * scale), 50),
+                             max(int(self.base_restart_button_padx[1] * scale), 5)),
+            "quit_padx": (max(int(self.base_quit_button_padx[0] * scale), 5),
+                          max(int(self.base_quit_button_padx[1] * scale), 50)),
+            "button_ipadx": max(int(self.base_button_ipadx * scale), 5),
+            "button_ipady": max(int(self.base_button_ipady * scale), 2)
+        }
+
+    def apply_layout(self, layout):
         # 调整结束标签字体大小
-        self.end_label.update_font_size(scale)
+        configure_changed(self.end_label, font=(self.end_label.base_font, layout["font_size"]))
         
         # 调整上方空白区域高度
-        top_spacer_height = max(int(self.base_top_spacer_height * scale), 20)
-        self.top_spacer.config(height=top_spacer_height)
-        
-        # 调整文本区域边距
-        text_frame_padx = max(int(self.base_text_frame_padx * scale), 20)
-        self.text_frame.pack_configure(padx=text_frame_padx)
+        configure_changed(self.top_spacer, height=layout["top_spacer_height"])
         
-        # 调整按钮区域边距
-        button_frame_pady = max(int(self.base_button_frame_pady * scale), 15)
-        self.button_frame.pack_configure(pady=button_frame_pady)
+        # 调整文本区域与按钮区域边距
+        configure_changed(self.text_frame, "pack_configure", padx=layout["text_frame_padx"])
+        configure_changed(self.button_frame, "pack_configure", pady=layout["button_frame_pady"])
         
         # 调整内容区域边距
-        content_pad_x = max(int(15 * scale), 5)
-        content_pad_y = max(int(15 * scale), 5)
-        self.text_content.pack_configure(padx=content_pad_x, pady=content_pad_y)
+        content_pad = layout["content_pad"]
+        configure_changed(self.text_content, "pack_configure", padx=content_pad, pady=content_pad)
         
         # 调整按钮边距和内边距
-        restart_padx_first = max(int(self.base_restart_button_padx[0] * scale), 50)
-        restart_padx_second = max(int(self.base_restart_button_padx[1] * scale), 5)
-        
-        quit_padx_first = max(int(self.base_quit_button_padx[0] * scale), 5)
-        quit_padx_second = max(int(self.base_quit_button_padx[1] * scale), 50)
-        
-        button_ipadx = max(int(self.base_button_ipadx * scale), 5)
-        button_ipady = max(int(self.base_button_ipady * scale), 2)
-        
-        self.restart_button.pack_configure(
-            padx=(restart_padx_first, restart_padx_second), 
-            ipadx=button_ipadx, 
-            ipady=button_ipady
+        configure_changed(
+            self.restart_button, "pack_configure",
+            padx=layout["restart_padx"],
+            ipadx=layout["button_ipadx"],
+            ipady=layout["button_ipady"]
         )
-        self.quit_button.pack_configure(
-            padx=(quit_padx_first, quit_padx_second), 
-            ipadx=button_ipadx, 
-            ipady=button_ipady
+        configure_changed(
+            self.quit_button, "pack_configure",
+            padx=layout["quit_padx"],
+            ipadx=layout["button_ipadx"],
+            ipady=layout["button_ipady"]
         )
         
     def on_show(self, end_text=None):
         """当界面显示时调用"""
         # 重置文本显示
-        self.end_label.config(text="")
+        self.end_label.show_text("")
 
         self.restart_button.config(state='disabled')
         self.quit_button.config(state='disabled')
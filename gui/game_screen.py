@@ -1,29 +1,20 @@
-import os.path
 import tkinter as tk
 from tkinter import ttk
-import re
-from typing import List, Dict, Any
-import threading
-import time
-from playsound import playsound
 
-from audio.audio_player import play_audio
-from config.decorators import get_config_dir
-from .base_ui import BaseFrame, TypewriterLabel, RoundedBorderFrame
+from audio.audio_player import play_sound
+from .base_ui import BaseFrame, TypewriterLabel, RoundedBorderFrame, configure_changed, forget_applied
 
 class GameScreenFrame(BaseFrame):
     def __init__(self, parent, controller):
         super().__init__(parent, controller)
         
-        # 游戏状态
-        self.current_segments = []       # 存储解析后的段落（包括文本和属性）
-        self.current_segment_index = 0   # 当前显示的段落索引
-        self.current_choices = []        # 当前选项
+        # 显示状态（游戏状态由GameEngine管理）
+        self.engine = None               # GameEngine实例
+        self.sound_voice = None          # 正在显示的音效对应的声音编号
         self.is_typing = False
         self.text_finished = False       # 标记文本是否已完成显示
-        self.is_waiting_response = False # 标记是否正在等待API响应
-        self.chat_session = None         # ChatSession实例
-        self.pending_end_text = None     # 待处理的结束文本
+        self.is_waiting_response = False # 标记是否正在等待首个段落
+        self.awaiting_segment = False    # 标记是否在等待流式响应的下一个段落
         
         self.init_ui()
         
@@ -113,17 +104,13 @@ class GameScreenFrame(BaseFrame):
         
     def reset_game(self):
         """重置游戏状态，用于重新开始游戏"""
-        # 清空段落
-        self.current_segments = []
-        self.current_segment_index = 0
-        self.current_choices = []
         self.is_typing = False
         self.text_finished = False
         self.is_waiting_response = False
-        self.pending_end_text = None  # 清除待处理的结束文本
+        self.awaiting_segment = False
         
         # 清空显示文本
-        self.dialog_label.config(text="当前声音: 无")
+        self.dialog_label.show_text("当前声音: 无")
         
         # 隐藏选项按钮
         self.choice_frame.pack_forget()
@@ -135,199 +122,150 @@ class GameScreenFrame(BaseFrame):
         # 清除音效显示
         self.sound_label.config(text="")
             
-    def set_chat_session(self, chat_session):
-        """设置ChatSession实例"""
-        self.chat_session = chat_session
+    def set_engine(self, engine):
+        """设置游戏引擎，界面只负责显示引擎的状态"""
+        if self.engine:
+            self.engine.close()
+        self.engine = engine
+        if engine:
+            # 引擎事件来自后台线程或事件循环，投递到主线程处理
+            engine.listener = lambda event, data: self.controller.post(self._on_engine_event, engine, event, data)
         
     def start_new_game(self):
         """开始新游戏"""
         self.reset_game()
-        if self.chat_session:
+        if self.engine:
             # 显示等待文本
-            self.dialog_label.config(text="AI生成中...")
+            self.dialog_label.show_text("AI生成中...")
             self.is_waiting_response = True
-            
-            # 在后台线程中获取初始AI响应
-            threading.Thread(target=self._get_initial_response, daemon=True).start()
-        
-    def _get_initial_response(self):
-        """在后台线程中获取初始响应"""
-        if self.chat_session:
-            response = self.chat_session.get_response()
-            # 在主线程中更新UI
-            self.after(0, self._handle_response, response)
-            
-    def _handle_response(self, response):
-        """在主线程中处理响应"""
-        self.is_waiting_response = False
-        if response:
-            self.set_ai_response(response)
-        
-    def parse_ai_response(self, response_text: str) -> Dict[str, Any]:
-        """
-        解析AI返回的文本，提取[text]、[sound]、[choice]等标签内容
-        """
-        print(response_text)
+            self.engine.start()
 
-        result = {
-            "segments": [],  # 统一存储所有段落（包括文本、属性和声音）
-            "choices": [],
-            "end": None
-        }
+    def resume_game(self):
+        """从存档继续：重新显示存档时正在显示的段落（引擎已恢复状态）"""
+        self.reset_game()
+        if self.engine:
+            self.display_next_segment()
 
-        lines = response_text.split('\n')
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-            if not line:  # 跳过空行
-                i += 1
-                continue
-                
-            if line.startswith('[text]'):
-                text_content = line[6:].strip()  # 去掉[text]前缀
-                if text_content:
-                    result["segments"].append({
-                        "type": "text",
-                        "content": text_content
-                    })
-                    
-            elif line.startswith('[sound]'):
-                sound_content = line[7:].strip()  # 去掉[sound]前缀
-                if sound_content:
-                    result["segments"].append({
-                        "type": "sound",
-                        "content": sound_content
-                    })
-                    # 声音内容不需要在文本框显示，但需要在对应位置触发处理
-                    
-            elif line.startswith('[attribute='):
-                # 解析属性变化，格式: [attribute=属性名.数值]原因+属性变化情况
-                match = re.match(r'\[attribute=([^.]+)\.([+-]?\d+)\](.*)', line)
-                if match:
-                    attr_name, attr_value, reason = match.groups()
-                    result["segments"].append({
-                        "type": "attribute",
-                        "content": reason.strip(),
-                        "attribute": {
-                            "name": attr_name,
-                            "value": int(attr_value),
-                            "reason": reason.strip()
-                        }
-                    })
-                    
-            elif line.startswith('[choice]'):
-                choice_content = line[8:].strip()  # 去掉[choice]前缀
-                result["choices"] = [choice.strip() for choice in choice_content.split('|') if choice.strip()]
-                
-            elif line.startswith('[end]'):
-                # 处理[end]标签及其后所有剩余的文本内容
-                end_content = line[5:].strip()  # 去掉[end]前缀
-                # 添加后续所有行的内容
-                i += 1
-                while i < len(lines):
-                    end_content += '\n' + lines[i]
-                    i += 1
-                result["end"] = end_content.strip()
-                break  # 处理完[end]标签后直接退出循环，因为后面的内容都属于end内容
-                
-            i += 1
+    def _on_engine_event(self, engine, event, data):
+        """在主线程中处理引擎事件"""
+        if engine is not self.engine:
+            # 已被替换的旧游戏
+            return
 
-        return result
+        if event == "segments":
+            if self.is_waiting_response:
+                # 首个段落到达，开始显示
+                self.is_waiting_response = False
+                self.display_next_segment()
+            elif self.awaiting_segment:
+                self.awaiting_segment = False
+                self.display_next_segment()
+        elif event == "finished":
+            if self.is_waiting_response:
+                # 没有收到任何可显示的段落
+                self.is_waiting_response = False
+                self.text_finished = True
+                self.awaiting_segment = True
+            if self.awaiting_segment:
+                self.awaiting_segment = False
+                self.advance()
+        elif event == "failed":
+            self._on_request_failed(data)
+
+    def _on_request_failed(self, error):
+        """请求最终失败（重试耗尽或超过截止时间），提示玩家点击重试"""
+        self.is_waiting_response = False
+        self.awaiting_segment = False
+        self.is_typing = False
+        reason = f"（{error}）" if error else ""
+        self.dialog_label.show_text(f"AI请求失败{reason}，点击重试")
+
+    def retry_request(self):
+        """按当前对话历史重新请求"""
+        self.dialog_label.show_text("AI生成中...")
+        self.is_waiting_response = True
+        self.engine.retry()
         
     def display_next_segment(self):
         """
         显示下一个段落
         """
-        if self.current_segment_index < len(self.current_segments):
-            # 获取当前段落
-            segment = self.current_segments[self.current_segment_index]
-            
-            if segment["type"] == "text":
-                # 显示文本段落
-                self.is_typing = True
-                self.text_finished = False
-                self.dialog_label.typewriter_effect(
-                    segment["content"], 
-                    delay=50, 
-                    callback=self.on_text_finished
-                )
-            elif segment["type"] == "attribute":
-                # 显示属性变更段落
-                self.is_typing = True
-                self.text_finished = False
-                self.dialog_label.typewriter_effect(
-                    segment["content"], 
-                    delay=50, 
-                    callback=lambda: self.on_attribute_segment_finished(segment)
-                )
-            elif segment["type"] == "sound":
-                # 处理声音段落
-                self.on_sound_segment_finished(segment)
-                # 声音段落不需要显示文本，直接处理下一个段落
-                self.current_segment_index += 1
-                self.display_next_segment()
-                return
+        segment = self.engine.advance()
+        if segment is None:
+            self._on_segments_exhausted()
+            return
+
+        if segment["type"] == "text":
+            # 显示文本段落
+            self.is_typing = True
+            self.text_finished = False
+            self.dialog_label.typewriter_effect(
+                segment["content"], 
+                delay=50, 
+                callback=self.on_text_finished
+            )
+        elif segment["type"] == "attribute":
+            # 显示属性变更段落（属性变化在回合完整到达后由引擎统一生效）
+            self.is_typing = True
+            self.text_finished = False
+            self.dialog_label.typewriter_effect(
+                segment["content"], 
+                delay=50, 
+                callback=lambda: self.on_attribute_segment_finished(segment)
+            )
+        elif segment["type"] == "sound":
+            # 处理声音段落
+            self.on_sound_segment_finished(segment)
+            # 声音段落不需要显示文本，直接处理下一个段落
+            self.display_next_segment()
             
-            self.current_segment_index += 1
-        else:
-            # 所有段落显示完毕，显示选项
+    def _on_segments_exhausted(self):
+        """当前已到达的段落显示完毕，等待后续段落、显示结束界面或选项"""
+        status = self.engine.status
+        if status == "waiting":
+            # 后续内容仍在生成中，到达后继续
+            self.awaiting_segment = True
+        elif status == "ended":
+            self.controller.show_frame("EndScreenFrame", end_text=self.engine.end_text)
+        elif status == "choosing":
             self.show_choices()
             
     def send_user_choice(self, choice_text: str):
         """发送用户选择并获取响应"""
-        if self.chat_session:
+        if self.engine:
             # 隐藏选项按钮
             self.choice_frame.pack_forget()
             
             # 显示等待文本
-            self.dialog_label.config(text="AI生成中...")
+            self.dialog_label.show_text("AI生成中...")
             self.is_waiting_response = True
-            
-            # 在后台线程中发送用户选择并获取响应
-            threading.Thread(target=self._send_choice_and_get_response, args=(choice_text,), daemon=True).start()
-            
-    def _send_choice_and_get_response(self, choice_text):
-        """在其他线程中发送选择并获取响应"""
-        if self.chat_session:
-            self.chat_session.add_user_message(choice_text)
-            response = self.chat_session.get_response()
+            self.engine.choose(choice_text)
 
-            # 在主线程中更新UI
-            self.after(0, self._handle_response, response)
-            
-    def set_ai_response(self, response_text: str):
-        """
-        设置并处理AI返回的响应文本
-        """
-        # 解析响应文本
-        parsed_data = self.parse_ai_response(response_text)
-        
-        # 存储段落
-        self.current_segments = parsed_data["segments"]
-        self.current_choices = parsed_data["choices"]
-        self.current_segment_index = 0
-        
-        # 如果有结束内容，标记需要跳转到结束界面
-        self.pending_end_text = parsed_data["end"]
-        
+    def _update_choice_buttons(self):
+        """根据当前选项更新选项按钮"""
+        choices = self.engine.choices
         # 更新选项按钮文本
         for i, button in enumerate(self.choice_buttons):
-            if i < len(self.current_choices):
-                button.config(text=self.current_choices[i])
-                button.pack()  # 确保按钮可见
+            if i < len(choices):
+                button.config(text=choices[i])
+                if not button.winfo_manager():
+                    # 重新显示的按钮没有之前的边距，按当前布局重新应用
+                    forget_applied(button)
+                    button.pack()  # 确保按钮可见
             else:
                 button.pack_forget()  # 隐藏多余的按钮
         
         # 隐藏选项框，直到文本显示完毕
         self.choice_frame.pack_forget()
         
-        # 开始显示第一个段落
-        self.display_next_segment()
-        
     def on_click(self, event):
         """处理鼠标点击事件"""
         # 如果正在等待API响应，则不处理点击事件
-        if self.is_waiting_response:
+        if self.is_waiting_response or not self.engine:
+            return
+
+        if self.engine.status == "failed":
+            self.retry_request()
             return
             
         if self.is_typing:
@@ -337,60 +275,64 @@ class GameScreenFrame(BaseFrame):
             self.text_finished = True
             # 不再自动调用display_next_segment，等待下一次点击
         elif self.text_finished:
-            # 如果文本已经显示完毕，显示下一段或选项
-            if self.current_segment_index < len(self.current_segments):
-                self.display_next_segment()
-            else:
-                # 检查是否有待处理的结束文本
-                if hasattr(self, 'pending_end_text') and self.pending_end_text is not None:
-                    self.controller.show_frame("EndScreenFrame", end_text=self.pending_end_text)
-                    self.pending_end_text = None  # 清除待处理的结束文本
-                else:
-                    self.show_choices()
-        
-    def apply_frame_resize(self, width, height):
-        width_ratio = width / self.base_width
-        height_ratio = height / self.base_height
-        scale = min(width_ratio, height_ratio)
+            self.advance()
+
+    def advance(self):
+        """文本显示完毕后，显示下一段、结束界面或选项"""
+        self.display_next_segment()
         
+    def compute_layout(self, scale):
+        return {
+            "font_size": self.dialog_label.font_size(scale),
+            "top_spacer_height": max(int(self.base_top_spacer_height * scale), 20),
+            "dialog_padx": max(int(self.base_dialog_padx * scale), 20),
+            "dialog_pady": max(int(self.base_dialog_pady * scale), 10),
+            "choice_pady": (max(int(self.base_choice_pady[0] * scale), 10),
+                            max(int(self.base_choice_pady[1] * scale), 10)),
+            "dialog_label_pady": max(int(self.base_dialog_label_pady[1] * scale), 2),
+            "content_pad": max(int(15 * scale), 5),
+            "button_pady": max(int(5 * scale), 2),
+            "button_ipadx": max(int(self.base_button_ipadx * scale), 10),
+            "button_ipady": max(int(self.base_button_ipady * scale), 2),
+            "sound_label_font_size": max(int(12 * scale), 8)
+        }
+
+    def apply_layout(self, layout):
         # 调整对话标签字体大小
-        self.dialog_label.update_font_size(scale)
+        configure_changed(self.dialog_label, font=(self.dialog_label.base_font, layout["font_size"]))
 
-        top_spacer_height = max(int(self.base_top_spacer_height * scale), 20)
-        self.top_spacer.config(height=top_spacer_height)
+        configure_changed(self.top_spacer, height=layout["top_spacer_height"])
         
         # 调整对话框区域边距
-        dialog_padx = max(int(self.base_dialog_padx * scale), 20)
-        dialog_pady = max(int(self.base_dialog_pady * scale), 10)
-        self.dialog_frame.pack_configure(padx=dialog_padx, pady=(0, dialog_pady))
+        configure_changed(
+            self.dialog_frame, "pack_configure",
+            padx=layout["dialog_padx"], pady=(0, layout["dialog_pady"])
+        )
         
         # 调整选项区域边距
-        choice_pady_first = max(int(self.base_choice_pady[0] * scale), 10)
-        choice_pady_second = max(int(self.base_choice_pady[1] * scale), 10)
         # 只在选项框已经显示时更新边距
         if self.choice_frame.winfo_manager():
-            self.choice_frame.pack_configure(pady=(choice_pady_first, choice_pady_second))
+            configure_changed(self.choice_frame, "pack_configure", pady=layout["choice_pady"])
         
         # 调整对话文本标签边距
-        dialog_label_pady_bottom = max(int(self.base_dialog_label_pady[1] * scale), 2)
-        self.dialog_label.pack_configure(pady=(0, dialog_label_pady_bottom))
+        configure_changed(self.dialog_label, "pack_configure", pady=(0, layout["dialog_label_pady"]))
         
         # 调整内容区域边距
-        content_pad_x = max(int(15 * scale), 5)
-        content_pad_y = max(int(15 * scale), 5)
-        self.dialog_content.pack_configure(padx=content_pad_x, pady=content_pad_y)
-        
-        # 调整选择按钮边距和内边距
-        button_pady = max(int(5 * scale), 2)
-        button_ipadx = max(int(self.base_button_ipadx * scale), 10)
-        button_ipady = max(int(self.base_button_ipady * scale), 2)
+        content_pad = layout["content_pad"]
+        configure_changed(self.dialog_content, "pack_configure", padx=content_pad, pady=content_pad)
         
+        # 调整选择按钮边距和内边距（隐藏的按钮在重新显示时再应用）
         for button in self.choice_buttons:
-            button.pack_configure(pady=button_pady, ipadx=button_ipadx, ipady=button_ipady)
+            if button.winfo_manager():
+                configure_changed(
+                    button, "pack_configure",
+                    pady=layout["button_pady"],
+                    ipadx=layout["button_ipadx"],
+                    ipady=layout["button_ipady"]
+                )
             
         # 调整音效标签字体大小
-        sound_label_font_size = max(int(12 * scale), 8)
-        self.sound_label.config(font=('微软雅黑', sound_label_font_size))
+        configure_changed(self.sound_label, font=('微软雅黑', layout["sound_label_font_size"]))
             
     def on_show(self):
         """当界面显示时调用"""
@@ -406,9 +348,8 @@ class GameScreenFrame(BaseFrame):
         """
         当属性段落显示完成时调用
         """
-        # 在这里处理属性变更的实时执行
-        # 留空等待后续处理
-        pass
+        # 属性变化在回合完整到达后由引擎统一生效
+        print(f"属性变更: {segment['attribute']}，当前属性: {self.engine.attributes.as_dict()}")
         
         # 继续处理
         self.is_typing = False
@@ -425,38 +366,39 @@ class GameScreenFrame(BaseFrame):
         # 显示当前播放的音效
         self.sound_label.config(text=f"当前声音: {sound_file}")
         
-        # 在后台线程中播放音效，避免阻塞UI
-        threading.Thread(
-            target=self._play_sound_async,
-            args=(sound_file,),
-            daemon=True
-        ).start()
-        
-    def _play_sound_async(self, sound_file):
-        """
-        异步播放音效
-        """
-        sound_path = os.path.join(get_config_dir(), "data", f"sounds/{sound_file}.mp3")
-        try:
-            playsound(sound_path)
-        except Exception as e:
-            print(f"播放声音失败: {e}")
-        finally:
-            # 播放完成后清除显示
-            self.after(0, lambda: self.sound_label.config(text="当前声音: null"))
-        
+        # 交给音频引擎播放，不阻塞界面；播放结束后回到主线程清除显示
+        self.sound_voice = play_sound(sound_file, on_finished=self._on_sound_finished)
+        if self.sound_voice is None:
+            self.sound_label.config(text="当前声音: null")
+
+    def _on_sound_finished(self, voice_id):
+        """音效播放结束（在音频引擎的线程中调用）"""
+        self.controller.post(self._clear_sound_label, voice_id)
+
+    def _clear_sound_label(self, voice_id):
+        # 期间又开始了新的音效时保留显示
+        if voice_id == self.sound_voice:
+            self.sound_voice = None
+            self.sound_label.config(text="当前声音: null")
+
     def show_choices(self):
         """
         显示选项按钮
         """
-        if self.current_choices:
-            self.choice_frame.pack(pady=(70, 10))
+        if self.engine and self.engine.choices:
+            self._update_choice_buttons()
+            # 重新显示的按钮与选项框都使用当前缩放档位的布局
+            self.relayout()
+            layout = self.resize_manager.layout(type(self), self.compute_layout)
+            forget_applied(self.choice_frame)
+            configure_changed(self.choice_frame, "pack_configure", pady=layout["choice_pady"])
         
     def on_choice(self, index):
         """
         处理选项选择
         """
-        if index < len(self.current_choices):
+        choices = self.engine.choices if self.engine else []
+        if index < len(choices):
             # 发送用户选择到AI并获取响应
-            print(self.current_choices[index])
-            self.send_user_choice(self.current_choices[index])
\ No newline at end of file
+            print(choices[index])
+            self.send_user_choice(choices[index])
\ No newline at end of file
@@ -1,10 +1,14 @@
+import contextvars
 import os
+import threading
 import tkinter as tk
 from tkinter import ttk
 
+from ai_api.api_client import prewarm_client
 from config.decorators import get_config_manager
-from service.story_service import get_stories, get_stories_path
-from .base_ui import BaseFrame, RoundedBorderFrame
+from service.save_service import get_saves_enabled, latest_resumable_save
+from service.story_service import find_story, get_stories, get_stories_path, refresh_stories_async
+from .base_ui import BaseFrame, RoundedBorderFrame, configure_changed
 
 class StartMenuFrame(BaseFrame):
     def __init__(self, parent, controller):
@@ -21,8 +25,11 @@ class StartMenuFrame(BaseFrame):
         )
         self.title_label.pack(pady=(30, 30))
 
-        self.choices = get_stories()
+        # 先显示持久化的故事索引，目录扫描在 on_show 中放到后台进行
+        self.choices = get_stories(refresh=False)
         self.selected_index = 0
+        self.resume_journal = None  # 可以继续的存档
+        self._resume_lookup = 0     # 查找存档的序号，只采用最近一次查找的结果
         
         # 边框容器
         self.listbox_frame = RoundedBorderFrame(
@@ -79,6 +86,16 @@ class StartMenuFrame(BaseFrame):
             command=self.on_confirm
         )
         self.confirm_button.pack(side='left', padx=(0, 50))
+
+        # 继续（读取最近一个未结束的存档）
+        self.continue_button = ttk.Button(
+            self.button_frame,
+            text="继续",
+            style='Game.TButton',
+            command=self.on_continue
+        )
+        self.continue_button.pack(side='left', padx=(0, 50))
+        self.continue_button.config(state='disabled')
         
         # 退出
         self.exit_button = ttk.Button(
@@ -95,30 +112,41 @@ class StartMenuFrame(BaseFrame):
         self.focus_set()
 
         self.listbox_base_font_size = 14
+
+    def on_show(self):
+        """当界面显示时调用"""
+        # 玩家选择故事期间，在后台预先建立到AI接口的连接（同时在后台线程中导入openai），
+        # 放到界面显示之后，不影响开始界面的首次显示
+        self.after_idle(prewarm_client)
+
+        # 故事目录有变化时更新列表
+        self.refresh_story_list()
+
+        # 有未结束的存档时才允许继续
+        self.refresh_resume_save()
         
-    def apply_frame_resize(self, width, height):
-        width_ratio = width / self.base_width
-        height_ratio = height / self.base_height
-        scale = min(width_ratio, height_ratio)
-        
+    def compute_layout(self, scale):
+        return {
+            "listbox_font_size": max(int(self.listbox_base_font_size * scale), 8),
+            "title_pad_y": max(int(30 * scale), 10),
+            "listbox_pad_y": max(int(20 * scale), 5),
+            "button_pad_y": max(int(30 * scale), 10),
+            "content_pad": max(int(15 * scale), 5)
+        }
+
+    def apply_layout(self, layout):
         # 调整列表框字体大小
-        listbox_font_size = max(int(self.listbox_base_font_size * scale), 8)
-        self.listbox.config(font=('微软雅黑', listbox_font_size))
+        configure_changed(self.listbox, font=('微软雅黑', layout["listbox_font_size"]))
         
         # 调整内边距
-        title_pad_y = max(int(30 * scale), 10)
-        self.title_label.pack_configure(pady=(title_pad_y, title_pad_y))
-        
-        listbox_pad_y = max(int(20 * scale), 5)
-        self.listbox_frame.pack_configure(pady=(0, listbox_pad_y))
-        
-        button_pad_y = max(int(30 * scale), 10)
-        self.confirm_button.pack_configure(pady=(0, button_pad_y))
+        title_pad_y = layout["title_pad_y"]
+        configure_changed(self.title_label, "pack_configure", pady=(title_pad_y, title_pad_y))
+        configure_changed(self.listbox_frame, "pack_configure", pady=(0, layout["listbox_pad_y"]))
+        configure_changed(self.confirm_button, "pack_configure", pady=(0, layout["button_pad_y"]))
         
         # 调整内容区域边距
-        content_pad_x = max(int(15 * scale), 5)
-        content_pad_y = max(int(15 * scale), 5)
-        self.listbox_content.pack_configure(padx=content_pad_x, pady=content_pad_y)
+        content_pad = layout["content_pad"]
+        configure_changed(self.listbox_content, "pack_configure", padx=content_pad, pady=content_pad)
         
     def move_selection_up(self, event):
         current = self.listbox.curselection()[0] if self.listbox.curselection() else 0
@@ -136,27 +164,84 @@ class StartMenuFrame(BaseFrame):
             self.listbox.activate(current + 1)
             self.listbox.see(current + 1)
             
+    def refresh_story_list(self):
+        """在后台线程中刷新故事目录索引（新增或修改的故事文件需要解析），完成后更新列表"""
+        refresh_stories_async(lambda choices: self.controller.post(self._set_story_list, choices))
+
+    def _set_story_list(self, choices):
+        """按故事目录索引更新列表（索引未变化时不改动列表）"""
+        if choices == self.choices:
+            return
+        # 列表是在后台扫描完成后才更新的，尽量保留玩家此时已经选中的故事
+        selection = self.listbox.curselection()
+        selected = self.choices[selection[0]] if selection and selection[0] < len(self.choices) else None
+        index = choices.index(selected) if selected in choices else 0
+        self.choices = choices
+        self.listbox.delete(0, tk.END)
+        for choice in self.choices:
+            self.listbox.insert(tk.END, choice)
+        self.listbox.selection_set(index)
+        self.listbox.activate(index)
+        self.listbox.see(index)
+
+    def refresh_resume_save(self):
+        """在后台线程中查找可以继续的存档（需要读取每个存档的索引），找到后再启用继续按钮"""
+        self._resume_lookup += 1
+        self.resume_journal = None
+        self.continue_button.config(state='disabled')
+        if not get_saves_enabled():
+            return
+
+        # 查找线程沿用当前的配置作用域
+        threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._find_resume_save, self._resume_lookup),
+            daemon=True
+        ).start()
+
+    def _find_resume_save(self, lookup):
+        try:
+            journal = latest_resumable_save()
+        except Exception as e:
+            print(f"查找存档失败: {e}")
+            return
+        self.controller.post(self._set_resume_save, lookup, journal)
+
+    def _set_resume_save(self, lookup, journal):
+        if lookup != self._resume_lookup:
+            return
+        self.resume_journal = journal
+        self.continue_button.config(state='normal' if journal else 'disabled')
+
+    def on_continue(self):
+        journal = self.resume_journal
+        if journal is None:
+            return False
+
+        story_file = journal.story_file
+        if not story_file or not os.path.exists(story_file):
+            print(f"错误：找不到存档对应的故事文件 '{story_file}'")
+            return False
+        get_config_manager().setup_story_config(story_file)
+
+        # 通知主应用从存档继续游戏
+        if self.controller.resume_game(journal):
+            self.controller.show_frame("GameScreenFrame")
+            
     def on_confirm(self):
         selection = self.listbox.curselection()
         if selection:
             index = selection[0]
             choice = self.choices[index]
-            story_path = get_stories_path()
-
-            yaml_file = os.path.join(story_path, f"{choice}.yaml")
-            yml_file = os.path.join(story_path, f"{choice}.yml")
-
-            # 检测文件类型并执行相应函数
-            if os.path.exists(yaml_file):
-                print(f"找到 YAML 文件: {yaml_file}")
-                get_config_manager().setup_story_config(yaml_file)
-            elif os.path.exists(yml_file):
-                print(f"找到 YML 文件: {yml_file}")
-                get_config_manager().setup_story_config(yml_file)
-            else:
+
+            # 故事文件的路径与类型来自故事目录索引
+            story = find_story(choice)
+            if story is None or not os.path.exists(story["path"]):
                 print(f"错误：找不到故事文件 '{choice}'")
-                print(f"在目录 {story_path} 中未找到 {choice}.yaml 或 {choice}.yml")
+                print(f"在目录 {get_stories_path()} 中未找到 {choice}.yaml 或 {choice}.yml")
                 return False
+            print(f"找到 {story['extension'][1:].upper()} 文件: {story['path']}")
+            get_config_manager().setup_story_config(story["path"])
 
             # 通知主应用开始新游戏
             self.controller.start_new_game()
@@ -1,10 +1,21 @@
 import os
+import sys
+
+from service.startup_profile import StartupProfiler
+
+# 以 --startup-report 启动时记录模块导入与各启动阶段的耗时，需要在导入其他模块之前开始
+profiler = StartupProfiler.from_argv(sys.argv)
+
 import tkinter as tk
 from tkinter import ttk
 
-from ai_api.api_client import ChatSession
+from ai_api import client_pool, event_loop
+from audio.audio_player import preload_sounds, shutdown_audio
+from ai_api.api_client import AsyncChatSession, ChatSession, get_async_requests
+from service.game_service import GameEngine
+from service.save_service import SaveJournal, get_saves_enabled
 from config.config_manager import ConfigManager
-from config.decorators import set_config_manager, set_config_dir
+from config.decorators import get_config_manager, set_config_manager, set_config_dir
 from gui.base_ui import BaseUI
 from gui.start_menu import StartMenuFrame
 from gui.game_screen import GameScreenFrame
@@ -25,24 +36,33 @@ class MainApp(BaseUI):
 
         self.frames = {}
         self.chat_session = None
+        self.engine = None
 
         self.init_frames()
 
         self.show_frame("StartMenuFrame")
         
+    # 界面类，只有开始界面在启动时创建，其余界面第一次显示时才创建
+    FRAME_CLASSES = {FrameClass.__name__: FrameClass for FrameClass in (StartMenuFrame, GameScreenFrame, EndScreenFrame)}
+
     def init_frames(self):
-        for FrameClass in (StartMenuFrame, GameScreenFrame, EndScreenFrame):
-            frame_name = FrameClass.__name__
-            frame = FrameClass(parent=self.container, controller=self)
-            self.frames[frame_name] = frame
-            frame.grid(row=0, column=0, sticky="nsew")
-            
+        self.get_frame("StartMenuFrame")
+
         # 配置网格权重
         self.container.grid_rowconfigure(0, weight=1)
         self.container.grid_columnconfigure(0, weight=1)
-        
+
+    def get_frame(self, frame_name):
+        """获取界面，第一次使用时创建"""
+        frame = self.frames.get(frame_name)
+        if frame is None:
+            frame = self.FRAME_CLASSES[frame_name](parent=self.container, controller=self)
+            self.frames[frame_name] = frame
+            frame.grid(row=0, column=0, sticky="nsew")
+        return frame
+
     def show_frame(self, frame_name, **kwargs):
-        frame = self.frames[frame_name]
+        frame = self.get_frame(frame_name)
         frame.tkraise()
 
         if hasattr(frame, 'on_show'):
@@ -50,15 +70,48 @@ class MainApp(BaseUI):
             
     def start_new_game(self):
         """开始新游戏"""
-        # 创建新的ChatSession实例
-        self.chat_session = ChatSession()
+        # 创建新的ChatSession实例与游戏引擎
+        self.chat_session = self.create_chat_session()
+        journal = None
+        if get_saves_enabled():
+            journal = SaveJournal.create(get_config_manager().story_config.current_file())
+        self.engine = GameEngine(self.chat_session, journal=journal, sound_preloader=preload_sounds)
         
-        # 获取GameScreenFrame并设置ChatSession
-        game_screen = self.frames["GameScreenFrame"]
-        game_screen.set_chat_session(self.chat_session)
+        # 获取GameScreenFrame并设置游戏引擎
+        game_screen = self.get_frame("GameScreenFrame")
+        game_screen.set_engine(self.engine)
         game_screen.start_new_game()
 
+    def resume_game(self, journal):
+        """从存档继续游戏（存档对应的故事配置需已加载），成功时返回True"""
+        self.chat_session = self.create_chat_session()
+        engine = GameEngine.resume(journal, self.chat_session, sound_preloader=preload_sounds)
+        if engine is None:
+            print(f"存档中没有可以继续的回合: {journal.save_id}")
+            return False
+        self.engine = engine
+
+        game_screen = self.get_frame("GameScreenFrame")
+        game_screen.set_engine(self.engine)
+        game_screen.resume_game()
+        return True
+
+    @staticmethod
+    def create_chat_session():
+        return AsyncChatSession() if get_async_requests() else ChatSession()
+
+    def on_closing(self):
+        """处理窗口关闭事件，关闭存档并释放共享的AI接口连接"""
+        if self.engine:
+            self.engine.close()
+        get_config_manager().stop_watching()
+        shutdown_audio()
+        client_pool.close_all()
+        event_loop.shutdown()
+        super().on_closing()
+
 def main():
+    profiler.mark("导入模块")
     #初始化配置
     config_manager = ConfigManager()
 
@@ -67,10 +120,23 @@ def main():
     global_config_path = os.path.join(config_dir, "config.json")
 
     config_manager.setup_global_config(global_config_path)
+    if config_manager.get_global_bool("config_cache.enabled", True):
+        # 故事配置的解析结果缓存在数据目录之外的缓存目录中
+        cache_path = config_manager.get_global_value("config_cache.path", "data/cache/config")
+        config_manager.enable_story_cache(os.path.join(config_dir, cache_path))
     set_config_manager(config_manager)
-    set_storise_path(os.path.join(config_dir, "data","stories"))
+    profiler.mark("加载全局配置")
+    stories_dir = os.path.join(config_dir, "data","stories")
+    set_storise_path(stories_dir)
+    if config_manager.get_global_bool("config_watch.enabled", True):
+        # 修改config.json或正在使用的故事文件后自动重新加载，不需要重启
+        config_manager.start_watching(stories_dir, config_manager.get_global_float("config_watch.interval", 1.0))
+    profiler.mark("故事目录与监视")
 
     app = MainApp()
+    profiler.mark("创建窗口与开始界面")
+    # 事件循环第一次空闲时开始界面已经显示并可以交互
+    app.after_idle(profiler.finish, "首次显示开始界面")
     app.mainloop()
 
 if __name__ == "__main__":
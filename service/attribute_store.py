@@ -0,0 +1,156 @@
+"""
+紧凑的属性存储
+"""
+
+import re
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 属性值中的数字部分（故事配置中的值可能带有多余字符，例如 "100,"）
+_NUMBER_PATTERN = re.compile(r'[+-]?\d+')
+
+
+def to_number(value: Any, default: int = 0) -> int:
+    """将配置中的属性值转换为整数"""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = _NUMBER_PATTERN.search(str(value))
+    return int(match.group()) if match else default
+
+
+class AttributeSchema:
+    """
+    一个故事的属性定义（同一故事的所有会话共享）
+
+    属性名只在这里建立一次下标，会话中的属性值按下标存放在数组中。
+    故事配置的 attributes 中每个属性可以包含 value（初始值）、min、max（取值范围，可选）。
+    """
+
+    __slots__ = ("names", "index", "initial", "minimum", "maximum")
+
+    def __init__(self, attributes: Dict[str, Any]):
+        self.names: Tuple[str, ...] = tuple(attributes)
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        self.initial = array('q')
+        minimum, maximum = [], []
+        for name in self.names:
+            data = attributes[name]
+            if isinstance(data, dict):
+                self.initial.append(to_number(data.get("value", 0)))
+                minimum.append(to_number(data["min"]) if "min" in data else None)
+                maximum.append(to_number(data["max"]) if "max" in data else None)
+            else:
+                # 如果属性不是字典，直接使用原值作为初始值
+                self.initial.append(to_number(data))
+                minimum.append(None)
+                maximum.append(None)
+        self.minimum: Tuple[Optional[int], ...] = tuple(minimum)
+        self.maximum: Tuple[Optional[int], ...] = tuple(maximum)
+
+    def clamp(self, i: int, value: int) -> int:
+        """将属性值限制在该属性的取值范围内"""
+        low, high = self.minimum[i], self.maximum[i]
+        if low is not None and value < low:
+            return low
+        if high is not None and value > high:
+            return high
+        return value
+
+
+class AttributeStore:
+    """
+    一个会话的属性值
+
+    值存放在与属性定义下标对应的整数数组中；每次变更记录到变更日志
+    （回合, 下标, 变化量, 变更后的值, 原因），用于存档与回放。
+    """
+
+    __slots__ = ("schema", "values", "journal", "_warned")
+
+    def __init__(self, schema: AttributeSchema, values: Optional[Iterable[int]] = None):
+        self.schema = schema
+        self.values = array('q', schema.initial if values is None else values)
+        self.journal: List[Tuple[int, int, int, int, str]] = []
+        self._warned: Optional[set] = None
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """通过属性名获取属性值"""
+        i = self.schema.index.get(name)
+        return default if i is None else self.values[i]
+
+    def __getitem__(self, name: str) -> int:
+        return self.values[self.schema.index[name]]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.schema.index
+
+    def set(self, name: str, value: int, turn: int = 0, reason: str = ""):
+        """通过属性名设置属性值（按取值范围限制，并记录到变更日志）"""
+        i = self.schema.index[name]
+        old = self.values[i]
+        new = self.schema.clamp(i, to_number(value))
+        self.values[i] = new
+        self.journal.append((turn, i, new - old, new, reason))
+
+    def load(self, values: Dict[str, Any]):
+        """按属性名恢复属性值（读档用，不记录到变更日志），故事中已不存在的属性被忽略"""
+        index = self.schema.index
+        for name, value in values.items():
+            i = index.get(name)
+            if i is not None:
+                self.values[i] = to_number(value)
+
+    def apply(self, deltas: Iterable[Dict[str, Any]], turn: int = 0) -> List[Dict[str, Any]]:
+        """
+        批量应用一个回合的属性变化
+
+        Args:
+            deltas: 解析出的属性变化 {"name", "value", "reason"}
+            turn: 所在回合，记录到变更日志
+
+        Returns:
+            实际生效的变化 {"name", "delta", "value", "reason"}（按取值范围限制后）
+        """
+        index = self.schema.index
+        values = self.values
+        clamp = self.schema.clamp
+        applied = []
+        for delta in deltas:
+            name = delta["name"]
+            i = index.get(name)
+            if i is None:
+                self._warn_unknown(name)
+                continue
+            old = values[i]
+            new = clamp(i, old + delta["value"])
+            values[i] = new
+            reason = delta.get("reason", "")
+            self.journal.append((turn, i, new - old, new, reason))
+            applied.append({"name": name, "delta": new - old, "value": new, "reason": reason})
+        return applied
+
+    def changes(self, start: int = 0) -> List[Dict[str, Any]]:
+        """获取变更日志中从 start 开始的记录"""
+        names = self.schema.names
+        return [
+            {"turn": turn, "name": names[i], "delta": delta, "value": value, "reason": reason}
+            for turn, i, delta, value, reason in self.journal[start:]
+        ]
+
+    def as_dict(self) -> Dict[str, int]:
+        """获取 {属性名: 值}"""
+        return dict(zip(self.schema.names, self.values))
+
+    def copy(self) -> 'AttributeStore':
+        """复制当前属性值（不复制变更日志）"""
+        return AttributeStore(self.schema, self.values)
+
+    def _warn_unknown(self, name: str):
+        # 故事未定义的属性只提示一次
+        if self._warned is None:
+            self._warned = set()
+        if name not in self._warned:
+            self._warned.add(name)
+            print(f"忽略故事中未定义的属性: {name}")
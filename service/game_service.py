@@ -1,15 +1,455 @@
-from typing import Dict, Any
+"""
+无界面的游戏引擎
+"""
 
-from ai_api.api_client import ChatSession
-from config.decorators import get_config_manager, config_value
-from service.story_service import init_attributes
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
 
+from ai_api import event_loop
+from ai_api.api_client import ChatSession, get_stream, get_speculation_enabled, get_speculation_max_concurrent
+from ai_api.speculation import Speculator
+from config.config_manager import ConfigManager
+from config.decorators import get_config_manager, use_config
+from service.response_parser import ResponseParser, collect_events, parse_response
+from service.save_service import SaveJournal
+from service.attribute_store import AttributeStore
+from service.story_service import create_attribute_store
 
-class GameControl:
-    def __init__(self):
-        self.configmanager = get_config_manager()
-        self.minT = self.require_story("")
-        init_attributes(self.configmanager)
 
-    def require_story(self, key):
-        return self.configmanager.get_story_value(key)
\ No newline at end of file
+class GameEngine:
+    """
+    一局游戏的引擎，与界面无关
+
+    引擎持有对话会话、响应解析、属性状态与回合的生命周期：
+    start() 请求开场回合，advance() 逐个取出段落，段落取完后用 choose() 选择选项
+    进入下一回合，snapshot() 获取当前状态。回合完整到达后，其中所有的属性变化一次性生效。
+
+    请求在后台线程中执行（异步会话则在共享事件循环中执行），有新段落、回合完整到达
+    或请求失败时调用 listener(event, data)（不在主线程中调用，界面需要自行切换到主线程）：
+        ("segments", 新到达的段落列表)
+        ("finished", None)
+        ("failed", 错误)
+    设置了存档日志时，每个完整回合与显示位置都会写入存档，可以用 resume() 读档。
+    引擎不依赖任何全局状态，一个进程中可以同时运行大量相互独立的引擎；
+    每个引擎可以使用自己的配置作用域（ConfigManager.scoped），同时运行不同的故事。
+    """
+
+    def __init__(self, chat_session: Optional[ChatSession] = None,
+                 listener: Optional[Callable[[str, Any], None]] = None,
+                 attributes: Optional[AttributeStore] = None,
+                 stream: Optional[bool] = None, speculate: Optional[bool] = None,
+                 journal: Optional[SaveJournal] = None,
+                 config_manager: Optional[ConfigManager] = None,
+                 sound_preloader: Optional[Callable[[List[str]], Any]] = None):
+        # 引擎所属的配置作用域：默认与会话相同，未指定会话时为当前上下文的作用域
+        if config_manager is None:
+            config_manager = chat_session.config if chat_session is not None else get_config_manager()
+        self.config = config_manager
+        self.session = chat_session if chat_session is not None else ChatSession(config_manager)
+        self.listener = listener
+        self.journal = journal  # 存档日志（可选）
+        # 音效预热（可选）：段落一解析出来就把其中的音效名交给它，在播放前完成校验与加载
+        self.sound_preloader = sound_preloader
+        with use_config(config_manager):
+            self.stream = get_stream() if stream is None else stream
+            if attributes is None:
+                attributes = create_attribute_store(config_manager)
+            self.attributes = attributes
+
+            if speculate is None:
+                speculate = get_speculation_enabled()
+            self.speculator = Speculator(self.session, get_speculation_max_concurrent()) if speculate else None
+
+        self.segments: List[Dict[str, Any]] = []  # 本回合已到达的段落
+        self.segment_index = 0                    # 下一个要取出的段落
+        self.choices: List[str] = []
+        self.end_text: Optional[str] = None
+        self.turn = 0
+        self.request_active = False
+        self.request_failed = False
+
+        self._serial = 0            # 请求序号，用于丢弃过期请求的结果
+        self._turn_choice: Optional[str] = None  # 本回合对应的玩家选择（开场回合为None）
+        self._lock = threading.RLock()
+        self._idle = threading.Condition(self._lock)
+
+    @classmethod
+    def resume(cls, journal: SaveJournal, chat_session: Optional[ChatSession] = None,
+               listener: Optional[Callable[[str, Any], None]] = None,
+               stream: Optional[bool] = None, speculate: Optional[bool] = None,
+               config_manager: Optional[ConfigManager] = None,
+               sound_preloader: Optional[Callable[[List[str]], Any]] = None) -> Optional['GameEngine']:
+        """
+        从存档恢复游戏（需要先加载存档对应的故事配置）
+
+        恢复对话历史、属性与当前回合，显示位置回到存档时正在显示的段落，不请求AI接口。
+        存档中还没有完整回合时返回None
+        """
+        state = journal.load()
+        if state is None:
+            return None
+        engine = cls(chat_session, listener, stream=stream, speculate=speculate, journal=journal,
+                     config_manager=config_manager, sound_preloader=sound_preloader)
+        engine._restore(state)
+        return engine
+
+    def start(self):
+        """开始游戏，请求开场回合"""
+        self._begin_turn(None, None)
+
+    def choose(self, choice: Union[int, str]):
+        """选择选项（下标或选项文本），请求下一回合"""
+        with self._lock:
+            if self.request_active or self.end_text is not None:
+                raise RuntimeError("当前不能选择选项")
+            if isinstance(choice, int):
+                if not 0 <= choice < len(self.choices):
+                    raise IndexError(f"选项下标超出范围: {choice}")
+                choice = self.choices[choice]
+            elif choice not in self.choices:
+                raise ValueError(f"无效的选项: {choice}")
+
+        # 如果已为该选项推测生成了后续内容，直接接管
+        branch = self.speculator.take(choice) if self.speculator else None
+        self._begin_turn(choice, branch)
+
+    def retry(self):
+        """上一次请求失败后，按当前对话历史重新请求（玩家选择已在历史中）"""
+        with self._lock:
+            if not self.request_failed:
+                return
+        self._begin_turn(None, None, retry=True)
+
+    def advance(self) -> Optional[Dict[str, Any]]:
+        """
+        取出下一个段落
+
+        没有可取的段落时返回None，此时可以通过 status 判断是仍在生成、等待选择还是已结束
+        """
+        with self._lock:
+            if self.segment_index >= len(self.segments):
+                return None
+            segment = self.segments[self.segment_index]
+            self.segment_index += 1
+            turn, index = self.turn, self.segment_index - 1
+        if self.journal:
+            self.journal.record_cursor(turn, index)
+        return segment
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待当前请求结束，返回请求是否已结束"""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self.request_active, timeout)
+
+    def close(self):
+        """结束游戏，取消推测请求并丢弃进行中的请求"""
+        with self._lock:
+            self._serial += 1
+            self.request_active = False
+            self._idle.notify_all()
+        if self.speculator:
+            self.speculator.cancel_all()
+        if self.journal:
+            self.journal.close()
+
+    @property
+    def status(self) -> str:
+        """
+        当前状态:
+            playing  还有未取出的段落
+            waiting  请求进行中，等待后续段落
+            choosing 等待玩家选择
+            ended    故事已结束
+            failed   请求失败，等待重试
+            idle     尚未开始
+        """
+        with self._lock:
+            if self.request_failed:
+                return "failed"
+            if self.segment_index < len(self.segments):
+                return "playing"
+            if self.request_active:
+                return "waiting"
+            if self.end_text is not None:
+                return "ended"
+            if self.choices:
+                return "choosing"
+            return "idle"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """获取当前状态的快照（可序列化的字典）"""
+        with self._lock:
+            error = self.session.last_error
+            return {
+                "status": self.status,
+                "turn": self.turn,
+                "segments": [dict(segment) for segment in self.segments],
+                "segment_index": self.segment_index,
+                "choices": list(self.choices),
+                "end": self.end_text,
+                "attributes": self.attributes.as_dict(),
+                "messages": [dict(message) for message in self.session.messages],
+                "error": str(error) if self.request_failed and error else None
+            }
+
+    def _begin_turn(self, choice_text: Optional[str], branch, retry: bool = False):
+        # 请求发起的时间，遥测中的排队等待从这里算起（包括等待事件循环或线程调度的时间）
+        queued_at = time.monotonic()
+        with self._lock:
+            if self.request_active:
+                raise RuntimeError("上一个请求尚未结束")
+            self._serial += 1
+            serial = self._serial
+            self.segments = []
+            self.segment_index = 0
+            self.choices = []
+            self.end_text = None
+            self.request_active = True
+            self.request_failed = False
+            if not retry:
+                self.turn += 1
+                self._turn_choice = choice_text
+
+        if self.session.is_async:
+            # 异步会话：请求在共享事件循环中执行，不占用额外线程（配置作用域随任务带入）
+            with use_config(self.config):
+                event_loop.submit(self._request_task(serial, choice_text, branch, queued_at))
+        else:
+            threading.Thread(
+                target=self._run_scoped,
+                args=(self._request_worker, serial, choice_text, branch, queued_at),
+                daemon=True
+            ).start()
+
+    def _run_scoped(self, func: Callable, *args):
+        """在引擎的配置作用域中执行（用于后台线程）"""
+        with use_config(self.config):
+            func(*args)
+
+    def _save_state(self) -> Dict[str, Any]:
+        """存档快照：会话的紧凑状态、属性值与本回合的原始回复"""
+        state = self.session.export_state()
+        state.update(
+            turn=self.turn,
+            attributes=self.attributes.as_dict(),
+            response=self.session.messages[-1]["content"],
+            choice=self._turn_choice,
+            index=max(self.segment_index - 1, 0)
+        )
+        return state
+
+    def _restore(self, state: Dict[str, Any]):
+        """按存档状态恢复引擎"""
+        self.session.restore_state(state["summary"], state["messages"])
+        self.attributes.load(state["attributes"])
+        parsed = parse_response(state["response"])
+        self.turn = state["turn"]
+        self._turn_choice = state["choice"]
+        self.segments = parsed["segments"]
+        self.choices = parsed["choices"]
+        self.end_text = parsed["end"]
+        self.segment_index = min(state["index"], len(self.segments))
+        self._preload_sounds(self.segments[self.segment_index:])
+        if self.speculator and self.choices and self.end_text is None:
+            self.speculator.start(self.choices)
+
+    def _request_worker(self, serial: int, choice_text: Optional[str], branch, queued_at: float):
+        """在后台线程中请求并解析一个回合；任何意外错误都结束本次请求并作为请求失败通知"""
+        try:
+            self._run_request(serial, choice_text, branch, queued_at)
+        except Exception as e:
+            self._fail(serial, e)
+
+    def _run_request(self, serial: int, choice_text: Optional[str], branch, queued_at: float):
+        """请求并解析一个回合，将完整的段落交给引擎"""
+        parser = ResponseParser()
+        if branch is not None:
+            if self.stream:
+                # 边到达边解析推测分支的输出
+                if not self._consume(serial, parser, branch.iter_deltas()):
+                    branch.cancel()
+                    return
+            else:
+                text = ''.join(branch.iter_deltas())
+                if branch.succeeded:
+                    self._consume(serial, parser, [text])
+
+            if branch.succeeded or branch.parts and self.stream:
+                # 分支中途失败时也采用其历史（已包含玩家选择），以便重试
+                self.session.adopt(branch.session)
+                self.session.last_error = branch.session.last_error
+            else:
+                # 推测分支失败且没有显示任何内容，改为正常请求
+                branch = None
+
+        if branch is None:
+            if choice_text is not None:
+                self.session.add_user_message(choice_text)
+            if self.stream:
+                if not self._consume(serial, parser, self.session.stream_response(queued_at=queued_at)):
+                    return
+            else:
+                response = self.session.get_response(queued_at=queued_at)
+                self._consume(serial, parser, [response] if response else [])
+
+        self._deliver(serial, parser.close())
+        succeeded = self.session.messages[-1]["role"] == "assistant"
+        self._finish(serial, succeeded)
+
+    async def _request_task(self, serial: int, choice_text: Optional[str], branch, queued_at: float):
+        """_request_worker 的异步版本（异步会话），在共享事件循环中执行"""
+        try:
+            await self._run_request_async(serial, choice_text, branch, queued_at)
+        except Exception as e:
+            self._fail(serial, e)
+        except BaseException as e:
+            # 任务被取消（如事件循环关闭）时同样结束本次请求
+            self._fail(serial, e)
+            raise
+
+    async def _run_request_async(self, serial: int, choice_text: Optional[str], branch, queued_at: float):
+        """_run_request 的异步版本"""
+        parser = ResponseParser()
+        if branch is not None:
+            if self.stream:
+                if not await self._consume_async(serial, parser, branch.aiter_deltas()):
+                    branch.cancel()
+                    return
+            else:
+                text = ''.join([delta async for delta in branch.aiter_deltas()])
+                if branch.succeeded:
+                    self._consume(serial, parser, [text])
+
+            if branch.succeeded or branch.parts and self.stream:
+                self.session.adopt(branch.session)
+                self.session.last_error = branch.session.last_error
+            else:
+                branch = None
+
+        if branch is None:
+            if choice_text is not None:
+                self.session.add_user_message(choice_text)
+            if self.stream:
+                if not await self._consume_async(serial, parser, self.session.stream_response(queued_at=queued_at)):
+                    return
+            else:
+                response = await self.session.get_response(queued_at=queued_at)
+                self._consume(serial, parser, [response] if response else [])
+
+        self._deliver(serial, parser.close())
+        succeeded = self.session.messages[-1]["role"] == "assistant"
+        self._finish(serial, succeeded)
+
+    async def _consume_async(self, serial: int, parser: ResponseParser, deltas) -> bool:
+        """_consume 的异步版本"""
+        async for delta in deltas:
+            if serial != self._serial:
+                await deltas.aclose()
+                return False
+            events = parser.feed(delta)
+            if events:
+                self._deliver(serial, events)
+        return True
+
+    def _consume(self, serial: int, parser: ResponseParser, deltas) -> bool:
+        """
+        解析增量文本并交给引擎
+
+        请求过期（游戏被关闭或已开始新的请求）时关闭增量的来源（流式请求随之关闭连接，
+        不再消耗token），返回False
+        """
+        for delta in deltas:
+            if serial != self._serial:
+                close = getattr(deltas, "close", None)
+                if close is not None:
+                    close()
+                return False
+            events = parser.feed(delta)
+            if events:
+                self._deliver(serial, events)
+        return True
+
+    def _deliver(self, serial: int, events: List[Dict[str, Any]]):
+        with self._lock:
+            if serial != self._serial or not events:
+                return
+            result = {"segments": self.segments, "choices": self.choices, "end": self.end_text}
+            count = len(self.segments)
+            collect_events(events, result)
+            self.choices = result["choices"]
+            self.end_text = result["end"]
+            new_segments = self.segments[count:]
+        if new_segments:
+            self._preload_sounds(new_segments)
+            self._notify("segments", new_segments)
+
+    def _preload_sounds(self, segments: List[Dict[str, Any]]):
+        """把段落中即将播放的音效交给音效预热"""
+        if self.sound_preloader is None:
+            return
+        names = [segment["content"] for segment in segments if segment["type"] == "sound"]
+        if names:
+            try:
+                self.sound_preloader(names)
+            except Exception as e:
+                print(f"预热音效失败: {e}")
+
+    def _finish(self, serial: int, succeeded: bool):
+        with self._lock:
+            if serial != self._serial:
+                return
+            changes = []
+            if succeeded:
+                # 回合完整到达后，批量应用本回合的属性变化（失败重试时不会重复应用）
+                changes = self.attributes.apply(
+                    [segment["attribute"] for segment in self.segments if segment["type"] == "attribute"],
+                    turn=self.turn
+                )
+            # 状态在属性应用之后才更新，应用出错时由 _fail 结束请求
+            self.request_active = False
+            self.request_failed = not succeeded
+            self._idle.notify_all()
+
+        if not succeeded:
+            self._notify("failed", self.session.last_error)
+            return
+        if self.journal:
+            self._record_turn(changes)
+        self._notify("finished", None)
+        # 在玩家阅读期间为各选项预生成后续内容
+        if self.speculator and self.choices and self.end_text is None:
+            self.speculator.start(self.choices)
+
+    def _fail(self, serial: int, error: BaseException):
+        """请求过程中出现意外错误：结束本次请求（之后可以重试）并通知请求失败"""
+        print(f"回合请求出错: {type(error).__name__}: {error}")
+        with self._lock:
+            if serial != self._serial or not self.request_active:
+                return
+            self.request_active = False
+            self.request_failed = True
+            self.session.last_error = error
+            self._idle.notify_all()
+        self._notify("failed", error)
+
+    def _record_turn(self, changes: List[Dict[str, Any]]):
+        """写入存档日志，必要时附带快照"""
+        try:
+            with self._lock:
+                turn, choice, ended = self.turn, self._turn_choice, self.end_text is not None
+                response = self.session.messages[-1]["content"]
+                state = self._save_state() if self.journal.snapshot_due(turn) else None
+            self.journal.record_turn(turn, choice, response, changes, ended)
+            if state is not None:
+                self.journal.write_snapshot(state)
+        except OSError as e:
+            print(f"写入存档失败: {e}")
+
+    def _notify(self, event: str, data: Any):
+        if self.listener is None:
+            return
+        try:
+            self.listener(event, data)
+        except Exception as e:
+            print(f"游戏事件处理失败: {e}")
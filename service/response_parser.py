@@ -0,0 +1,156 @@
+"""
+AI响应增量解析器
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+# 属性标签格式: [attribute=属性名.数值]原因+属性变化情况
+_ATTRIBUTE_PATTERN = re.compile(r'\[attribute=([^.]+)\.([+-]?\d+)\](.*)', re.DOTALL)
+
+
+class ResponseParser:
+    """
+    增量响应解析器，与界面无关
+
+    可以按任意大小的文本块喂入数据（允许在行中间或标签中间截断），
+    每当一个段落完整时立即产出事件。每个字符只会被扫描一次，
+    解析开销与响应长度呈线性关系。
+
+    事件均为字典:
+        {"type": "text", "content": 文本}
+        {"type": "sound", "content": 音效名}
+        {"type": "attribute", "content": 原因, "attribute": {"name", "value", "reason"}}
+        {"type": "choice", "choices": [选项1, 选项2, ...]}
+        {"type": "end", "content": 结束文本}
+    """
+
+    def __init__(self):
+        self._line_parts: List[str] = []         # 当前未完成行的片段
+        self._end_parts: Optional[List[str]] = None  # [end]之后的全部内容
+        self._closed = False
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """喂入一个文本块，返回本次新完成的段落事件"""
+        if self._closed:
+            raise ValueError("解析器已关闭，不能继续喂入数据")
+
+        events = []
+        if self._end_parts is not None:
+            # [end]之后的内容全部属于结束文本
+            self._end_parts.append(chunk)
+            return events
+
+        start = 0
+        while True:
+            newline = chunk.find('\n', start)
+            if newline < 0:
+                if start < len(chunk):
+                    self._line_parts.append(chunk[start:])
+                return events
+
+            self._line_parts.append(chunk[start:newline])
+            line = ''.join(self._line_parts)
+            self._line_parts = []
+            start = newline + 1
+
+            if line.lstrip().startswith('[end]'):
+                self._end_parts = [line, '\n', chunk[start:]]
+                return events
+
+            event = self._parse_line(line)
+            if event:
+                events.append(event)
+
+    def close(self) -> List[Dict[str, Any]]:
+        """结束输入，返回剩余的段落事件（包括最后一行和结束文本）"""
+        if self._closed:
+            return []
+        self._closed = True
+
+        if self._end_parts is None:
+            line = ''.join(self._line_parts)
+            self._line_parts = []
+            if not line.lstrip().startswith('[end]'):
+                event = self._parse_line(line)
+                return [event] if event else []
+            self._end_parts = [line]
+
+        end_text = ''.join(self._end_parts).strip()[5:].strip()  # 去掉[end]前缀
+        self._end_parts = None
+        return [{"type": "end", "content": end_text}]
+
+    @property
+    def closed(self) -> bool:
+        """是否已结束输入"""
+        return self._closed
+
+    @staticmethod
+    def _parse_line(line: str) -> Optional[Dict[str, Any]]:
+        """解析单个完整行，无法识别的行返回None"""
+        line = line.strip()
+        if not line.startswith('['):
+            return None
+
+        if line.startswith('[text]'):
+            text_content = line[6:].strip()  # 去掉[text]前缀
+            if text_content:
+                return {"type": "text", "content": text_content}
+
+        elif line.startswith('[sound]'):
+            sound_content = line[7:].strip()  # 去掉[sound]前缀
+            if sound_content:
+                return {"type": "sound", "content": sound_content}
+
+        elif line.startswith('[attribute='):
+            match = _ATTRIBUTE_PATTERN.match(line)
+            if match:
+                attr_name, attr_value, reason = match.groups()
+                reason = reason.strip()
+                return {
+                    "type": "attribute",
+                    "content": reason,
+                    "attribute": {
+                        "name": attr_name,
+                        "value": int(attr_value),
+                        "reason": reason
+                    }
+                }
+
+        elif line.startswith('[choice]'):
+            choice_content = line[8:].strip()  # 去掉[choice]前缀
+            return {
+                "type": "choice",
+                "choices": [choice.strip() for choice in choice_content.split('|') if choice.strip()]
+            }
+
+        return None
+
+
+def collect_events(events: List[Dict[str, Any]], result: Dict[str, Any]):
+    """将段落事件汇总到 {"segments", "choices", "end"} 结构中"""
+    for event in events:
+        if event["type"] == "choice":
+            result["choices"] = event["choices"]
+        elif event["type"] == "end":
+            result["end"] = event["content"]
+        else:
+            result["segments"].append(event)
+
+
+def parse_response(response_text: str) -> Dict[str, Any]:
+    """
+    一次性解析完整的响应文本
+
+    Returns:
+        {"segments": 文本/音效/属性段落列表, "choices": 选项列表, "end": 结束文本或None}
+    """
+    result = {
+        "segments": [],
+        "choices": [],
+        "end": None
+    }
+    parser = ResponseParser()
+    collect_events(parser.feed(response_text), result)
+    collect_events(parser.close(), result)
+    return result
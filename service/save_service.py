@@ -0,0 +1,233 @@
+"""
+存档：每局游戏一个只追加的存档日志
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from config.decorators import config_value, get_config_dir
+
+# 存档日志中的记录类型
+START = "start"        # 开始游戏：故事文件
+TURN = "turn"          # 一个回合：玩家选择、AI原始回复、属性变化
+CURSOR = "cursor"      # 当前显示到的段落
+SNAPSHOT = "snapshot"  # 紧凑快照：剧情摘要、未折叠的消息、属性值
+
+
+@config_value("saves.enabled", True)
+def get_saves_enabled(enabled):
+    return enabled
+
+@config_value("saves.path", "data/saves")
+def get_saves_path(path):
+    return path
+
+@config_value("saves.snapshot_interval", 5)
+def get_snapshot_interval(snapshot_interval):
+    return snapshot_interval
+
+
+def get_saves_dir() -> str:
+    """存档目录（相对于配置目录）"""
+    return os.path.join(get_config_dir() or os.getcwd(), get_saves_path())
+
+
+class SaveJournal:
+    """
+    一局游戏的存档日志
+
+    <存档号>.jsonl 只追加写入，每行一条记录；每隔 snapshot_interval 个回合写入一次紧凑快照，
+    <存档号>.json 记录最新快照在日志中的字节偏移。读档时直接定位到最新快照，
+    再回放其后的少量记录，耗时与游戏长度无关，且不需要请求AI接口。
+    """
+
+    def __init__(self, directory: str, save_id: str, snapshot_interval: int = 5):
+        self.directory = directory
+        self.save_id = save_id
+        self.snapshot_interval = max(snapshot_interval, 1)
+        self.path = os.path.join(directory, f"{save_id}.jsonl")
+        self.index_path = os.path.join(directory, f"{save_id}.json")
+        self._lock = threading.Lock()
+        self._file = None
+        self._index: Dict[str, Any] = {}
+        self._cursor = None       # 尚未写入日志的最新段落位置
+        self._last_cursor = None  # 最后写入日志的段落位置
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as file:
+                self._index = json.load(file)
+
+    @classmethod
+    def create(cls, story_file: Optional[str], directory: Optional[str] = None,
+               snapshot_interval: Optional[int] = None) -> 'SaveJournal':
+        """为新游戏创建存档日志"""
+        directory = directory or get_saves_dir()
+        os.makedirs(directory, exist_ok=True)
+        save_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        journal = cls(directory, save_id, snapshot_interval or get_snapshot_interval())
+        journal._index = {"story": story_file, "created": time.time()}
+        journal._append({"type": START, "story": story_file, "time": time.time()})
+        journal._write_index()
+        return journal
+
+    @property
+    def story_file(self) -> Optional[str]:
+        return self._index.get("story")
+
+    @property
+    def info(self) -> Dict[str, Any]:
+        """存档的概要信息（故事文件、回合数、是否结束、更新时间）"""
+        return dict(self._index, id=self.save_id)
+
+    def record_turn(self, turn: int, choice: Optional[str], response: str,
+                    changes: List[Dict[str, Any]], ended: bool):
+        """记录一个完整的回合"""
+        self._append({
+            "type": TURN,
+            "turn": turn,
+            "choice": choice,
+            "response": response,
+            "changes": [{"name": c["name"], "value": c["value"]} for c in changes]
+        })
+        self._last_cursor = None
+        # 流式输出时本回合的段落在回复完整之前就已显示，段落位置要写在回合记录之后
+        self._flush_cursor()
+        self._index.update(turn=turn, ended=ended, updated=time.time())
+        self._write_index()
+
+    def record_cursor(self, turn: int, index: int):
+        """
+        记录当前显示到的段落
+
+        每次点击都会调用（在界面线程中），这里只记在内存里，
+        到下一次写入回合、快照或关闭存档时才写入日志
+        """
+        with self._lock:
+            self._cursor = (turn, index)
+
+    def snapshot_due(self, turn: int) -> bool:
+        """距离上次快照是否已经过了 snapshot_interval 个回合"""
+        last = self._index.get("snapshot_turn")
+        return last is None or turn - last >= self.snapshot_interval
+
+    def write_snapshot(self, state: Dict[str, Any]):
+        """写入紧凑快照，并更新索引中的快照偏移"""
+        self._flush_cursor()
+        offset = self._append(dict(state, type=SNAPSHOT))
+        self._index.update(snapshot_offset=offset, snapshot_turn=state["turn"], updated=time.time())
+        self._write_index()
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """
+        读取存档的最新状态：定位到最新快照，再回放其后的记录
+
+        Returns:
+            {"turn", "summary", "messages", "attributes", "response", "choice", "index"}，
+            还没有完整回合时返回None
+        """
+        offset = self._index.get("snapshot_offset")
+        if offset is None or not os.path.exists(self.path):
+            return None
+
+        with open(self.path, 'rb') as file:
+            file.seek(offset)
+            lines = file.read().splitlines()
+
+        state = None
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 写入到一半的最后一行
+                continue
+            kind = record.get("type")
+            if state is None:
+                if kind != SNAPSHOT:
+                    return None
+                state = {
+                    "turn": record["turn"],
+                    "summary": record.get("summary"),
+                    "messages": list(record["messages"]),
+                    "attributes": dict(record["attributes"]),
+                    "response": record["response"],
+                    "choice": record.get("choice"),
+                    "index": record.get("index", 0)
+                }
+            elif kind == TURN:
+                if record["choice"] is not None:
+                    state["messages"].append({"role": "user", "content": record["choice"]})
+                state["messages"].append({"role": "assistant", "content": record["response"]})
+                for change in record["changes"]:
+                    state["attributes"][change["name"]] = change["value"]
+                state.update(turn=record["turn"], response=record["response"],
+                             choice=record["choice"], index=0)
+            elif kind == CURSOR and record["turn"] == state["turn"]:
+                state["index"] = record["index"]
+        return state
+
+    def close(self):
+        self._flush_cursor()
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def _flush_cursor(self):
+        """把内存中的最新段落位置写入日志（与上次写入的相同时跳过）"""
+        with self._lock:
+            cursor, self._cursor = self._cursor, None
+            if cursor is None or cursor == self._last_cursor:
+                return
+            self._last_cursor = cursor
+        self._append({"type": CURSOR, "turn": cursor[0], "index": cursor[1]})
+
+    def _append(self, record: Dict[str, Any]) -> int:
+        """追加一条记录，返回其在日志中的字节偏移"""
+        data = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'ab')
+            offset = self._file.tell()
+            self._file.write(data)
+            self._file.flush()
+            return offset
+
+    def _write_index(self):
+        # 先写临时文件再替换，避免中途被杀时留下损坏的索引
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self._index, file, ensure_ascii=False)
+        os.replace(temp_path, self.index_path)
+
+
+def list_saves(directory: Optional[str] = None) -> List[Dict[str, Any]]:
+    """列出所有存档的概要信息，最近更新的在前"""
+    directory = directory or get_saves_dir()
+    if not os.path.exists(directory):
+        return []
+    saves = []
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, filename), 'r', encoding='utf-8') as file:
+                info = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"读取存档索引失败: {filename} ({e})")
+            continue
+        info["id"] = filename[:-5]
+        saves.append(info)
+    saves.sort(key=lambda info: info.get("updated", info.get("created", 0)), reverse=True)
+    return saves
+
+
+def latest_resumable_save(directory: Optional[str] = None) -> Optional[SaveJournal]:
+    """获取最近一个未结束且可以读档的存档"""
+    directory = directory or get_saves_dir()
+    for info in list_saves(directory):
+        if not info.get("ended") and info.get("snapshot_offset") is not None:
+            return SaveJournal(directory, info["id"], get_snapshot_interval())
+    return None
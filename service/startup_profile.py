@@ -0,0 +1,127 @@
+"""
+启动耗时分析：记录各启动阶段与模块导入的耗时（类似 python -X importtime）
+"""
+
+import builtins
+import importlib.util
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# 命令行参数或环境变量开启启动耗时报告
+STARTUP_REPORT_FLAG = "--startup-report"
+STARTUP_REPORT_ENV = "AVG_STARTUP_REPORT"
+
+
+class StartupProfiler:
+    """
+    启动耗时分析
+
+    mark(阶段名) 记录从上一个阶段结束到现在的耗时；开启导入计时后，
+    每个首次导入的模块记录自身耗时与包含子模块的累计耗时，报告中按顶层包汇总。
+    未开启时所有方法都不做任何事。
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.start_time = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        # 模块名 -> (自身耗时, 累计耗时)
+        self.imports: Dict[str, Tuple[float, float]] = {}
+        self._last_mark = self.start_time
+        self._original_import = None
+        self._local = threading.local()
+
+    @classmethod
+    def from_argv(cls, argv: List[str]) -> 'StartupProfiler':
+        """命令行带有 --startup-report 或设置了环境变量时开启，并立即开始记录导入耗时"""
+        enabled = STARTUP_REPORT_FLAG in argv or bool(os.environ.get(STARTUP_REPORT_ENV))
+        profiler = cls(enabled)
+        if enabled:
+            profiler.install_import_hook()
+        return profiler
+
+    def mark(self, phase: str):
+        """记录一个启动阶段的结束"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last_mark))
+        self._last_mark = now
+
+    def install_import_hook(self):
+        """开始记录模块导入耗时"""
+        if self._original_import is not None:
+            return
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall_import_hook(self):
+        """停止记录模块导入耗时"""
+        if self._original_import is None:
+            return
+        if builtins.__import__ == self._timed_import:
+            builtins.__import__ = self._original_import
+        self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original_import
+        module_name = name
+        if level:
+            # 相对导入按完整模块名记录
+            try:
+                package = (globals or {}).get('__package__') or ''
+                module_name = importlib.util.resolve_name('.' * level + name, package)
+            except (ImportError, ValueError):
+                return original(name, globals, locals, fromlist, level)
+        if module_name in sys.modules:
+            return original(name, globals, locals, fromlist, level)
+
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+        start_time = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            if module_name not in self.imports:
+                self.imports[module_name] = (elapsed - children, elapsed)
+
+    def report(self, top: int = 10) -> str:
+        """生成启动耗时报告：各阶段耗时，以及导入耗时最多的顶层包与模块"""
+        if not self.enabled:
+            return ""
+        total = time.perf_counter() - self.start_time
+        lines = [f"启动耗时报告（共{total * 1000:.1f}毫秒）", "各阶段："]
+        for phase, elapsed in self.phases:
+            lines.append(f"  {phase:<16}{elapsed * 1000:9.1f}毫秒")
+
+        if self.imports:
+            packages: Dict[str, float] = {}
+            for name, (self_time, _) in self.imports.items():
+                package = name.split('.')[0]
+                packages[package] = packages.get(package, 0.0) + self_time
+            lines.append(f"导入耗时最多的顶层包（共导入{len(self.imports)}个模块）：")
+            for package, elapsed in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+                lines.append(f"  {package:<24}{elapsed * 1000:9.1f}毫秒")
+            lines.append("累计导入耗时最多的模块（包含其导入的子模块）：")
+            modules = sorted(self.imports.items(), key=lambda item: item[1][1], reverse=True)[:top]
+            for name, (self_time, cumulative) in modules:
+                lines.append(f"  {name:<32}{cumulative * 1000:9.1f}毫秒（自身{self_time * 1000:.1f}毫秒）")
+        return "\n".join(lines)
+
+    def finish(self, phase: Optional[str] = None):
+        """记录最后一个阶段，停止导入计时并打印报告"""
+        if not self.enabled:
+            return
+        if phase:
+            self.mark(phase)
+        self.uninstall_import_hook()
+        print(self.report())
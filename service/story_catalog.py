@@ -0,0 +1,147 @@
+"""
+故事目录索引
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from config.loaders import ConfigLoader, YamlConfigLoader
+
+STORY_EXTENSIONS = ('.yaml', '.yml')
+# 索引文件格式版本，格式变化时旧索引整体失效
+CATALOG_VERSION = 1
+
+
+class StoryCatalog:
+    """
+    故事目录索引
+
+    记录每个故事文件的路径、扩展名、修改时间、大小与简要信息（故事类型、角色数、属性名），
+    并持久化到索引文件。刷新时只重新解析修改时间或大小发生变化的文件，
+    启动时直接读取索引，不需要逐个解析故事文件。
+    """
+
+    def __init__(self, stories_path: str, index_path: Optional[str] = None,
+                 loader: Optional[ConfigLoader] = None):
+        self.stories_path = stories_path
+        self.index_path = index_path
+        self.loader = loader or YamlConfigLoader()
+        self._entries: Dict[str, Dict[str, Any]] = {}  # 文件名 -> 条目
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()          # 保护 _entries 与 _refreshed_at
+        self._refresh_lock = threading.Lock()  # 串行化刷新
+        self._load_index()
+
+    def refresh(self, max_age: float = 0.0) -> Dict[str, int]:
+        """
+        增量刷新索引
+
+        Args:
+            max_age: 距上次刷新不足该时间（秒）时直接使用现有索引
+
+        Returns:
+            {"scanned": 扫描的文件数, "parsed": 重新解析的文件数, "removed": 移除的文件数}
+        """
+        stats = {"scanned": 0, "parsed": 0, "removed": 0}
+        # 同一时间只有一个刷新在扫描；扫描与解析期间不持有 _lock，不阻塞界面线程读取现有索引
+        with self._refresh_lock:
+            with self._lock:
+                if max_age and time.monotonic() - self._refreshed_at < max_age:
+                    return stats
+                previous = self._entries
+
+            if not os.path.exists(self.stories_path):
+                print(f"错误：目录 '{self.stories_path}' 不存在")
+                with self._lock:
+                    self._entries = {}
+                return stats
+
+            entries = {}
+            with os.scandir(self.stories_path) as scanner:
+                for dir_entry in scanner:
+                    extension = os.path.splitext(dir_entry.name)[1]
+                    if extension not in STORY_EXTENSIONS or not dir_entry.is_file():
+                        continue
+                    stats["scanned"] += 1
+                    stat = dir_entry.stat()
+                    entry = previous.get(dir_entry.name)
+                    if entry is None or entry["mtime_ns"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+                        entry = self._parse(dir_entry.path, dir_entry.name, extension, stat)
+                        stats["parsed"] += 1
+                    entries[dir_entry.name] = entry
+
+            stats["removed"] = len(set(previous) - set(entries))
+            with self._lock:
+                self._entries = entries
+                self._refreshed_at = time.monotonic()
+            if stats["parsed"] or stats["removed"]:
+                self._save_index(entries)
+        return stats
+
+    def stories(self, newest_first: bool = True) -> List[Dict[str, Any]]:
+        """所有故事的条目，按修改时间排序"""
+        with self._lock:
+            entries = list(self._entries.values())
+        entries.sort(key=lambda entry: entry["mtime_ns"], reverse=newest_first)
+        return entries
+
+    def find(self, name: str) -> Optional[Dict[str, Any]]:
+        """按故事名（不含扩展名）查找条目，同名时优先 .yaml"""
+        with self._lock:
+            for extension in STORY_EXTENSIONS:
+                entry = self._entries.get(name + extension)
+                if entry is not None:
+                    return entry
+        return None
+
+    def _parse(self, path: str, filename: str, extension: str, stat) -> Dict[str, Any]:
+        """读取故事文件的简要信息"""
+        data = self.loader.load(path)
+        if not isinstance(data, dict):
+            data = {}
+        characters = data.get("characters")
+        attributes = data.get("attributes")
+        return {
+            "name": os.path.splitext(filename)[0],
+            "path": path,
+            "extension": extension,
+            "mtime": stat.st_mtime,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "story_type": data.get("story_type"),
+            "characters": len(characters) if isinstance(characters, list) else 0,
+            "attributes": list(attributes) if isinstance(attributes, dict) else []
+        }
+
+    def _load_index(self):
+        if not self.index_path or not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as file:
+                index = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"读取故事索引失败: {e}")
+            return
+        if index.get("version") == CATALOG_VERSION and index.get("stories_path") == self.stories_path:
+            self._entries = index.get("entries", {})
+
+    def _save_index(self, entries: Dict[str, Dict[str, Any]]):
+        if not self.index_path:
+            return
+        try:
+            directory = os.path.dirname(self.index_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.index_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump({
+                    "version": CATALOG_VERSION,
+                    "stories_path": self.stories_path,
+                    "entries": entries
+                }, file, ensure_ascii=False)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            print(f"保存故事索引失败: {e}")
@@ -1,69 +1,92 @@
 import os
-from types import SimpleNamespace
-from typing import Any
+import threading
+from typing import Any, Callable, Dict, List, Optional
 
 from config.config_manager import ConfigManager
+from config.decorators import get_config_dir
+from service.attribute_store import AttributeSchema, AttributeStore
+from service.story_catalog import StoryCatalog
 
-_stories_path : str = None
-_game_attributes : SimpleNamespace = None
-
-
-
-def get_stories(newest_first=True):
-    stories_path = _stories_path
-    filenames = []
-
-    if not os.path.exists(stories_path):
-        print(f"错误：目录 '{stories_path}' 不存在")
-        return filenames
+# 故事目录索引文件（相对于配置目录）
+CATALOG_INDEX_PATH = os.path.join("data", "cache", "story_catalog.json")
+# 距上次刷新不足该时间（秒）时，get_stories直接使用现有索引
+CATALOG_MAX_AGE = 2.0
 
-    file_info = []
-    for filename in os.listdir(stories_path):
-        file_path = os.path.join(stories_path, filename)
-        if (os.path.isfile(file_path) and
-                (filename.endswith('.yaml') or filename.endswith('.yml'))):
-            name_without_extension = os.path.splitext(filename)[0]
-            mtime = os.path.getmtime(file_path)
-            file_info.append((name_without_extension, mtime, filename))
-
-    file_info.sort(key=lambda x: x[1], reverse=newest_first)
-    filenames = [name for name, mtime, filename in file_info]
-
-    return filenames
+_stories_path : str = None
+_story_catalog : StoryCatalog = None
+# 故事快照来源 (文件, 修改时间, 大小) -> 属性定义，超过上限时淘汰最早建立的
+_attribute_schemas: Dict[tuple, AttributeSchema] = {}
+MAX_ATTRIBUTE_SCHEMAS = 32
+_schema_lock = threading.Lock()
+
+
+
+def get_story_catalog() -> Optional[StoryCatalog]:
+    """获取故事目录索引（需要先设置故事目录）"""
+    return _story_catalog
+
+
+def get_stories(newest_first=True, refresh=True):
+    """
+    获取故事名列表（按修改时间排序），索引在短时间内重复调用时不会重新扫描目录
+
+    refresh为False时直接使用现有（持久化的）索引，不扫描目录
+    """
+    if _story_catalog is None:
+        print("错误：故事目录尚未设置")
+        return []
+    if refresh:
+        _story_catalog.refresh(max_age=CATALOG_MAX_AGE)
+    return [entry["name"] for entry in _story_catalog.stories(newest_first)]
+
+def refresh_stories_async(callback: Callable[[List[str]], None], newest_first=True):
+    """在后台线程中刷新故事目录索引（可能需要解析故事文件），完成后在该线程中以故事名列表调用callback"""
+    def worker():
+        try:
+            stories = get_stories(newest_first)
+        except Exception as e:
+            print(f"刷新故事目录失败: {e}")
+            return
+        callback(stories)
+
+    threading.Thread(target=worker, daemon=True).start()
+
+def find_story(name: str) -> Optional[Dict[str, Any]]:
+    """按故事名查找故事条目（包括文件路径），找不到时返回None"""
+    if _story_catalog is None:
+        return None
+    entry = _story_catalog.find(name)
+    if entry is None:
+        # 可能是新添加的文件，强制刷新一次
+        _story_catalog.refresh()
+        entry = _story_catalog.find(name)
+    return entry
 
 def set_storise_path(file: str):
-    global _stories_path
+    global _stories_path, _story_catalog
     _stories_path = file
+    index_path = os.path.join(get_config_dir() or os.getcwd(), CATALOG_INDEX_PATH)
+    _story_catalog = StoryCatalog(file, index_path)
 
 def get_stories_path():
     return  _stories_path
 
 
 
-def get_attribute(attr_name: str, default: Any = None) -> Any:
-    """通过字符串获取属性值"""
-    if _game_attributes is None:
-        raise ValueError("属性尚未初始化，请先调用 GameControl.init_attributes()")
-    return getattr(_game_attributes, attr_name, default)
-
-
-def set_attribute(attr_name: str, value: Any):
-    """通过字符串设置属性值"""
-    global _game_attributes
-    if _game_attributes is None:
-        raise ValueError("属性尚未初始化，请先调用 GameControl.init_attributes()")
-    setattr(_game_attributes, attr_name, value)
+def get_attribute_schema(configmanager: ConfigManager) -> AttributeSchema:
+    """获取当前故事的属性定义（每个版本的故事文件只建立一次属性名下标，各作用域的会话共享）"""
+    snapshot = configmanager.story_config.snapshot()
+    key = snapshot.source
+    with _schema_lock:
+        schema = _attribute_schemas.get(key)
+        if schema is None:
+            if len(_attribute_schemas) >= MAX_ATTRIBUTE_SCHEMAS:
+                del _attribute_schemas[next(iter(_attribute_schemas))]
+            schema = AttributeSchema(snapshot.get("attributes") or {})
+            _attribute_schemas[key] = schema
+        return schema
 
 
-def init_attributes(configmanager: ConfigManager):
-    global _game_attributes
-    _game_attributes = None
-    attributes_dict = configmanager.get_story_value("attributes")
-    value_dict = {}
-    for attr_name, attr_data in attributes_dict.items():
-        if isinstance(attr_data, dict) and "value" in attr_data:
-            value_dict[attr_name] = attr_data["value"]
-        else:
-            # 如果属性不是字典或没有value字段，直接使用原值
-            value_dict[attr_name] = attr_data
-    _game_attributes = SimpleNamespace(**value_dict)
+def create_attribute_store(configmanager: ConfigManager) -> AttributeStore:
+    """为一个会话创建属性存储，初始值取自故事配置"""
+    return AttributeStore(get_attribute_schema(configmanager))
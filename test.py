@@ -6,10 +6,13 @@ import json
 from openai import OpenAI, api_key
 
 from ai_api.api_client import ChatSession
+from ai_api.mock_server import MockSettings, start_mock_server
 from config.config_manager import ConfigManager
 from config.configs import StoryConfig
-from config.decorators import set_config_manager, config_value, get_config_manager
+from config.decorators import set_config_manager, set_config_dir, config_value, get_config_manager
 from config.loaders import YamlConfigLoader
+from service.game_service import GameEngine
+from service.response_parser import ResponseParser
 from service.story_service import get_stories
 
 sys.path.insert(0, os.path.abspath("."))
@@ -203,6 +206,67 @@ def test_config():
         "status": status
     }
 
+def test_response_parser():
+    """测试增量响应解析器（按任意位置切分的文本块）"""
+    print("测试增量响应解析器...")
+    response_text = "[sound]door\n[text]门开了。\n[attribute=SAN.-5]SAN值减少了5\n[choice]进去|离开|呼救\n"
+    parser = ResponseParser()
+    events = []
+    for i in range(0, len(response_text), 3):
+        events.extend(parser.feed(response_text[i:i + 3]))
+    events.extend(parser.close())
+
+    assert [event["type"] for event in events] == ["sound", "text", "attribute", "choice"]
+    assert events[2]["attribute"] == {"name": "SAN", "value": -5, "reason": "SAN值减少了5"}
+    assert events[3]["choices"] == ["进去", "离开", "呼救"]
+    print("增量响应解析器测试通过")
+
+def test_game_engine(base_url=None, max_turns=20):
+    """无界面地完整游玩一局；不指定 base_url 时在本地启动模拟接口，不需要联网"""
+    print("测试游戏引擎...")
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    server = None
+    with open(os.path.join(base_dir, "config.json"), 'r', encoding='utf-8') as file:
+        config = json.load(file)
+    if base_url is None:
+        server = start_mock_server(settings=MockSettings(ttft=0, rate=0, end_after=3, seed=1))
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+        config["api_key"] = "mock"
+    config["base_url"] = base_url
+
+    # 使用临时的配置目录，存档与日志不写进项目目录
+    config_dir = tempfile.mkdtemp()
+    global_config_path = os.path.join(config_dir, "config.json")
+    with open(global_config_path, 'w', encoding='utf-8') as file:
+        json.dump(config, file, ensure_ascii=False)
+    config_manager = ConfigManager()
+    set_config_dir(config_dir)
+    config_manager.setup_global_config(global_config_path)
+    config_manager.setup_story_config(os.path.join(base_dir, "data", "stories", "示例故事.yaml"))
+    set_config_manager(config_manager)
+
+    engine = GameEngine()
+    try:
+        engine.start()
+        for _ in range(max_turns):
+            engine.wait()
+            if engine.status == "failed":
+                engine.retry()
+                continue
+            while (segment := engine.advance()) is not None:
+                print(segment)
+            if engine.status == "ended":
+                break
+            engine.choose(0)
+        assert engine.status == "ended", f"{max_turns}个回合内没有结束: {engine.status}"
+        print(engine.snapshot()["attributes"])
+        print(engine.end_text)
+        print("游戏引擎测试通过")
+    finally:
+        engine.close()
+        if server:
+            server.shutdown()
+
 def test_api():
     chat = ChatSession()
     reply1 = chat.get_response()
@@ -211,10 +275,12 @@ def test_api():
 if __name__ == "__main__":
     print("=== 功能测试 ===")
     test_config()
+    test_response_parser()
     # test_config_loader_yaml()
     # test_story_config()
     # test_api_config()
     # test_api()
+    test_game_engine()
     # test_audio()
     # test_start_menu()
     # print(get_stories(os.path.join(os.path.dirname(__file__))))